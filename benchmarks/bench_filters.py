@@ -0,0 +1,71 @@
+"""Times the compiled filter engine over a large synthetic result set.
+
+Usage: python -m benchmarks.bench_filters [--count 100000] [--repeat 20]
+"""
+import argparse
+import datetime
+import random
+import sys
+import time
+from bing_image_downloader.data_model import ImageData, ImageDataStore
+from bing_image_downloader.filters import Filter, compile_filters
+
+SOURCES = ["pinterest.com", "wikipedia.org", "flickr.com", "reddit.com", "example.com", "shutterstock.com"]
+WORDS = ["cat", "dog", "sunset", "mountain", "city", "river", "portrait", "abstract", "forest", "car"]
+
+def make_store(count: int, seed: int = 0) -> ImageDataStore:
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    store = ImageDataStore()
+    for i in range(count):
+        age = rng.randint(0, 3650) if rng.random() > 0.1 else None
+        store.append(ImageData(
+            title=" ".join(rng.choices(WORDS, k=4)).title(),
+            width=rng.randint(100, 4000), height=rng.randint(100, 4000),
+            site_source=rng.choice(SOURCES), data_idx=str(i),
+            parsed_age=age, parsed_date=today - datetime.timedelta(days=age) if age is not None else None,
+        ))
+    return store
+
+def filter_cases() -> dict:
+    return {
+        "broad": [
+            Filter("Size (px)", "is greater than", 1_000_000),
+            Filter("Age", "newer than (days)", 1000),
+            Filter("Date", "is after", datetime.date.today() - datetime.timedelta(days=2000)),
+            Filter("Source", "does not contain", "pinterest"),
+            Filter("Title", "contains", "cat"),
+        ],
+        "selective": [Filter("Size (px)", "is greater than", 15_000_000), Filter("Age", "newer than (days)", 30)],
+    }
+
+def time_filter(store: ImageDataStore, filters, repeat: int = 20):
+    """Returns the median and best time in milliseconds of applying `filters` to `store`,
+    and the number of matches."""
+    compiled = compile_filters(filters)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        matched = compiled.apply(store)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[0], len(matched)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CompiledFilter.apply.")
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--target_ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    store = make_store(args.count)
+    slowest = 0.0
+    for name, filters in filter_cases().items():
+        median, best, matched = time_filter(store, filters, args.repeat)
+        slowest = max(slowest, median)
+        print(f"{name}: {args.count} results, {matched} matched: median {median:.2f} ms, "
+              f"best {best:.2f} ms (target {args.target_ms:.0f} ms)")
+    sys.exit(0 if slowest <= args.target_ms else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Times cold start: `python -m bing_image_downloader.cli --help`, and launching the GUI
+until its window first paints.
+
+Usage: python -m benchmarks.bench_startup [--repeat 5]
+
+Each run is a fresh interpreter. The GUI runs on Qt's offscreen platform unless
+QT_QPA_PLATFORM is already set.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Run in the child: builds the window the same way gui.main() does, and exits on the
+# window's first paint event.
+GUI_FIRST_PAINT_SCRIPT = """
+import sys
+from PyQt6.QtCore import QEvent, QObject, QTimer
+from PyQt6.QtWidgets import QApplication
+from bing_image_downloader.gui import ImageSearchGUI
+
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Paint:
+            print("painted", flush=True)
+            QApplication.instance().exit(0)
+        return False
+
+app = QApplication(sys.argv)
+window = ImageSearchGUI()
+first_paint = FirstPaint()
+window.installEventFilter(first_paint)
+window.show()
+QTimer.singleShot(10000, lambda: app.exit(1))
+code = app.exec()
+window.close()
+sys.exit(code)
+"""
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def time_command(args, repeat: int = 5, env=None) -> float:
+    """Returns the median wall time in milliseconds of running `args` to completion."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True, env=env)
+        timings.append((time.perf_counter() - start) * 1000)
+    return _median(timings)
+
+def time_cli_help(repeat: int = 5) -> float:
+    return time_command([sys.executable, "-m", "bing_image_downloader.cli", "--help"], repeat)
+
+def time_gui_first_paint(repeat: int = 5) -> float:
+    """Returns the median time in milliseconds from launching the GUI process to the
+    window's first paint."""
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "-c", GUI_FIRST_PAINT_SCRIPT], stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL, env=env, text=True)
+        painted = None
+        for line in process.stdout:
+            if line.strip() == "painted":
+                painted = (time.perf_counter() - start) * 1000
+                break
+        process.stdout.close()
+        if process.wait() != 0 or painted is None:
+            raise RuntimeError("The GUI did not paint its window")
+        timings.append(painted)
+    return _median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CLI and GUI startup time.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(f"cli --help: median {time_cli_help(args.repeat):.0f} ms")
+    print(f"gui first paint: median {time_gui_first_paint(args.repeat):.0f} ms")
+
+if __name__ == "__main__":
+    main()
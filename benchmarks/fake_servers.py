@@ -0,0 +1,203 @@
+"""Local stand-ins for Bing and for the hosts images are downloaded from.
+
+Both servers run in a background thread on an ephemeral port and are used as context
+managers:
+
+    with FakeBingServer(total_results=500) as bing, FakeImageHost(latency=0.05) as images:
+        scraper = HttpImageScraper(base_url=bing.url)
+"""
+import datetime
+import hashlib
+import html
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SOURCES = ["www.pinterest.com", "en.wikipedia.org", "www.flickr.com", "www.reddit.com", "example.com", "www.shutterstock.com"]
+WORDS = ["cat", "dog", "sunset", "mountain", "city", "river", "portrait", "abstract", "forest", "car"]
+AGES = ["2 days ago", "3 weeks ago", "5 months ago", "1 year ago", ""]
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen backlog of 5 overflows when many workers connect at once, and the
+    # dropped connections only retry after a one second SYN timeout.
+    request_queue_size = 128
+
+class _Server:
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self):
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        server = self
+
+        class Handler(self.handler_class):
+            def log_message(self, format, *args):
+                pass
+
+        Handler.server_state = server
+        self._httpd = _HTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class _BingHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        bing = self.server_state
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == "/images/async":
+            first = int(params.get("first", 0))
+            count = int(params.get("count", 35))
+            body = bing.render_page(params.get("q", ""), first, count)
+        elif url.path == "/images/search":
+            body = bing.render_search_page(params.get("q", ""))
+        else:
+            self.send_error(404)
+            return
+        if bing.latency:
+            time.sleep(bing.latency)
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+class FakeBingServer(_Server):
+    """Serves Bing-like result pages: `/images/search` for the first page of a query, with
+    a see-more button, and `/images/async?first=&count=` for the infinite-scroll pages.
+
+    Results are generated deterministically from the query and position, with the same
+    `li[data-idx]` / `a[m]` / `.ppdatr` markup Bing uses. Past `total_results` the last page
+    is repeated, as Bing does. Image URLs point at `image_host` when one is given.
+    """
+
+    handler_class = _BingHandler
+
+    def __init__(self, total_results: int = 1000, latency: float = 0.0, image_host: str = "http://images.example.com"):
+        super().__init__()
+        self.total_results = total_results
+        self.latency = latency
+        self.image_host = image_host.rstrip("/")
+
+    def result(self, query: str, index: int) -> str:
+        rng = random.Random(f"{query}:{index}")
+        title = " ".join(rng.choices(WORDS, k=4)).title()
+        source = rng.choice(SOURCES)
+        m = {
+            "t": title, "murl": f"{self.image_host}/{index}.jpg", "turl": f"{self.image_host}/thumb/{index}.jpg",
+            "purl": f"https://{source}/pages/{index}", "w": rng.randint(100, 4000), "h": rng.randint(100, 4000),
+            "f": "jpeg", "desc": title.lower(),
+        }
+        date = datetime.date(2024, 1, 1) + datetime.timedelta(days=rng.randint(0, 600))
+        return (
+            f'<li data-idx="{index + 1}"><div class="iuscp"><div class="imgpt">'
+            f'<a class="iusc" m="{html.escape(json.dumps(m), quote=True)}" href="/images/search?view=detailV2">'
+            f'<img class="mimg" src="{m["turl"]}" alt="{html.escape(title)}"></a>'
+            f'<div class="img_info"><span class="nowrap">{m["w"]} x {m["h"]} · jpeg</span></div></div>'
+            f'<div class="infopt"><span class="ppdatr" title="{date.strftime("%m/%d/%Y")}">{rng.choice(AGES)}</span></div>'
+            f'</div></li>'
+        )
+
+    def render_page(self, query: str, first: int, count: int) -> str:
+        if first >= self.total_results:
+            first = max(0, self.total_results - count)
+        last = min(first + count, self.total_results)
+        items = "".join(self.result(query, index) for index in range(first, last))
+        return f'<div class="dgControl"><ul class="dgControl_list">{items}</ul></div>'
+
+    def render_search_page(self, query: str) -> str:
+        return (
+            f"<!DOCTYPE html><html><head><title>{html.escape(query)} - Bing images</title></head><body>"
+            f"{self.render_page(query, 0, 35)}"
+            f'<a class="btn_seemore" href="#">See more images</a>'
+            f"</body></html>"
+        )
+
+class _ImageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        host = self.server_state
+        if host.latency:
+            time.sleep(host.latency)
+        if host.should_fail():
+            self.send_error(500, "Injected failure")
+            return
+        body = host.body(self.path)
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        match = re.match(r"bytes=(\d+)-$", self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if match and (if_range is None or if_range == etag) and int(match.group(1)) < len(body):
+            start = int(match.group(1))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+            body = body[start:]
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        chunk_size = 16 * 1024
+        for offset in range(0, len(body), chunk_size):
+            chunk = body[offset:offset + chunk_size]
+            try:
+                self.wfile.write(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            if host.bandwidth:
+                time.sleep(len(chunk) / host.bandwidth)
+
+class FakeImageHost(_Server):
+    """Serves image-like bodies with a configurable first-byte `latency` (seconds),
+    per-connection `bandwidth` (bytes per second, 0 for unlimited) and `error_rate` (the
+    fraction of requests answered with a 500, drawn from a seeded generator).
+
+    Bodies carry an ETag and honor `Range: bytes=N-` requests, with `If-Range`. Bump
+    `revision` to change every body, as if the images had been replaced."""
+
+    handler_class = _ImageHandler
+
+    def __init__(self, image_size: int = 64 * 1024, latency: float = 0.0, bandwidth: int = 0,
+                 error_rate: float = 0.0, seed: int = 0):
+        super().__init__()
+        self.image_size = image_size
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.revision = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def body(self, path: str) -> bytes:
+        # A JPEG start-of-image marker followed by bytes unique to the path, so every URL
+        # (and revision) has distinct content and nothing is deduplicated by hash.
+        seed = hashlib.sha256(f"{path}:{self.revision}".encode("utf-8")).digest()
+        return (b"\xff\xd8\xff\xe0" + seed * (self.image_size // len(seed) + 1))[:self.image_size]
@@ -0,0 +1,186 @@
+"""Runs the offline benchmark suite against local fake Bing and image servers.
+
+Usage:
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json
+    python -m benchmarks.run --save_baseline benchmarks/baseline.json
+
+Each benchmark records a value, its unit and whether higher is better. With --baseline,
+results that are worse than the baseline by more than --tolerance are reported and the run
+exits with status 1.
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from bing_image_downloader.data_model import ImageData
+from bing_image_downloader.downloader import Downloader
+from bing_image_downloader.http_scraper import HttpImageScraper
+from bing_image_downloader.parsing import parse_image_data, parse_result_page
+from bing_image_downloader.scheduler import RetryPolicy
+from benchmarks.bench_filters import filter_cases, make_store, time_filter
+from benchmarks.bench_startup import time_cli_help, time_gui_first_paint
+from benchmarks.fake_servers import FakeBingServer, FakeImageHost
+
+def record(results: dict, name: str, value: float, unit: str, higher_is_better: bool):
+    results[name] = {"value": round(value, 4), "unit": unit, "higher_is_better": higher_is_better}
+    print(f"  {name}: {value:,.2f} {unit}")
+
+def bench_scrape(results: dict, args):
+    print("Scraping (HttpImageScraper.get_image_data against FakeBingServer)")
+    with FakeBingServer(total_results=args.scrape_results, latency=args.page_latency) as bing:
+        scraper = HttpImageScraper(base_url=bing.url)
+        scraper.search("benchmark")
+        start = time.perf_counter()
+        images = scraper.get_image_data(max_images=args.scrape_results)
+        elapsed = time.perf_counter() - start
+        record(results, "scrape.results_per_second", len(images) / elapsed, "results/s", True)
+
+        page = bing.render_page("benchmark", 0, 35)
+        start = time.perf_counter()
+        for _ in range(args.repeat * 5):
+            parse_result_page(page)
+        record(results, "parse.page_ms", (time.perf_counter() - start) * 1000 / (args.repeat * 5), "ms", False)
+
+        items = parse_result_page(page)
+        decoded = [(json.loads(item["m"]), item) for item in items]
+        rounds = args.repeat * 100
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for m_data, item in decoded:
+                parse_image_data(m_data, item["data_idx"], item["age"], item["date"])
+        per_item = (time.perf_counter() - start) * 1e6 / (rounds * len(decoded))
+        record(results, "parse.image_data_us", per_item, "us", False)
+
+def bench_filters(results: dict, args):
+    print(f"Filtering ({args.filter_results:,} results)")
+    store = make_store(args.filter_results)
+    for name, filters in filter_cases().items():
+        median, _, _ = time_filter(store, filters, args.repeat)
+        record(results, f"filter.{name}_ms", median, "ms", False)
+
+def time_downloads(images, **downloader_options):
+    """Downloads `images` into a scratch directory and returns the results and seconds taken."""
+    directory = tempfile.mkdtemp(prefix="bench_downloads_")
+    try:
+        downloader = Downloader(directory, **downloader_options)
+        # The downloader prints a line per image; keep it out of the report.
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            downloaded = downloader.download_many(images)
+            elapsed = time.perf_counter() - start
+        downloader.store.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return downloaded, elapsed
+
+def bench_downloads(results: dict, args):
+    print(f"Downloading ({args.downloads} images of {args.image_size // 1024} KB, "
+          f"{args.image_latency * 1000:.0f} ms latency, {args.error_rate:.0%} errors)")
+    with FakeImageHost(image_size=args.image_size, latency=args.image_latency, bandwidth=args.bandwidth,
+                       error_rate=args.error_rate) as host:
+        for workers in args.concurrency:
+            images = [ImageData(title=f"image {workers} {i}", data_idx=str(i),
+                                image_source_url=f"{host.url}/{workers}/{i}.jpg")
+                      for i in range(args.downloads)]
+            # Raw throughput: failed images are not retried.
+            downloaded, elapsed = time_downloads(images, max_workers=workers, per_host_limit=workers,
+                                                 retry_policy=RetryPolicy(max_retries=0))
+            ok = sum(1 for result in downloaded if result.ok)
+            record(results, f"download.workers_{workers}.images_per_second", ok / elapsed, "images/s", True)
+            record(results, f"download.workers_{workers}.megabytes_per_second",
+                   ok * args.image_size / elapsed / 1e6, "MB/s", True)
+
+    print(f"Downloading from a healthy host and a slow failing host ({args.failing_latency * 1000:.0f} ms, 100% errors)")
+    with FakeImageHost(image_size=args.image_size, latency=args.image_latency, bandwidth=args.bandwidth) as healthy, \
+            FakeImageHost(latency=args.failing_latency, error_rate=1.0) as failing:
+        images = []
+        for i in range(args.downloads):
+            images.append(ImageData(title=f"healthy {i}", data_idx=str(i), image_source_url=f"{healthy.url}/healthy/{i}.jpg"))
+            images.append(ImageData(title=f"failing {i}", data_idx=str(i), image_source_url=f"{failing.url}/failing/{i}.jpg"))
+        workers = max(args.concurrency)
+        downloaded, elapsed = time_downloads(images, max_workers=workers, per_host_limit=workers)
+        ok = sum(1 for result in downloaded if result.ok)
+        record(results, "download.failing_host.images_per_second", ok / elapsed, "images/s", True)
+
+def bench_startup(results: dict, args):
+    print("Startup (fresh interpreter per run)")
+    record(results, "startup.cli_help_ms", time_cli_help(args.startup_repeat), "ms", False)
+    try:
+        record(results, "startup.gui_first_paint_ms", time_gui_first_paint(args.startup_repeat), "ms", False)
+    except (ImportError, RuntimeError, OSError) as e:
+        print(f"  Skipping GUI startup: {e}")
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Returns (name, baseline, current, change) for every result worse than its baseline by
+    more than `tolerance`, and prints a comparison table."""
+    regressions = []
+    print(f"\n{'benchmark':<48} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None or not previous["value"]:
+            print(f"{name:<48} {'-':>12} {current['value']:>12,.2f} {'new':>8}")
+            continue
+        change = (current["value"] - previous["value"]) / previous["value"]
+        worse = -change if current["higher_is_better"] else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        print(f"{name:<48} {previous['value']:>12,.2f} {current['value']:>12,.2f} {change:>+8.1%}{flag}")
+        if worse > tolerance:
+            regressions.append((name, previous["value"], current["value"], change))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite.")
+    parser.add_argument("--only", choices=["scrape", "filters", "downloads", "startup"], action="append",
+                        help="Run only these benchmark groups (may be repeated)")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against this JSON results file")
+    parser.add_argument("--save_baseline", help="Write results to this JSON file as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown before a result counts as a regression")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--scrape_results", type=int, default=700)
+    parser.add_argument("--page_latency", type=float, default=0.02, help="Seconds of latency per fake Bing page")
+    parser.add_argument("--filter_results", type=int, default=100_000)
+    parser.add_argument("--downloads", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--image_size", type=int, default=64 * 1024)
+    parser.add_argument("--image_latency", type=float, default=0.05, help="Seconds before the fake image host responds")
+    parser.add_argument("--bandwidth", type=int, default=2 * 1024 * 1024, help="Bytes per second per connection, 0 for unlimited")
+    parser.add_argument("--error_rate", type=float, default=0.05)
+    parser.add_argument("--failing_latency", type=float, default=1.0, help="Seconds before the failing image host answers with a 500")
+    parser.add_argument("--startup_repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    groups = {"scrape": bench_scrape, "filters": bench_filters, "downloads": bench_downloads, "startup": bench_startup}
+    results = {}
+    for name, bench in groups.items():
+        if not args.only or name in args.only:
+            bench(results, args)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"Wrote {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+BACKENDS = ("http", "selenium")
+
+def create_scraper(backend: str = "http", debug: bool = False, cache=None, **kwargs):
+    """Creates a scraper for the given backend.
+
+    The "http" backend pages through Bing's results over plain HTTP; "selenium" drives a
+    headless Firefox and is kept as a fallback for when the HTTP results markup changes.
+    If a `ResultCache` is given, the scraper is wrapped to serve fresh cached results first.
+    Extra keyword arguments are passed to the scraper, e.g. a shared `driver_pool`.
+    """
+    if backend == "http":
+        from bing_image_downloader.http_scraper import HttpImageScraper
+        scraper = HttpImageScraper(debug=debug, **kwargs)
+    elif backend == "selenium":
+        from bing_image_downloader.scraper import BingImageScraper
+        scraper = BingImageScraper(debug=debug, **kwargs)
+    else:
+        raise ValueError(f"Unknown scraper backend: {backend}")
+    if cache is not None:
+        from bing_image_downloader.cache import CachingScraper
+        scraper = CachingScraper(scraper, cache)
+    return scraper
@@ -0,0 +1,157 @@
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+from multiprocessing.util import Finalize
+from typing import Iterable, List, Optional, Tuple
+from bing_image_downloader.backends import create_scraper
+from bing_image_downloader.cache import ResultCache
+from bing_image_downloader.downloader import Downloader
+from bing_image_downloader.filters import Filter, compile_filters
+from bing_image_downloader.metrics import Metrics, metrics
+from bing_image_downloader.perceptual import INDEX_FILENAME, NearDuplicateFilter, PerceptualHasher, PerceptualIndex
+from bing_image_downloader.processing import PostProcessor, ProcessingOptions
+from bing_image_downloader.query import build_query
+from bing_image_downloader.scheduler import HostScheduler
+from bing_image_downloader.store import DownloadStore
+from bing_image_downloader.thumbnails import ThumbnailFetcher
+
+# Per-process state, set up once by _init_worker so every query a worker runs reuses the
+# same interpreter, imports and scraper (and its warm browser, for the Selenium backend).
+_worker = {}
+
+def read_queries(path: str) -> List[str]:
+    """Reads one query per line from `path`, or from stdin if `path` is "-"."""
+    if path == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+
+def query_directory_name(query: str) -> str:
+    name = "".join(c for c in query if c.isalnum() or c in (' ', '-')).strip()
+    return name or "query"
+
+def _init_worker(backend, debug, download_dir, workers, per_host_limit, host_rate, cache_ttl, min_bytes, max_bytes, filters,
+                 near_duplicate_distance, processing, profile):
+    cache = ResultCache(ttl=cache_ttl) if cache_ttl is not None else None
+    scraper = create_scraper(backend, debug=debug, cache=cache)
+    if hasattr(scraper, "close"):
+        Finalize(None, scraper.close, exitpriority=10)
+    # One index shared by every query and process, so images are deduplicated across the batch.
+    store = DownloadStore(download_dir)
+    # Host rate limits and circuit breakers carry over from one query to the next.
+    scheduler = HostScheduler(per_host_limit, rate=host_rate or None)
+    near_duplicates = None
+    if near_duplicate_distance is not None:
+        # Hashed in this process: the batch already keeps every core busy with one worker each.
+        index = PerceptualIndex(os.path.join(download_dir, INDEX_FILENAME))
+        near_duplicates = NearDuplicateFilter(index, ThumbnailFetcher(debug=debug).get_bytes, PerceptualHasher(processes=0),
+                                              max_distance=near_duplicate_distance, debug=debug)
+    if profile:
+        metrics.enable()
+    _worker.update(scraper=scraper, store=store, scheduler=scheduler, near_duplicates=near_duplicates, processing=processing,
+                   filters=filters or [], download_dir=download_dir, workers=workers,
+                   per_host_limit=per_host_limit, min_bytes=min_bytes, max_bytes=max_bytes)
+
+def _timed(iterator, timing: dict):
+    """Passes items through, adding the time spent waiting on `iterator` to timing["seconds"]."""
+    iterator = iter(iterator)
+    while True:
+        start_time = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            timing["seconds"] += time.perf_counter() - start_time
+        yield item
+
+def _run_query(query: str, max_images: int) -> Tuple[dict, Optional[Metrics]]:
+    """Runs one query in a worker, returning its manifest record and, when profiling, the
+    metrics it recorded."""
+    record = {"query": query, "directory": os.path.join(_worker["download_dir"], query_directory_name(query)),
+              "found": 0, "downloaded": 0, "failed": 0, "failures": [], "error": None}
+    metrics.reset()
+    start_time = time.perf_counter()
+    try:
+        scraper = _worker["scraper"]
+        search_query = build_query(query, _worker["filters"])
+        compiled_filter = compile_filters(search_query.client_filters)
+        scraper.search(search_query.text, search_query.qft)
+        downloader = Downloader(record["directory"], max_workers=_worker["workers"], per_host_limit=_worker["per_host_limit"],
+                                store=_worker["store"], scheduler=_worker["scheduler"], min_bytes=_worker["min_bytes"], max_bytes=_worker["max_bytes"])
+        scrape_timing = {"seconds": 0.0}
+        matching = (image for image in scraper.iter_image_data() if compiled_filter.matches(image))
+        near_duplicates = _worker["near_duplicates"]
+        if near_duplicates:
+            matching = near_duplicates.filter(matching)
+        images = _timed(islice(matching, max_images), scrape_timing)
+
+        # Processed on the download threads: the batch already uses every core.
+        post_processor = PostProcessor(_worker["processing"], processes=0) if _worker["processing"] else None
+
+        def on_result(result):
+            if near_duplicates and not result.ok:
+                near_duplicates.forget(result.image_data)
+            if post_processor and result.ok and not result.skipped:
+                post_processor.submit(result.image_data)
+
+        results = downloader.download_stream(images, on_result=on_result)
+        if post_processor:
+            processed = post_processor.wait()
+            record["processed"] = len(processed)
+            record["invalid"] = [{"path": p.path, "error": p.error} for p in processed if not p.ok]
+        record["found"] = len(results)
+        record["scrape_seconds"] = round(scrape_timing["seconds"], 3)
+        record["downloaded"] = sum(1 for r in results if r.ok and not r.skipped)
+        record["skipped"] = sum(1 for r in results if r.skipped)
+        record["failures"] = [{"url": r.image_data.image_source_url, "error": r.error} for r in results if not r.ok]
+        record["failed"] = len(record["failures"])
+    except Exception as e:
+        record["error"] = str(e)
+    record["total_seconds"] = round(time.perf_counter() - start_time, 3)
+    query_metrics = None
+    if metrics.enabled:
+        query_metrics = metrics.detach()
+        record["metrics"] = query_metrics.snapshot()
+    return record, query_metrics
+
+def run_batch(queries: Iterable[str], download_dir: str, manifest_path: str, processes: int = None,
+              max_images: int = 20, backend: str = "http", workers: int = 8, per_host_limit: int = 4,
+              host_rate: float = None, cache_ttl: float = None, min_bytes: int = 1024, max_bytes: int = 50 * 1024 * 1024,
+              filters: List[Filter] = None, near_duplicate_distance: int = None,
+              processing: ProcessingOptions = None, profile: bool = False, debug: bool = False) -> List[dict]:
+    """Runs each query in a pool of worker processes, downloading into per-query subdirectories.
+
+    One JSON line per query is appended to `manifest_path` as soon as that query finishes.
+    Search results are cached for `cache_ttl` seconds, unless it is None, and only results
+    matching every filter in `filters` are downloaded. With `profile`, each query's
+    metrics snapshot is recorded in its manifest line, and the metrics of every query are
+    merged into this process's `metrics` registry.
+    """
+    queries = list(queries)
+    processes = min(processes or os.cpu_count() or 1, max(len(queries), 1))
+    os.makedirs(download_dir, exist_ok=True)
+    records = []
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                             initargs=(backend, debug, download_dir, workers, per_host_limit, host_rate, cache_ttl, min_bytes, max_bytes,
+                                       filters, near_duplicate_distance, processing, profile)) as executor, \
+            open(manifest_path, "a", encoding="utf-8") as manifest:
+        futures = {executor.submit(_run_query, query, max_images): query for query in queries}
+        for future in as_completed(futures):
+            try:
+                record, query_metrics = future.result()
+            except Exception as e:
+                record, query_metrics = {"query": futures[future], "error": str(e)}, None
+            if query_metrics is not None:
+                metrics.merge(query_metrics)
+            records.append(record)
+            manifest.write(json.dumps(record) + "\n")
+            manifest.flush()
+            status = f"error: {record['error']}" if record.get("error") else f"{record['downloaded']}/{record['found']} downloaded"
+            print(f"[{len(records)}/{len(queries)}] '{record['query']}': {status}")
+    return records
@@ -0,0 +1,136 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from itertools import islice
+from typing import Iterator, List, Optional
+from bing_image_downloader.data_model import ImageData
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "bing_image_downloader", "results.sqlite3")
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split()).lower()
+
+def cache_key(query: str, qft: Optional[str] = None) -> str:
+    """The key results are cached under: the same words with different Bing filters are a
+    different result list."""
+    return f"{query} qft={qft}" if qft else query
+
+class ResultCache:
+    """SQLite-backed cache of scraped results, keyed by query and result offset.
+
+    Entries older than `ttl` seconds are treated as missing. Once the cache holds more than
+    `max_entries` results, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: float = 24 * 60 * 60, max_entries: int = 100_000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "query TEXT NOT NULL, offset INTEGER NOT NULL, data TEXT NOT NULL, raw_m TEXT, "
+                "stored_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (query, offset))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at)")
+
+    def get(self, query: str) -> List[ImageData]:
+        """Returns the fresh cached results for `query`, from offset 0 up to the first gap."""
+        query = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT offset, data FROM results WHERE query = ? AND stored_at >= ? ORDER BY offset",
+                (query, now - self.ttl),
+            ).fetchall()
+            images = []
+            for offset, data in rows:
+                if offset != len(images):
+                    break
+                images.append(ImageData.from_dict(json.loads(data)))
+            if images:
+                with self._conn:
+                    self._conn.execute("UPDATE results SET accessed_at = ? WHERE query = ? AND offset < ?",
+                                       (now, query, len(images)))
+        return images
+
+    def put(self, query: str, offset: int, image_data: ImageData, raw_m: Optional[str] = None):
+        """Stores a result, with the raw `m` JSON it was parsed from if given. The raw JSON
+        is only kept here, not on the ImageData held in memory."""
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO results (query, offset, data, raw_m, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (normalize_query(query), offset, json.dumps(image_data.to_dict()), raw_m, now, now),
+                )
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= 100:
+                self._evict()
+
+    def _evict(self):
+        self._puts_since_evict = 0
+        with self._conn:
+            self._conn.execute("DELETE FROM results WHERE stored_at < ?", (time.time() - self.ttl,))
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def close(self):
+        with self._lock:
+            self._evict()
+            self._conn.close()
+
+class CachingScraper:
+    """Wraps a scraper so fresh cached results are served first and only the tail is scraped.
+
+    The wrapped scraper's `search` is deferred until results past the cached ones are needed,
+    so a fully cached query never touches the network or the browser.
+    """
+
+    def __init__(self, scraper, cache: ResultCache):
+        self.scraper = scraper
+        self.cache = cache
+        self.debug = getattr(scraper, "debug", False)
+        self.query = None
+        self.qft = None
+        self._results = iter(())
+
+    def __getattr__(self, name):
+        return getattr(self.scraper, name)
+
+    def search(self, query: str, qft: Optional[str] = None):
+        self.query = query
+        self.qft = qft
+        self._results = self.iter_image_data()
+
+    def iter_image_data(self, **kwargs) -> Iterator[ImageData]:
+        query, qft = self.query, self.qft
+        key = cache_key(query, qft)
+        cached = self.cache.get(key)
+        if self.debug:
+            print(f"[DEBUG] {len(cached)} cached results for '{key}'")
+        yield from cached
+
+        self.scraper.search(query, qft)
+        self.scraper.scraped_image_ids.update(image.data_idx for image in cached)
+        offset = len(cached)
+        for image_data, raw_m in self.scraper.iter_image_data(start=offset, with_raw=True, **kwargs):
+            self.cache.put(key, offset, image_data, raw_m)
+            offset += 1
+            yield image_data
+
+    def get_image_data(self, max_images: int = 100, **kwargs) -> list[ImageData]:
+        """Gets the next `max_images` results, from the cache where possible."""
+        return list(islice(self._results, max_images))
@@ -1,25 +1,159 @@
 
 import argparse
-from bing_image_downloader.scraper import BingImageScraper
-from bing_image_downloader.downloader import Downloader
+import os
+from itertools import islice
+from bing_image_downloader.backends import BACKENDS
 
 def main():
     parser = argparse.ArgumentParser(description="Bing Image Scraper and Downloader CLI")
-    parser.add_argument("query", type=str, help="The search query for images.")
+    parser.add_argument("query", type=str, nargs="?", help="The search query for images.")
     parser.add_argument("--download_dir", type=str, default="downloads", help="The directory to save downloaded images.")
     parser.add_argument("--max_images", type=int, default=20, help="The maximum number of images to download.")
+    parser.add_argument("--workers", type=int, default=8, help="The number of concurrent downloads.")
+    parser.add_argument("--per_host_limit", type=int, default=4, help="The maximum number of concurrent downloads from a single host.")
+    parser.add_argument("--host_rate", type=float, default=8, help="The maximum number of requests per second to a single host (0 for no limit).")
+    parser.add_argument("--min_bytes", type=int, default=1024, help="Reject downloads smaller than this many bytes.")
+    parser.add_argument("--max_bytes", type=int, default=50 * 1024 * 1024, help="Abort downloads larger than this many bytes (0 for no limit).")
+    parser.add_argument("--backend", choices=BACKENDS, default="http", help="How to scrape results: plain HTTP, or a headless Firefox via Selenium.")
+    parser.add_argument("--filter", dest="filters", action="append", default=[], metavar="SPEC",
+                        help="Only download results matching SPEC, e.g. 'size>1000000', 'date>2024-01-31', 'age<7', "
+                             "'title~cat' or 'source!~pinterest'. May be repeated.")
+    parser.add_argument("--skip_near_duplicates", action="store_true",
+                        help="Skip results whose thumbnail looks like an image already downloaded to --download_dir.")
+    parser.add_argument("--near_duplicate_distance", type=int, default=6,
+                        help="How many bits (of 64) two perceptual hashes may differ by to count as the same image.")
+    parser.add_argument("--verify", action="store_true", help="Check that every downloaded file decodes and record its real dimensions.")
+    parser.add_argument("--resize", action="append", default=[], metavar="WxH",
+                        help="Also write a copy of each download scaled to fit WxH, into a WxH subdirectory (implies --verify). May be repeated.")
+    parser.add_argument("--convert", choices=["jpeg", "png", "webp", "gif", "bmp", "tiff"],
+                        help="Write copies in this format, into a subdirectory named after it (implies --verify).")
+    parser.add_argument("--process_workers", type=int, default=os.cpu_count(), help="The number of processes verifying, resizing and converting downloads.")
+    parser.add_argument("--cache_ttl", type=float, default=24 * 60 * 60, help="How long cached search results stay fresh, in seconds.")
+    parser.add_argument("--no_cache", action="store_true", help="Always scrape, ignoring the search result cache.")
+    parser.add_argument("--queries_file", type=str, help="Run a batch of queries read from this file, one per line ('-' for stdin).")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="The number of worker processes for a batch of queries.")
+    parser.add_argument("--manifest", type=str, help="Where to write the batch JSONL manifest (default: <download_dir>/manifest.jsonl).")
+    parser.add_argument("--profile", action="store_true", help="Record per-stage timings and counters and print a summary at the end.")
+    parser.add_argument("--metrics_jsonl", type=str, help="Append the recorded metrics to this JSON lines file (implies --profile).")
+    parser.add_argument("--metrics_prometheus", type=str, help="Write the recorded metrics to this Prometheus textfile (implies --profile).")
+    parser.add_argument("--debug", action="store_true", help="Print debug output.")
     args = parser.parse_args()
 
+    # Imported only once the arguments are parsed, so `--help` and usage errors don't pay
+    # for requests, numpy and sqlite.
+    from bing_image_downloader.metrics import JsonLinesSink, PrometheusTextfileSink, SummarySink, metrics, write_sinks
+
+    sinks = []
+    if args.profile:
+        sinks.append(SummarySink())
+    if args.metrics_jsonl:
+        sinks.append(JsonLinesSink(args.metrics_jsonl))
+    if args.metrics_prometheus:
+        sinks.append(PrometheusTextfileSink(args.metrics_prometheus))
+    if sinks:
+        metrics.enable()
+    try:
+        run(parser, args)
+    finally:
+        if sinks:
+            write_sinks(sinks)
+
+def run(parser, args):
+    from bing_image_downloader.backends import create_scraper
+    from bing_image_downloader.batch import read_queries, run_batch
+    from bing_image_downloader.cache import ResultCache
+    from bing_image_downloader.downloader import Downloader
+    from bing_image_downloader.filters import compile_filters, parse_filter_spec
+    from bing_image_downloader.metrics import metrics
+    from bing_image_downloader.query import build_query
+
+    try:
+        filters = [parse_filter_spec(spec) for spec in args.filters]
+        compile_filters(filters)
+    except ValueError as e:
+        parser.error(str(e))
+
+    processing = None
+    if args.verify or args.resize or args.convert:
+        from bing_image_downloader.processing import ProcessingOptions, parse_size
+        try:
+            processing = ProcessingOptions(resize=[parse_size(size) for size in args.resize], convert=args.convert)
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.queries_file:
+        queries = read_queries(args.queries_file)
+        manifest_path = args.manifest or os.path.join(args.download_dir, "manifest.jsonl")
+        print(f"Running {len(queries)} queries across {args.processes} processes...")
+        records = run_batch(queries, args.download_dir, manifest_path, processes=args.processes,
+                            max_images=args.max_images, backend=args.backend, workers=args.workers,
+                            per_host_limit=args.per_host_limit, cache_ttl=None if args.no_cache else args.cache_ttl,
+                            host_rate=args.host_rate, min_bytes=args.min_bytes, max_bytes=args.max_bytes,
+                            filters=filters, near_duplicate_distance=args.near_duplicate_distance if args.skip_near_duplicates else None,
+                            processing=processing, profile=metrics.enabled, debug=args.debug)
+        failed_queries = sum(1 for r in records if r.get("error"))
+        print(f"Batch complete. {len(records) - failed_queries} queries succeeded, {failed_queries} failed. Manifest: {manifest_path}")
+        return
+    if not args.query:
+        parser.error("a query is required unless --queries_file is given")
+
+    # Filters Bing can apply are sent with the query, so fewer results are scraped only to be dropped.
+    search_query = build_query(args.query, filters)
+    compiled_filter = compile_filters(search_query.client_filters)
     print(f"Searching for '{args.query}'...")
-    scraper = BingImageScraper()
-    scraper.search(args.query)
-    image_data = scraper.get_image_data(max_images=args.max_images)
-
-    if image_data:
-        print(f"Found {len(image_data)} images.")
-        downloader = Downloader(args.download_dir)
-        downloader.download(image_data)
-        print("Download complete.")
+    if args.debug and search_query.qft:
+        print(f"[DEBUG] Bing filters: {search_query.qft}")
+    cache = None if args.no_cache else ResultCache(ttl=args.cache_ttl)
+    near_duplicates = None
+    post_processor = None
+    try:
+        scraper = create_scraper(args.backend, debug=args.debug, cache=cache)
+        scraper.search(search_query.text, search_query.qft)
+
+        # Downloads start as soon as the first results are parsed, while scraping carries on.
+        downloader = Downloader(args.download_dir, max_workers=args.workers, per_host_limit=args.per_host_limit,
+                                host_rate=args.host_rate or None, min_bytes=args.min_bytes, max_bytes=args.max_bytes)
+        matching = (image for image in scraper.iter_image_data() if compiled_filter.matches(image))
+        if args.skip_near_duplicates:
+            from bing_image_downloader.perceptual import INDEX_FILENAME, NearDuplicateFilter, PerceptualIndex
+            from bing_image_downloader.thumbnails import ThumbnailFetcher
+            index = PerceptualIndex(os.path.join(args.download_dir, INDEX_FILENAME))
+            near_duplicates = NearDuplicateFilter(index, ThumbnailFetcher(debug=args.debug).get_bytes,
+                                                  max_distance=args.near_duplicate_distance, debug=args.debug)
+            matching = near_duplicates.filter(matching)
+
+        # Files are processed in other processes while the remaining downloads carry on.
+        if processing:
+            from bing_image_downloader.processing import PostProcessor
+            post_processor = PostProcessor(processing, processes=args.process_workers)
+
+        def on_result(result):
+            if near_duplicates and not result.ok:
+                near_duplicates.forget(result.image_data)
+            if post_processor and result.ok and not result.skipped:
+                post_processor.submit(result.image_data)
+
+        results = downloader.download_stream(islice(matching, args.max_images), on_result=on_result)
+        processed = post_processor.wait() if post_processor else []
+    finally:
+        if near_duplicates:
+            near_duplicates.shutdown()
+        if post_processor:
+            post_processor.shutdown()
+        if cache is not None:
+            cache.close()
+
+    if results:
+        print(f"Found {len(results)} images.")
+        failures = [r for r in results if not r.ok]
+        for result in failures:
+            print(f"Failed: {result.error}")
+        print(f"Download complete. {len(results) - len(failures)} succeeded, {len(failures)} failed.")
+        if post_processor:
+            invalid = [p for p in processed if not p.ok]
+            for p in invalid:
+                print(f"Invalid: {p.error}")
+            print(f"Processed {len(processed)} files, {len(invalid)} could not be decoded.")
     else:
         print("No images found.")
 
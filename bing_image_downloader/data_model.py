@@ -1,24 +1,51 @@
-from dataclasses import dataclass, field
-from typing import List, Optional
+from array import array
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional
 import datetime
+import re
+import sys
+from bing_image_downloader.indexes import NgramIndex, SortedIndex
 
-@dataclass(repr=False)
+@dataclass(repr=False, slots=True)
 class ImageData:
-    """Holds all the data for a single image."""
+    """Holds all the data for a single image.
+
+    Slotted to keep per-result memory small. The thumbnail itself is not held here; it lives
+    in a ThumbnailStore and is referenced by `thumbnail_key`.
+    """
     title: Optional[str] = None
-    size: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
     file_type: Optional[str] = None
     date: Optional[str] = None
     ago: Optional[str] = None
     site_source: Optional[str] = None
     image_source_url: Optional[str] = None
     data_idx: Optional[str] = None
-    thumbnail: Optional[bytes] = None
-    related_images: List['ImageData'] = field(default_factory=list)
+    thumbnail_url: Optional[str] = None
+    thumbnail_key: Optional[str] = None
+    related_images: Optional[List['ImageData']] = None
     downloaded_path: Optional[str] = None
     parsed_date: Optional[datetime.date] = None
     parsed_age: Optional[int] = None
 
+    @property
+    def size(self) -> Optional[str]:
+        if self.width and self.height:
+            return f"{self.width} x {self.height}"
+        return None
+
+    @size.setter
+    def size(self, value: Optional[str]):
+        match = re.search(r'(\d+)\s*x\s*(\d+)', value or "")
+        self.width, self.height = (int(match.group(1)), int(match.group(2))) if match else (None, None)
+
+    @property
+    def pixel_count(self) -> Optional[int]:
+        if self.width and self.height:
+            return self.width * self.height
+        return None
+
     def __repr__(self):
         return (
             f"ImageData(title='{self.title}', size='{self.size}', "
@@ -27,3 +54,87 @@ class ImageData:
             f"data_idx='{self.data_idx}', downloaded_path='{self.downloaded_path}', "
             f"parsed_date='{self.parsed_date}', parsed_age='{self.parsed_age}')"
         )
+
+    def to_dict(self) -> dict:
+        """Returns the scraped fields as a JSON-serializable dict."""
+        return {
+            "title": self.title, "width": self.width, "height": self.height,
+            "file_type": self.file_type, "date": self.date, "ago": self.ago,
+            "site_source": self.site_source, "image_source_url": self.image_source_url,
+            "data_idx": self.data_idx, "thumbnail_url": self.thumbnail_url,
+            "parsed_date": self.parsed_date.isoformat() if self.parsed_date else None,
+            "parsed_age": self.parsed_age,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ImageData':
+        data = dict(data)
+        size = data.pop("size", None)
+        if data.get("parsed_date"):
+            data["parsed_date"] = datetime.date.fromisoformat(data["parsed_date"])
+        info = cls(**data)
+        if size and info.width is None:
+            info.size = size
+        return info
+
+MISSING = -1
+
+class ImageDataStore:
+    """Append-only container for large result sets.
+
+    Holds the ImageData records in a list and keeps their filter fields as columns: typed
+    64-bit arrays for pixel count, parsed date (as an ordinal) and parsed age (-1 when
+    missing), and lowercased title and site source strings. Memory grows by a fixed, small
+    amount per result. Repeated strings like site and file type are interned and shared.
+
+    Each column also has an index that is updated as results are appended: a SortedIndex per
+    numeric column for range lookups, and an NgramIndex on title and site source for
+    substring lookups. Missing numeric values are left out of the sorted indexes.
+    """
+
+    def __init__(self, images: Iterable[ImageData] = ()):
+        self._items: List[ImageData] = []
+        self.pixel_counts = array('q')
+        self.date_ordinals = array('q')
+        self.ages = array('q')
+        self.titles: List[str] = []
+        self.sources: List[str] = []
+        self.sorted_indexes = {"pixel_counts": SortedIndex(), "date_ordinals": SortedIndex(), "ages": SortedIndex()}
+        self.ngram_indexes = {"titles": NgramIndex(), "sources": NgramIndex()}
+        self.extend(images)
+
+    def append(self, image_data: ImageData):
+        if image_data.site_source:
+            image_data.site_source = sys.intern(image_data.site_source)
+        if image_data.file_type:
+            image_data.file_type = sys.intern(image_data.file_type)
+        position = len(self._items)
+        self._items.append(image_data)
+        numbers = {
+            "pixel_counts": image_data.pixel_count or MISSING,
+            "date_ordinals": image_data.parsed_date.toordinal() if image_data.parsed_date else MISSING,
+            "ages": image_data.parsed_age if image_data.parsed_age is not None else MISSING,
+        }
+        for column, value in numbers.items():
+            getattr(self, column).append(value)
+            if value != MISSING:
+                self.sorted_indexes[column].add(value, position)
+        title = (image_data.title or "").lower()
+        source = sys.intern((image_data.site_source or "").lower())
+        self.titles.append(title)
+        self.sources.append(source)
+        self.ngram_indexes["titles"].add(title, position)
+        self.ngram_indexes["sources"].add(source, position)
+
+    def extend(self, images: Iterable[ImageData]):
+        for image_data in images:
+            self.append(image_data)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __iter__(self) -> Iterator[ImageData]:
+        return iter(self._items)
@@ -0,0 +1,155 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+from bing_image_downloader.data_model import ImageData
+from bing_image_downloader.downloader import DownloadCancelled, Downloader
+
+QUEUED = "queued"
+DOWNLOADING = "downloading"
+PAUSED = "paused"
+DONE = "done"
+SKIPPED = "skipped"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, SKIPPED, FAILED, CANCELLED)
+
+@dataclass
+class DownloadJob:
+    """State of one queued download, updated from the worker thread running it."""
+    id: int
+    image_data: ImageData
+    state: str = QUEUED
+    downloaded: int = 0
+    total: Optional[int] = None
+    path: Optional[str] = None
+    error: Optional[str] = None
+    _cancelled: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+class DownloadManager:
+    """Runs downloads in the background with bounded concurrency.
+
+    Every change to a job (state, or progress at most every `progress_interval` seconds) is
+    reported by calling `on_update(job)` from the worker thread. Pausing holds queued jobs
+    and blocks running ones between chunks. Cancelling stops a job at its next chunk and
+    keeps its part file, so downloading it again resumes.
+    """
+
+    def __init__(self, downloader: Downloader, max_workers: int = 4,
+                 on_update: Optional[Callable[[DownloadJob], None]] = None, progress_interval: float = 0.1):
+        self.downloader = downloader
+        self.on_update = on_update
+        self.progress_interval = progress_interval
+        self.jobs: Dict[int, DownloadJob] = {}
+        self._ids = itertools.count(1)
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="download")
+
+    @property
+    def paused(self) -> bool:
+        return not self._resumed.is_set()
+
+    def submit(self, images: Iterable[ImageData]) -> List[DownloadJob]:
+        jobs = []
+        for image_data in images:
+            job = DownloadJob(next(self._ids), image_data)
+            self.jobs[job.id] = job
+            jobs.append(job)
+            self._notify(job)
+            self._executor.submit(self._run, job)
+        return jobs
+
+    def pause(self):
+        self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def cancel(self, job_ids: Optional[Iterable[int]] = None):
+        """Cancels the given jobs, or every unfinished job if `job_ids` is None."""
+        for job_id in (list(self.jobs) if job_ids is None else job_ids):
+            job = self.jobs.get(job_id)
+            if job is None or job.finished:
+                continue
+            with self._lock:
+                job._cancelled.set()
+                # Jobs still waiting for a worker are cancelled right away; running ones
+                # stop at their next chunk.
+                cancelled_now = job.state == QUEUED
+                if cancelled_now:
+                    job.state = CANCELLED
+            if cancelled_now:
+                self._notify(job)
+
+    def clear_finished(self) -> List[int]:
+        """Forgets finished jobs and returns their ids."""
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished:
+            del self.jobs[job_id]
+        return finished
+
+    def shutdown(self):
+        self.cancel()
+        self._resumed.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _notify(self, job: DownloadJob):
+        if self.on_update:
+            try:
+                self.on_update(job)
+            except Exception as e:
+                print(f"Error in download update callback: {e}")
+
+    def _wait_while_paused(self, job: DownloadJob):
+        if self._resumed.is_set():
+            return
+        previous_state, job.state = job.state, PAUSED
+        self._notify(job)
+        while not self._resumed.wait(0.1):
+            if job._cancelled.is_set():
+                raise DownloadCancelled()
+        job.state = previous_state
+        self._notify(job)
+
+    def _run(self, job: DownloadJob):
+        last_update = 0.0
+
+        def progress(downloaded: int, total: Optional[int]):
+            nonlocal last_update
+            job.downloaded, job.total = downloaded, total
+            if job._cancelled.is_set():
+                raise DownloadCancelled()
+            self._wait_while_paused(job)
+            now = time.monotonic()
+            if now - last_update >= self.progress_interval:
+                last_update = now
+                self._notify(job)
+
+        while not self._resumed.wait(0.1):
+            if job._cancelled.is_set():
+                break
+        with self._lock:
+            if job.state == CANCELLED:
+                return
+            job.state = CANCELLED if job._cancelled.is_set() else DOWNLOADING
+        self._notify(job)
+        if job.state == CANCELLED:
+            return
+        result = self.downloader.download_result(job.image_data, progress=progress)
+        job.path = result.path
+        job.error = result.error
+        if result.cancelled:
+            job.state = CANCELLED
+        elif not result.ok:
+            job.state = FAILED
+        else:
+            job.state = SKIPPED if result.skipped else DONE
+        self._notify(job)
@@ -1,45 +1,485 @@
 
+import hashlib
 import os
+import threading
+import time
 import requests
-from typing import List
+import urllib3
+from dataclasses import dataclass
+from itertools import chain
+from typing import Callable, Iterable, List, Optional
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
 from bing_image_downloader.data_model import ImageData
+from bing_image_downloader.metrics import metrics
+from bing_image_downloader.scheduler import DownloadQueue, HostScheduler, HostUnavailable, RetryPolicy, parse_retry_after
+from bing_image_downloader.store import DownloadStore, normalize_url
+from bing_image_downloader.validation import (EXTENSIONS, SNIFF_BYTES, ContentValidationError, describe_content,
+                                              normalize_image_type, sniff_image_type)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# Called as progress(downloaded_bytes, total_bytes) while an image downloads; total_bytes is
+# None when the server sends no Content-Length. It may block to pause the download, or raise
+# DownloadCancelled to stop it.
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+def _validator(response) -> Optional[str]:
+    """The strong ETag of a response, or else its Last-Modified date, for If-Range."""
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('Last-Modified')
+
+class DownloadCancelled(Exception):
+    """Raised from a progress callback to stop a download. The part file is kept, so the
+    download resumes where it stopped the next time it is started."""
+
+class DownloadError(Exception):
+    """A failed download. `retryable` errors (timeouts, connection errors, 429 and 5xx
+    responses) may succeed if tried again later; `retry_after` is the server's Retry-After
+    in seconds, if it sent one."""
+
+    def __init__(self, message: str, retryable: bool = False, status: Optional[int] = None,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status = status
+        self.retry_after = retry_after
+
+@dataclass
+class DownloadResult:
+    """Outcome of downloading a single image."""
+    image_data: ImageData
+    path: Optional[str] = None
+    error: Optional[str] = None
+    skipped: bool = False
+    cancelled: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
 
 class Downloader:
-    def __init__(self, download_directory: str):
+    """Downloads images into `download_directory`.
+
+    Bodies are checked as they arrive: a download is abandoned as soon as the server
+    announces an HTML page or a size outside `min_bytes`..`max_bytes`, or its first bytes
+    are not a known image format, rather than after the whole body has been saved. Data is
+    written through a `write_buffer_size` buffer into a part file, preallocated when the
+    length is known, which is renamed into place once complete.
+
+    Requests go through a HostScheduler, which limits the concurrency and rate of requests
+    to each host (`per_host_limit`, `host_rate` per second) and stops sending them to hosts
+    that keep failing. Timeouts, connection errors, 429 and 5xx responses are retried with
+    `retry_policy`. Pass the same `scheduler` to several downloaders to share host state.
+    """
+
+    def __init__(self, download_directory: str, max_workers: int = 8, per_host_limit: int = 4,
+                 store: Optional[DownloadStore] = None, min_bytes: int = 1024, max_bytes: Optional[int] = 50 * 1024 * 1024,
+                 chunk_size: int = 64 * 1024, write_buffer_size: int = 1024 * 1024, preallocate: bool = True,
+                 host_rate: Optional[float] = None, retry_policy: Optional[RetryPolicy] = None,
+                 scheduler: Optional[HostScheduler] = None):
         self.download_directory = download_directory
         if not os.path.exists(self.download_directory):
             os.makedirs(self.download_directory)
+        self.store = store or DownloadStore(download_directory)
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.write_buffer_size = write_buffer_size
+        self.preallocate = preallocate and hasattr(os, "posix_fallocate")
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.scheduler = scheduler or HostScheduler(per_host_limit, rate=host_rate)
 
-    def download(self, image_data: ImageData):
-        if image_data.image_source_url:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            try:
-                print(f"[DEBUG] Attempting to download: {image_data.image_source_url}")
-                response = requests.get(image_data.image_source_url, stream=True, headers=headers, timeout=10)
-                response.raise_for_status() # Raise an exception for bad status codes
+        # One pooled session shared by every download so connections to the same
+        # host are reused instead of paying a fresh TCP/TLS handshake per image.
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': USER_AGENT})
+        adapter = HTTPAdapter(pool_connections=max(10, max_workers), pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._part_locks = {}
+        self._part_locks_lock = threading.Lock()
+
+    def _part_lock(self, part_path: str) -> threading.Lock:
+        with self._part_locks_lock:
+            return self._part_locks.setdefault(part_path, threading.Lock())
+
+    def _part_path(self, url: str) -> str:
+        url_hash = hashlib.sha1(normalize_url(url).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.download_directory, f".{url_hash}.part")
+
+    def _preferred_path(self, image_data: ImageData, image_type: Optional[str] = None) -> str:
+        file_extension = os.path.splitext(urlparse(image_data.image_source_url).path)[1]
+        if not file_extension or len(file_extension) > 5:
+            file_extension = f".{image_data.file_type.lower()}" if image_data.file_type else ".jpg"
+        if image_type and normalize_image_type(file_extension) != image_type:
+            # Name the file after what it actually contains, e.g. a WebP served from a .jpg URL.
+            file_extension = EXTENSIONS[image_type]
+
+        sanitized_title = "".join(c for c in (image_data.title or "") if c.isalnum() or c in (' ', '-')).rstrip()
+        if not sanitized_title:
+            sanitized_title = f"image_{image_data.data_idx}"
+
+        return os.path.join(self.download_directory, f"{sanitized_title}{file_extension}")
+
+    def _fetch(self, url: str, part_path: str):
+        """Requests `url`, resuming from an existing part file with a Range request if there is one.
+
+        The part file's ETag or Last-Modified is kept in a `.validator` file beside it and sent
+        as If-Range, so a resource that changed since is sent in full rather than appended to
+        the old bytes. A part file without a validator is not resumed.
+
+        Returns the response and the SHA-256 hasher and byte count of the part already on disk
+        (both reset if the download starts over).
+        """
+        hasher = hashlib.sha256()
+        validator_path = part_path + ".validator"
+        validator = None
+        if os.path.exists(validator_path):
+            with open(validator_path) as f:
+                validator = f.read().strip() or None
+        offset = os.path.getsize(part_path) if validator and os.path.exists(part_path) else 0
+        headers = {'Range': f'bytes={offset}-', 'If-Range': validator} if offset else {}
+        response = self.session.get(url, stream=True, headers=headers, timeout=10)
+        if offset and response.status_code == 416:
+            # The part file no longer matches what the server has; start over.
+            response.close()
+            os.remove(part_path)
+            os.remove(validator_path)
+            return self._fetch(url, part_path)
+        response.raise_for_status() # Raise an exception for bad status codes
+
+        if offset and response.status_code == 206 and _validator(response) in (None, validator):
+            with open(part_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    hasher.update(block)
+        else:
+            if offset and response.status_code == 206:
+                # A partial response for different content; the part file can't be used.
+                response.close()
+                os.remove(part_path)
+                os.remove(validator_path)
+                return self._fetch(url, part_path)
+            offset = 0
+            validator = _validator(response)
+            if validator:
+                with open(validator_path, 'w') as f:
+                    f.write(validator)
+            elif os.path.exists(validator_path):
+                os.remove(validator_path)
+        return response, hasher, offset
 
-                file_extension = os.path.splitext(image_data.image_source_url)[1]
-                if not file_extension or len(file_extension) > 5:
-                    file_extension = f".{image_data.file_type.lower()}" if image_data.file_type else ".jpg"
+    def _check_headers(self, response, resumed_from: int) -> Optional[int]:
+        """Rejects a response from its headers alone and returns the expected total size."""
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type.startswith(('text/html', 'application/json')):
+            raise ContentValidationError(f"server sent {content_type} instead of an image")
+        content_length = response.headers.get('Content-Length')
+        if not (content_length and content_length.isdigit()):
+            return None
+        total = resumed_from + int(content_length)
+        if self.max_bytes and total > self.max_bytes:
+            raise ContentValidationError(f"{total} bytes is over the {self.max_bytes} byte limit")
+        if total < self.min_bytes:
+            raise ContentValidationError(f"{total} bytes is under the {self.min_bytes} byte minimum")
+        return total
 
-                sanitized_title = "".join(c for c in image_data.title if c.isalnum() or c in (' ', '-')).rstrip()
-                if not sanitized_title:
-                    sanitized_title = f"image_{image_data.data_idx}"
+    def _check_head(self, head: bytes, image_data: ImageData) -> str:
+        """Returns the image type given by the first bytes of a download, or rejects it."""
+        image_type = sniff_image_type(head)
+        if image_type is None:
+            raise ContentValidationError(f"not an image: got {describe_content(head)}")
+        expected = normalize_image_type(image_data.file_type)
+        if expected and expected != image_type:
+            print(f"[DEBUG] {image_data.image_source_url} is {image_type}, not {expected}")
+            metrics.count("downloads_type_mismatch")
+        return image_type
 
-                file_path = os.path.join(self.download_directory, f"{sanitized_title}{file_extension}")
+    def _read_head(self, response, count: int) -> bytes:
+        """Reads the next `count` bytes of the body, or fewer if it ends first.
 
-                with open(file_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
+        Used instead of waiting for a whole `chunk_size` chunk, so an error page is rejected
+        after its first few bytes. Errors are raised as iter_content would raise them.
+        """
+        head = b""
+        try:
+            while len(head) < count:
+                block = response.raw.read(count - len(head), decode_content=True)
+                if not block:
+                    break
+                head += block
+        except urllib3.exceptions.ReadTimeoutError as e:
+            raise requests.exceptions.ConnectionError(e)
+        except urllib3.exceptions.DecodeError as e:
+            raise requests.exceptions.ContentDecodingError(e)
+        except urllib3.exceptions.HTTPError as e:
+            raise requests.exceptions.ChunkedEncodingError(e)
+        return head
+
+    def _write_part(self, response, image_data: ImageData, part_path: str, hasher, size: int,
+                    progress: Optional[ProgressCallback]):
+        """Streams the body of `response` onto the part file, validating it on the way.
+
+        Returns the final size and the sniffed image type. Raises ContentValidationError as
+        soon as the body is known to be unacceptable.
+        """
+        resumed_from = size
+        head = b""
+        try:
+            total = self._check_headers(response, resumed_from)
+            if resumed_from:
+                with open(part_path, 'rb') as f:
+                    head = f.read(SNIFF_BYTES)
+            # Only as much of the body as sniffing needs is read before the content is checked.
+            first = self._read_head(response, SNIFF_BYTES - len(head)) if len(head) < SNIFF_BYTES else b""
+            head += first
+            image_type = self._check_head(head, image_data) if len(head) >= SNIFF_BYTES else None
+        except (ContentValidationError, requests.exceptions.RequestException):
+            response.close()
+            raise
+
+        # A fresh download of known length is preallocated in a separate file, so a crash
+        # never leaves a zero-padded part file behind to be resumed from the wrong offset.
+        preallocate = self.preallocate and not resumed_from and total is not None
+        alloc_path = part_path + ".alloc"
+        if os.path.exists(alloc_path):
+            os.remove(alloc_path)
+        write_path = alloc_path if preallocate else part_path
+        try:
+            with response, open(write_path, 'ab' if resumed_from else 'wb', buffering=self.write_buffer_size) as f:
+                if preallocate:
+                    try:
+                        os.posix_fallocate(f.fileno(), 0, total)
+                    except OSError:
+                        pass # Not supported by this filesystem; the file just grows as usual.
+                try:
+                    if progress:
+                        progress(size, total)
+                    for chunk in chain([first] if first else [], response.iter_content(chunk_size=self.chunk_size)):
+                        if self.max_bytes and size + len(chunk) > self.max_bytes:
+                            raise ContentValidationError(f"body is over the {self.max_bytes} byte limit")
                         f.write(chunk)
+                        hasher.update(chunk)
+                        size += len(chunk)
+                        metrics.count("download_bytes", len(chunk))
+                        if progress:
+                            progress(size, total)
+                finally:
+                    if preallocate:
+                        f.truncate(size)
+        finally:
+            if preallocate and os.path.exists(alloc_path):
+                os.replace(alloc_path, part_path)
+
+        if image_type is None:
+            # The body ended within the first SNIFF_BYTES.
+            image_type = self._check_head(head, image_data)
+        if size < self.min_bytes:
+            raise ContentValidationError(f"{size} bytes is under the {self.min_bytes} byte minimum")
+        return size, image_type
+
+    def download(self, image_data: ImageData, progress: Optional[ProgressCallback] = None) -> bool:
+        """Downloads a single image, returning False if it was already in the download store.
+
+        `progress` is called with the bytes downloaded so far and the expected total, once
+        before the body is read and then after every chunk.
+        """
+        if image_data.image_source_url:
+            url = image_data.image_source_url
+            try:
+                existing_path = self.store.lookup_url(url, self.download_directory)
+                if existing_path:
+                    image_data.downloaded_path = existing_path
+                    print(f"Already downloaded {existing_path}")
+                    metrics.count("downloads_skipped")
+                    return False
+
+                part_path = self._part_path(url)
+                with self._part_lock(part_path), self.store.url_lock(url):
+                    # The same URL may have finished in another thread or process while we waited.
+                    existing_path = self.store.lookup_url(url, self.download_directory)
+                    if existing_path:
+                        image_data.downloaded_path = existing_path
+                        return False
 
+                    print(f"[DEBUG] Attempting to download: {url}")
+                    start_time = time.perf_counter()
+                    with metrics.span("download_first_byte"):
+                        response, hasher, size = self._fetch(url, part_path)
+                    resumed_from = size
+                    if size:
+                        print(f"[DEBUG] Resuming {url} from byte {size}")
+
+                    try:
+                        size, image_type = self._write_part(response, image_data, part_path, hasher, size, progress)
+                    except ContentValidationError:
+                        # Not worth resuming; the next attempt starts from scratch.
+                        for path in (part_path, part_path + ".validator"):
+                            if os.path.exists(path):
+                                os.remove(path)
+                        raise
+
+                    file_path = self.store.commit(part_path, url, hasher.hexdigest(), size, self._preferred_path(image_data, image_type))
+                    if os.path.exists(part_path + ".validator"):
+                        os.remove(part_path + ".validator")
+                metrics.observe("download", time.perf_counter() - start_time)
+                metrics.count("downloads")
+                if resumed_from:
+                    metrics.count("downloads_resumed")
                 image_data.downloaded_path = file_path
                 print(f"Successfully downloaded {file_path}")
+                return True
 
+            except DownloadCancelled:
+                raise
+            except ContentValidationError as e:
+                metrics.count("downloads_rejected")
+                raise DownloadError(f"Rejected {image_data.image_source_url}: {e}")
             except requests.exceptions.Timeout as e:
-                raise Exception(f"Download timed out for {image_data.image_source_url}: {e}")
+                metrics.count("download_failures")
+                raise DownloadError(f"Download timed out for {image_data.image_source_url}: {e}", retryable=True)
             except requests.exceptions.RequestException as e:
-                raise Exception(f"Failed to download {image_data.image_source_url}: {e}")
+                metrics.count("download_failures")
+                response = getattr(e, 'response', None)
+                status = response.status_code if response is not None else None
+                retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+                retryable = (isinstance(e, requests.exceptions.ConnectionError) if status is None
+                             else status == 429 or status >= 500)
+                raise DownloadError(f"Failed to download {image_data.image_source_url}: {e}", retryable, status, retry_after)
             except Exception as e:
-                raise Exception(f"An unexpected error occurred during download of {image_data.image_source_url}: {e}")
+                metrics.count("download_failures")
+                raise DownloadError(f"An unexpected error occurred during download of {image_data.image_source_url}: {e}")
+        return False
+
+    def _attempt(self, image_data: ImageData, progress: Optional[ProgressCallback] = None):
+        """Makes one attempt at a download. Returns the result and the DownloadError it
+        failed with, if any."""
+        try:
+            downloaded = self.download(image_data, progress)
+        except DownloadCancelled:
+            return DownloadResult(image_data, error="Cancelled", cancelled=True), None
+        except DownloadError as e:
+            return DownloadResult(image_data, error=str(e)), e
+        return DownloadResult(image_data, path=image_data.downloaded_path, skipped=not downloaded), None
+
+    def _finish(self, host: str, result: DownloadResult, error: Optional[DownloadError], attempt: int) -> Optional[float]:
+        """Reports an attempt to the scheduler and returns how long to wait before retrying
+        it, or None if it is done."""
+        if error is None or not error.retryable:
+            # Any answer from the host, even a 404, shows it is up.
+            self.scheduler.finish(host, record=not (result.skipped or result.cancelled))
+            return None
+        self.scheduler.finish(host, failed=error.status != 429, retry_after=error.retry_after,
+                              throttled=error.status == 429)
+        delay = self.retry_policy.delay(attempt, error.retry_after)
+        if delay is not None:
+            metrics.count("download_retries")
+            print(f"[DEBUG] Retrying {result.image_data.image_source_url} in {delay:.1f}s (attempt {attempt + 2})")
+        return delay
+
+    def download_result(self, image_data: ImageData, per_host_limit: Optional[int] = None,
+                        progress: Optional[ProgressCallback] = None) -> DownloadResult:
+        """Downloads a single image, waiting for its host and retrying transient failures,
+        and reports errors in the result instead of raising.
+
+        While waiting, `progress` is called with (0, None) so it can still cancel.
+        """
+        if not image_data.image_source_url:
+            return DownloadResult(image_data, error="No image source URL")
+        poll = (lambda: progress(0, None)) if progress else None
+        attempt = 0
+        while True:
+            try:
+                host = self.scheduler.acquire(image_data.image_source_url, per_host_limit, poll)
+            except DownloadCancelled:
+                return DownloadResult(image_data, error="Cancelled", cancelled=True)
+            except HostUnavailable as e:
+                metrics.count("downloads_host_unavailable")
+                return DownloadResult(image_data, error=f"Skipped {image_data.image_source_url}: {e}")
+            result, error = self._attempt(image_data, progress)
+            delay = self._finish(host, result, error, attempt)
+            if delay is None:
+                return result
+            attempt += 1
+            deadline = time.monotonic() + delay
+            try:
+                while time.monotonic() < deadline:
+                    time.sleep(min(0.1, max(0.0, deadline - time.monotonic())))
+                    if poll:
+                        poll()
+            except DownloadCancelled:
+                return DownloadResult(image_data, error="Cancelled", cancelled=True)
+
+    def download_many(self, images: Iterable[ImageData], max_workers: Optional[int] = None,
+                      per_host_limit: Optional[int] = None) -> List[DownloadResult]:
+        """Downloads images concurrently and returns one result per image, in input order."""
+        images = list(images)
+        if not images:
+            return []
+        max_workers = max_workers or self.max_workers
+        return self.download_stream(images, min(max_workers, len(images)), per_host_limit, queue_size=len(images))
+
+    def download_stream(self, images: Iterable[ImageData], max_workers: Optional[int] = None,
+                        per_host_limit: Optional[int] = None, queue_size: Optional[int] = None,
+                        on_result: Optional[Callable[[DownloadResult], None]] = None) -> List[DownloadResult]:
+        """Downloads images while they are still being produced, e.g. straight from a scraper.
+
+        `images` is consumed on the calling thread and fed through a bounded DownloadQueue
+        to a pool of download workers, so scraping and downloading overlap. When the workers
+        fall behind, the queue fills up and the producer blocks until there is room again.
+        Workers always take the first image whose host can be sent a request, so slow,
+        throttled or failing hosts don't hold up the rest; failed attempts are requeued
+        after their backoff. Returns one result per image, in the order the images were
+        produced.
+        """
+        max_workers = max_workers or self.max_workers
+        jobs = DownloadQueue(self.scheduler, per_host_limit, maxsize=queue_size or max_workers * 2)
+        results = {}
+
+        def report(index: int, result: DownloadResult):
+            results[index] = result
+            if on_result:
+                try:
+                    on_result(result)
+                except Exception as e:
+                    print(f"Error in download result callback: {e}")
+
+        def worker():
+            while True:
+                job = jobs.get()
+                if job is None:
+                    return
+                try:
+                    if job.unavailable:
+                        metrics.count("downloads_host_unavailable")
+                        report(job.index, DownloadResult(job.image_data, error=f"Skipped {job.image_data.image_source_url}: "
+                                                                                f"{job.host} is unavailable after repeated failures"))
+                        continue
+                    result, error = self._attempt(job.image_data)
+                    delay = self._finish(job.host, result, error, job.attempt)
+                    if delay is None:
+                        report(job.index, result)
+                    else:
+                        jobs.retry(job, delay)
+                finally:
+                    jobs.task_done()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(max_workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            for index, image_data in enumerate(images):
+                if image_data.image_source_url:
+                    jobs.put(index, image_data)
+                else:
+                    report(index, DownloadResult(image_data, error="No image source URL"))
+        finally:
+            jobs.close()
+            for thread in threads:
+                thread.join()
+        return [results[index] for index in sorted(results)]
@@ -0,0 +1,127 @@
+import threading
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.webdriver.firefox.options import Options
+from selenium.common.exceptions import WebDriverException
+
+def launch_firefox():
+    options = Options()
+    options.add_argument("-headless")
+    options.add_argument("--window-size=1920,1080")
+    return webdriver.Firefox(options=options)
+
+class DriverPool:
+    """Keeps up to `size` headless Firefox instances warm for reuse across searches.
+
+    Drivers are reset between leases by clearing storage and cookies and navigating to
+    about:blank, and are recycled after `max_uses` leases or as soon as one fails.
+    """
+
+    def __init__(self, size: int = 1, max_uses: int = 50, debug=False):
+        self.size = size
+        self.max_uses = max_uses
+        self.debug = debug
+        self._idle = []
+        self._uses = {}
+        self._count = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def warm(self, count: int = None):
+        """Launches drivers ahead of time so the first searches don't pay the cold start."""
+        count = self.size if count is None else min(count, self.size)
+        while True:
+            with self._condition:
+                if self._closed or self._count >= count:
+                    return
+                self._count += 1
+            driver = self._launch()
+            with self._condition:
+                self._idle.append(driver)
+                self._condition.notify()
+
+    def _launch(self):
+        try:
+            driver = launch_firefox()
+        except Exception:
+            with self._condition:
+                self._count -= 1
+                self._condition.notify()
+            raise
+        self._uses[id(driver)] = 0
+        if self.debug:
+            print(f"[DEBUG] Launched a new Firefox driver ({self._count}/{self.size} in pool)")
+        return driver
+
+    def acquire(self, timeout: float = None):
+        """Returns an idle driver, launching one if the pool is not full yet."""
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("DriverPool is closed")
+                if self._idle:
+                    driver = self._idle.pop()
+                    break
+                if self._count < self.size:
+                    self._count += 1
+                    driver = None
+                    break
+                if not self._condition.wait(timeout):
+                    raise TimeoutError("Timed out waiting for a free driver")
+        if driver is None:
+            driver = self._launch()
+        self._uses[id(driver)] += 1
+        return driver
+
+    def _reset(self, driver):
+        driver.switch_to.default_content()
+        driver.execute_script("try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}")
+        driver.delete_all_cookies()
+        driver.get("about:blank")
+
+    def _discard(self, driver):
+        self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+        with self._condition:
+            self._count -= 1
+            self._condition.notify()
+
+    def release(self, driver, broken: bool = False):
+        """Returns a driver to the pool, or quits it if it is broken or worn out."""
+        if broken or self._closed or self._uses.get(id(driver), 0) >= self.max_uses:
+            if self.debug:
+                print("[DEBUG] Recycling Firefox driver.")
+            self._discard(driver)
+            return
+        try:
+            self._reset(driver)
+        except WebDriverException as e:
+            if self.debug:
+                print(f"[DEBUG] Could not reset driver, recycling it: {e}")
+            self._discard(driver)
+            return
+        with self._condition:
+            self._idle.append(driver)
+            self._condition.notify()
+
+    @contextmanager
+    def lease(self, timeout: float = None):
+        driver = self.acquire(timeout)
+        broken = False
+        try:
+            yield driver
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            self.release(driver, broken=broken)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for driver in idle:
+            self._discard(driver)
@@ -0,0 +1,174 @@
+import datetime
+import re
+from dataclasses import dataclass
+from typing import Any, Iterable, List
+import numpy as np
+from bing_image_downloader.data_model import MISSING, ImageData, ImageDataStore
+from bing_image_downloader.metrics import metrics
+
+# Criteria and their operators, in the order the GUI filter bar offers them.
+CRITERIA = {
+    "Source": ["contains", "does not contain"],
+    "Title": ["contains", "does not contain"],
+    "Size (px)": ["is greater than", "is less than"],
+    "Date": ["is after", "is before", "is on"],
+    "Age": ["older than (days)", "newer than (days)"],
+}
+
+@dataclass
+class Filter:
+    criterion: str
+    operator: str
+    value: Any
+
+    def __str__(self):
+        value = self.value.strftime('%Y-%m-%d') if isinstance(self.value, datetime.date) else str(self.value)
+        return f"{self.criterion} {self.operator} '{value}'"
+
+# CLI shorthand: "<field><op><value>", e.g. "size>1000000", "title~cat", "source!~pinterest",
+# "date>2024-01-31", "age<7".
+SPEC_FIELDS = {"source": "Source", "title": "Title", "size": "Size (px)", "date": "Date", "age": "Age"}
+SPEC_OPERATORS = {
+    ("Source", "~"): "contains", ("Source", "!~"): "does not contain",
+    ("Title", "~"): "contains", ("Title", "!~"): "does not contain",
+    ("Size (px)", ">"): "is greater than", ("Size (px)", "<"): "is less than",
+    ("Date", ">"): "is after", ("Date", "<"): "is before", ("Date", "="): "is on",
+    ("Age", ">"): "older than (days)", ("Age", "<"): "newer than (days)",
+}
+
+def parse_filter_spec(spec: str) -> Filter:
+    """Parses a CLI filter such as "size>1000000" or "title~cat" into a Filter."""
+    match = re.match(r'^\s*(\w+)\s*(!~|~|>|<|=)\s*(.+?)\s*$', spec)
+    if not match:
+        raise ValueError(f"Invalid filter '{spec}'; expected <field><op><value>, e.g. size>1000000")
+    field_name, op, value = match.groups()
+    criterion = SPEC_FIELDS.get(field_name.lower())
+    if criterion is None:
+        raise ValueError(f"Unknown filter field '{field_name}'; expected one of {', '.join(SPEC_FIELDS)}")
+    operator = SPEC_OPERATORS.get((criterion, op))
+    if operator is None:
+        raise ValueError(f"Operator '{op}' is not supported for {field_name}")
+    if criterion == "Date":
+        value = datetime.date.fromisoformat(value)
+    return Filter(criterion, operator, value)
+
+class CompiledFilter:
+    """A list of filters compiled into a single predicate.
+
+    `apply` looks up candidate rows in the most selective of an ImageDataStore's indexes,
+    evaluates the remaining numeric filters as vectorized comparisons over its columns, then
+    runs the string filters only on the rows that are still left. `matches`
+    checks a single ImageData, for filtering results as they stream in.
+    """
+
+    def __init__(self, filters: Iterable[Filter]):
+        self.numeric = []
+        self.text = []
+        for f in filters:
+            self._compile(f)
+
+    def _compile(self, f: Filter):
+        operators = CRITERIA.get(f.criterion)
+        if operators is None or f.operator not in operators:
+            raise ValueError(f"Unsupported filter: {f.criterion} {f.operator}")
+        if f.criterion in ("Source", "Title"):
+            column = "titles" if f.criterion == "Title" else "sources"
+            self.text.append((column, str(f.value).lower(), f.operator == "contains"))
+        elif f.criterion == "Size (px)":
+            value = int(f.value)
+            if value <= 0:
+                raise ValueError(f"Size must be a positive number of pixels, got {f.value}")
+            self.numeric.append(("pixel_counts", ">" if f.operator == "is greater than" else "<", value))
+        elif f.criterion == "Date":
+            value = f.value if isinstance(f.value, datetime.date) else datetime.date.fromisoformat(str(f.value))
+            op = {"is after": ">", "is before": "<", "is on": "=="}[f.operator]
+            self.numeric.append(("date_ordinals", op, value.toordinal()))
+        elif f.criterion == "Age":
+            self.numeric.append(("ages", ">" if f.operator == "older than (days)" else "<", int(f.value)))
+
+    def _candidates(self, store: ImageDataStore):
+        """Picks the most selective filter that an index of `store` can answer.
+
+        Returns the candidate rows from that index and the filter it answers exactly (None
+        for substring candidates, which still need verifying), or (None, None) if no index
+        applies and every row has to be checked.
+        """
+        best_count, best = None, None
+        for f in self.numeric:
+            column, op, value = f
+            count = store.sorted_indexes[column].count(op, value)
+            if best_count is None or count < best_count:
+                best_count, best = count, ("numeric", f)
+        for f in self.text:
+            column, value, contains = f
+            if not contains:
+                continue
+            count = store.ngram_indexes[column].count(value)
+            if count is not None and (best_count is None or count < best_count):
+                best_count, best = count, ("text", f)
+        if best is None:
+            return None, None
+        kind, f = best
+        if kind == "numeric":
+            column, op, value = f
+            return np.sort(store.sorted_indexes[column].lookup(op, value)), f
+        column, value, _ = f
+        return store.ngram_indexes[column].candidates(value), None
+
+    def indices(self, store: ImageDataStore) -> np.ndarray:
+        """Returns the positions in `store` of the results that pass every filter.
+
+        Starts from the rows the most selective index returns, so the work is proportional
+        to the number of candidates rather than to the size of the store.
+        """
+        count = len(store)
+        rows, answered = self._candidates(store)
+        if rows is None:
+            rows = np.arange(count)
+        for f in self.numeric:
+            if f is answered:
+                continue
+            column, op, value = f
+            values = np.frombuffer(getattr(store, column), dtype=np.int64, count=count)[rows]
+            keep = values != MISSING
+            if op == ">":
+                keep &= values > value
+            elif op == "<":
+                keep &= values < value
+            else:
+                keep &= values == value
+            rows = rows[keep]
+        for column, value, contains in self.text:
+            strings = getattr(store, column)
+            keep = np.fromiter(((value in strings[i]) == contains for i in rows), dtype=bool, count=len(rows))
+            rows = rows[keep]
+        return rows
+
+    def apply(self, store: ImageDataStore) -> List[ImageData]:
+        if not self.numeric and not self.text:
+            return list(store)
+        with metrics.span("filter"):
+            return [store[i] for i in self.indices(store)]
+
+    def matches(self, image_data: ImageData) -> bool:
+        fields = {
+            "pixel_counts": image_data.pixel_count,
+            "date_ordinals": image_data.parsed_date.toordinal() if image_data.parsed_date else None,
+            "ages": image_data.parsed_age,
+            "titles": (image_data.title or "").lower(),
+            "sources": (image_data.site_source or "").lower(),
+        }
+        for column, op, value in self.numeric:
+            actual = fields[column]
+            if actual is None:
+                return False
+            if (op == ">" and not actual > value) or (op == "<" and not actual < value) or (op == "==" and actual != value):
+                return False
+        for column, value, contains in self.text:
+            if (value in fields[column]) != contains:
+                return False
+        return True
+
+def compile_filters(filters: Iterable[Filter]) -> CompiledFilter:
+    """Compiles filters into one predicate. Raises ValueError for an invalid filter value."""
+    return CompiledFilter(filters)
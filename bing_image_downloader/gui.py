@@ -1,94 +1,403 @@
 import sys
 import threading
-import datetime
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import numpy as np
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QLineEdit, QPushButton, QScrollArea, QGridLayout, QLabel,
+    QLineEdit, QPushButton, QListView, QAbstractItemView, QLabel,
     QSplitter, QTextEdit, QFrame, QComboBox, QSpacerItem, QSizePolicy,
-    QDateEdit, QMessageBox
+    QDateEdit, QMessageBox, QStyledItemDelegate, QDockWidget, QTableWidget,
+    QTableWidgetItem, QHeaderView, QProgressBar, QCheckBox
+)
+from PyQt6.QtGui import QImage, QColor, QPen
+from PyQt6.QtCore import (
+    Qt, QSize, QRect, pyqtSignal, QObject, QDate, QAbstractListModel, QModelIndex,
+    QAbstractProxyModel, QTimer
 )
-from PyQt6.QtGui import QPixmap, QPainter, QColor, QBrush
-from PyQt6.QtCore import Qt, QSize, pyqtSignal, QObject, QDate
 
-from bing_image_downloader.scraper import BingImageScraper
+from bing_image_downloader.backends import create_scraper
+from bing_image_downloader.cache import ResultCache
 from bing_image_downloader.downloader import Downloader
-from bing_image_downloader.data_model import ImageData
+from bing_image_downloader.download_manager import CANCELLED, DONE, FAILED, SKIPPED, DownloadManager
+from bing_image_downloader.data_model import ImageDataStore
+from bing_image_downloader.filters import CRITERIA, Filter, compile_filters
+from bing_image_downloader.query import build_query
+from bing_image_downloader.metrics import SummarySink, metrics, write_sinks
+from bing_image_downloader.perceptual import NearDuplicateGroups, PerceptualHasher
+from bing_image_downloader.thumbnails import ThumbnailFetcher
 
 class Communicate(QObject):
     search_finished = pyqtSignal(list)
     load_more_finished = pyqtSignal(list)
     details_finished = pyqtSignal(object)
+    thumbnail_ready = pyqtSignal(object)
+    thumbnail_hashed = pyqtSignal(object, object)
+    download_updated = pyqtSignal(object)
+    scraper_ready = pyqtSignal(object)
     error = pyqtSignal(str)
 
-class ImageWidget(QWidget):
-    selected_signal = pyqtSignal(ImageData)
-
-    def __init__(self, data: ImageData, parent=None):
+def format_bytes(count: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if count < 1024:
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+    return f"{count:.1f} GB"
+
+ImageDataRole = Qt.ItemDataRole.UserRole
+SelectedRole = Qt.ItemDataRole.UserRole + 1
+ThumbnailStatusRole = Qt.ItemDataRole.UserRole + 2
+SimilarCountRole = Qt.ItemDataRole.UserRole + 3
+
+THUMBNAIL_SIZE = 150
+
+class ThumbnailImageCache:
+    """LRU cache of decoded thumbnails, keyed by (data_idx, size) and bounded by the total
+    size of the images in bytes."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._images = OrderedDict()
+
+    def __len__(self):
+        return len(self._images)
+
+    def get(self, key):
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+        return image
+
+    def put(self, key, image: QImage):
+        previous = self._images.pop(key, None)
+        if previous is not None:
+            self.total_bytes -= previous.sizeInBytes()
+        self._images[key] = image
+        self.total_bytes += image.sizeInBytes()
+        while self.total_bytes > self.max_bytes and len(self._images) > 1:
+            _, evicted = self._images.popitem(last=False)
+            self.total_bytes -= evicted.sizeInBytes()
+
+    def clear(self):
+        self._images.clear()
+        self.total_bytes = 0
+
+class ResultsModel(QAbstractListModel):
+    """List model over an ImageDataStore.
+
+    Selection is kept here by `data_idx`, so it survives filter changes and rows scrolling
+    out of view. Thumbnails are decoded and scaled to QImages in a worker pool only when a
+    visible cell asks for them, and kept in a ThumbnailImageCache. Until then the cell shows
+    a placeholder.
+
+    Results whose thumbnails have been perceptually hashed are grouped into near-duplicates;
+    the first of each group reports how many copies follow it.
+    """
+
+    thumbnail_decoded = pyqtSignal(object, object, int)
+
+    def __init__(self, load_thumbnail, parent=None, max_workers: int = 4, cache_bytes: int = 64 * 1024 * 1024):
         super().__init__(parent)
-        self.data = data
-        self.is_selected = False
-        self.setFixedSize(180, 200)
+        self.load_thumbnail = load_thumbnail
+        self.debug = getattr(parent, "debug", False)
+        self.store = ImageDataStore()
+        self.selected = {}
+        self._rows = {}
+        self.image_cache = ThumbnailImageCache(cache_bytes)
+        self._pending = set()
+        self._failed = set()
+        self._generation = 0
+        self.near_duplicates = NearDuplicateGroups()
+        self._decoder = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnail-decode")
+        self.thumbnail_decoded.connect(self._on_thumbnail_decoded)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.store)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        image_data = self.store[index.row()]
+        if role == ImageDataRole:
+            return image_data
+        if role == Qt.ItemDataRole.DisplayRole:
+            return image_data.title or "Untitled"
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self._thumbnail_image(image_data)
+        if role == ThumbnailStatusRole:
+            key = (image_data.data_idx, THUMBNAIL_SIZE)
+            if key in self._failed or not (image_data.thumbnail_url or image_data.thumbnail_key):
+                return "missing"
+            return "ready" if self.image_cache.get(key) is not None else "loading"
+        if role == SelectedRole:
+            return image_data.data_idx in self.selected
+        if role == SimilarCountRole:
+            return self.near_duplicates.similar_count(image_data.data_idx)
+        return None
+
+    def _thumbnail_image(self, image_data):
+        key = (image_data.data_idx, THUMBNAIL_SIZE)
+        image = self.image_cache.get(key)
+        if image is None and image_data.thumbnail_key and key not in self._pending and key not in self._failed:
+            self._pending.add(key)
+            self._decoder.submit(self._decode, image_data, key, self._generation)
+        return image
+
+    def _decode(self, image_data, key, generation):
+        image = None
+        start_time = time.perf_counter()
+        try:
+            thumbnail = self.load_thumbnail(image_data)
+            decoded = QImage()
+            if thumbnail and decoded.loadFromData(thumbnail):
+                image = decoded.scaled(THUMBNAIL_SIZE, THUMBNAIL_SIZE, Qt.AspectRatioMode.KeepAspectRatio,
+                                       Qt.TransformationMode.SmoothTransformation)
+                image = image.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+        except Exception as e:
+            if self.debug:
+                print(f"[DEBUG] Error decoding thumbnail for {image_data.title}: {e}")
+        metrics.observe("thumbnail_decode", time.perf_counter() - start_time)
+        self.thumbnail_decoded.emit(key, image, generation)
 
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(5, 5, 5, 5)
+    def _on_thumbnail_decoded(self, key, image, generation):
+        if generation != self._generation:
+            return
+        self._pending.discard(key)
+        if image is None:
+            self._failed.add(key)
+        else:
+            self.image_cache.put(key, image)
+        row = self._rows.get(key[0])
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+    def set_store(self, store: ImageDataStore):
+        metrics.count("grid_resets")
+        self.beginResetModel()
+        self.store = store
+        self.selected = {}
+        self.image_cache.clear()
+        self._pending = set()
+        self._failed = set()
+        self._generation += 1
+        self.near_duplicates = NearDuplicateGroups()
+        self._rows = {image_data.data_idx: row for row, image_data in enumerate(store)}
+        self.endResetModel()
+
+    def extend(self, images):
+        if not images:
+            return
+        first = len(self.store)
+        self.beginInsertRows(QModelIndex(), first, first + len(images) - 1)
+        self.store.extend(images)
+        for row, image_data in enumerate(images, first):
+            self._rows[image_data.data_idx] = row
+        self.endInsertRows()
+
+    def row_changed(self, image_data, role):
+        row = self._rows.get(image_data.data_idx)
+        if row is not None and self.store[row] is image_data:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [role])
+
+    def thumbnail_fetched(self, image_data):
+        """Repaints a result once its thumbnail fetch has finished. If the fetch failed, no
+        thumbnail is stored and the cell shows as missing instead of loading forever."""
+        if not image_data.thumbnail_key:
+            self._failed.add((image_data.data_idx, THUMBNAIL_SIZE))
+        self.row_changed(image_data, Qt.ItemDataRole.DecorationRole)
+
+    def add_perceptual_hash(self, image_data, value) -> bool:
+        """Groups a result by the hash of its thumbnail. Returns True if it is a near-duplicate
+        of an earlier result."""
+        row = self._rows.get(image_data.data_idx)
+        if row is None or self.store[row] is not image_data:
+            return False # From a previous search.
+        leader = self.near_duplicates.add(image_data.data_idx, value)
+        if leader == image_data.data_idx:
+            return False
+        leader_row = self._rows.get(leader)
+        if leader_row is not None:
+            index = self.index(leader_row)
+            self.dataChanged.emit(index, index, [SimilarCountRole])
+        return True
+
+    def duplicate_rows(self):
+        return {self._rows[data_idx] for data_idx in self.near_duplicates.leader_of if data_idx in self._rows}
+
+    def toggle_selected(self, image_data) -> bool:
+        if image_data.data_idx in self.selected:
+            del self.selected[image_data.data_idx]
+        else:
+            self.selected[image_data.data_idx] = image_data
+        self.row_changed(image_data, SelectedRole)
+        return image_data.data_idx in self.selected
 
-        self.pixmap_label = QLabel()
-        self.pixmap_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        layout.addWidget(self.pixmap_label)
+    def shutdown(self):
+        self._decoder.shutdown(wait=False, cancel_futures=True)
 
-        if data.thumbnail and isinstance(data.thumbnail, bytes):
-            try:
-                if self.parent().debug:
-                    print(f"[DEBUG] Attempting to load thumbnail for {data.title}...")
-                pixmap = QPixmap()
-                if pixmap.loadFromData(data.thumbnail):
-                    self.pixmap_label.setPixmap(pixmap.scaled(150, 150, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
-                    if self.parent().debug:
-                        print(f"[DEBUG] Thumbnail loaded successfully for {data.title}")
-                else:
-                    if self.parent().debug:
-                        print(f"[DEBUG] QPixmap.loadFromData failed for {data.title}. Data might be corrupted or invalid.")
-                    self.pixmap_label.setText("No Image")
-            except Exception as e:
-                if self.parent().debug:
-                    print(f"[DEBUG] Error loading thumbnail for {data.title}: {e}")
-                self.pixmap_label.setText("No Image")
+    def clear_selection(self):
+        self.selected = {}
+        if len(self.store):
+            self.dataChanged.emit(self.index(0), self.index(len(self.store) - 1), [SelectedRole])
+
+class ResultsFilterModel(QAbstractProxyModel):
+    """Shows only the source rows accepted by the active filters (all rows when None).
+
+    The accepted rows are held as a sorted array, so a filter change swaps in the array the
+    filter produced and mapping an index is a binary search. Unlike QSortFilterProxyModel,
+    nothing is evaluated per source row, so the cost depends on the number of matches
+    rather than on the total number of results.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.accepted_rows = None
+        # Kept up to date rather than asked of the source, as views call index() per row.
+        self._row_count = 0
+
+    def setSourceModel(self, model):
+        super().setSourceModel(model)
+        model.dataChanged.connect(self._on_data_changed)
+        model.rowsAboutToBeInserted.connect(self._on_rows_about_to_be_inserted)
+        model.rowsInserted.connect(self._on_rows_inserted)
+        model.modelAboutToBeReset.connect(self.beginResetModel)
+        model.modelReset.connect(self._on_model_reset)
+        self._update_row_count()
+
+    def _update_row_count(self):
+        if self.accepted_rows is not None:
+            self._row_count = len(self.accepted_rows)
         else:
-            if self.parent().debug:
-                print(f"[DEBUG] No valid thumbnail data for {data.title} (is None or not bytes).")
-            self.pixmap_label.setText("No Image")
-
-        title_label = QLabel(data.title or "Untitled")
-        title_label.setWordWrap(True)
-        title_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        layout.addWidget(title_label)
-
-    def mousePressEvent(self, event):
-        self.is_selected = not self.is_selected
-        self.update()
-        self.selected_signal.emit(self.data)
-        super().mousePressEvent(event)
-
-    def paintEvent(self, event):
-        super().paintEvent(event)
-        painter = QPainter(self)
-        if self.is_selected:
-            pen = painter.pen()
-            pen.setColor(QColor("lightblue"))
-            pen.setWidth(3)
-            painter.setPen(pen)
-            painter.drawRect(self.rect().adjusted(1, 1, -1, -1))
+            self._row_count = self.sourceModel().rowCount() if self.sourceModel() is not None else 0
+
+    def set_accepted_rows(self, rows):
+        old_sources = [self.mapToSource(index) for index in self.persistentIndexList()]
+        self.layoutAboutToBeChanged.emit()
+        self.accepted_rows = None if rows is None else np.unique(np.asarray(rows, dtype=np.int64))
+        self._update_row_count()
+        self.changePersistentIndexList(self.persistentIndexList(), [self.mapFromSource(index) for index in old_sources])
+        self.layoutChanged.emit()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 1
+
+    def index(self, row, column=0, parent=QModelIndex()):
+        if column != 0 or not 0 <= row < self._row_count or parent.isValid():
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid() or self.sourceModel() is None:
+            return QModelIndex()
+        row = proxy_index.row()
+        if self.accepted_rows is not None:
+            if row >= len(self.accepted_rows):
+                return QModelIndex()
+            row = int(self.accepted_rows[row])
+        return self.sourceModel().index(row, proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        row = source_index.row()
+        if self.accepted_rows is not None:
+            position = int(np.searchsorted(self.accepted_rows, row))
+            if position >= len(self.accepted_rows) or self.accepted_rows[position] != row:
+                return QModelIndex()
+            row = position
+        return self.index(row, source_index.column())
+
+    def _proxy_range(self, first, last):
+        if self.accepted_rows is None:
+            return first, last
+        return (int(np.searchsorted(self.accepted_rows, first)),
+                int(np.searchsorted(self.accepted_rows, last, side="right")) - 1)
+
+    def _on_data_changed(self, top_left, bottom_right, roles=()):
+        first, last = self._proxy_range(top_left.row(), bottom_right.row())
+        if first <= last:
+            self.dataChanged.emit(self.index(first), self.index(last), roles)
+
+    # New source rows show up unfiltered; while a filter is active they stay hidden until
+    # it is applied again with them.
+    def _on_rows_about_to_be_inserted(self, parent, first, last):
+        if self.accepted_rows is None:
+            self.beginInsertRows(QModelIndex(), first, last)
+
+    def _on_rows_inserted(self, parent, first, last):
+        if self.accepted_rows is None:
+            self._update_row_count()
+            self.endInsertRows()
+
+    def _on_model_reset(self):
+        self.accepted_rows = None
+        self._update_row_count()
+        self.endResetModel()
+
+class ThumbnailDelegate(QStyledItemDelegate):
+    """Paints a result cell: thumbnail, size overlay, title and selection border."""
+
+    CELL_SIZE = QSize(180, 200)
+
+    def sizeHint(self, option, index):
+        return self.CELL_SIZE
+
+    def paint(self, painter, option, index):
+        image_data = index.data(ImageDataRole)
+        rect = option.rect.adjusted(5, 5, -5, -5)
+        thumbnail_rect = QRect(rect.left(), rect.top(), rect.width(), THUMBNAIL_SIZE)
+        text_color = option.palette.text().color()
+
+        painter.save()
+        image = index.data(Qt.ItemDataRole.DecorationRole)
+        if image is not None:
+            painter.drawImage(thumbnail_rect.left() + (thumbnail_rect.width() - image.width()) // 2,
+                              thumbnail_rect.top() + (thumbnail_rect.height() - image.height()) // 2, image)
+        else:
+            painter.fillRect(thumbnail_rect.adjusted(10, 10, -10, -10), QColor(68, 68, 68))
+            painter.setPen(text_color)
+            placeholder = "No Image" if index.data(ThumbnailStatusRole) == "missing" else "Loading..."
+            painter.drawText(thumbnail_rect, Qt.AlignmentFlag.AlignCenter, placeholder)
 
-        if self.data.size:
+        similar = index.data(SimilarCountRole)
+        if similar:
             painter.setPen(Qt.GlobalColor.white)
-            painter.setBrush(QBrush(QColor(0, 0, 0, 128)))
-            text_rect = self.pixmap_label.geometry()
-            text_rect.setTop(text_rect.bottom() - 20)
-            painter.drawText(text_rect, Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter, f" {self.data.size} ")
+            similar_rect = QRect(thumbnail_rect)
+            similar_rect.setBottom(similar_rect.top() + 20)
+            painter.drawText(similar_rect, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, f" +{similar} similar ")
+
+        if image_data.size:
+            painter.setPen(Qt.GlobalColor.white)
+            size_rect = QRect(thumbnail_rect)
+            size_rect.setTop(size_rect.bottom() - 20)
+            painter.drawText(size_rect, Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter, f" {image_data.size} ")
+
+        title_rect = QRect(rect.left(), thumbnail_rect.bottom() + 1, rect.width(), rect.bottom() - thumbnail_rect.bottom())
+        painter.setPen(text_color)
+        painter.drawText(title_rect, Qt.AlignmentFlag.AlignHCenter | Qt.AlignmentFlag.AlignTop | Qt.TextFlag.TextWordWrap,
+                         index.data(Qt.ItemDataRole.DisplayRole))
+
+        if index.data(SelectedRole):
+            pen = QPen(QColor("lightblue"))
+            pen.setWidth(3)
+            painter.setPen(pen)
+            painter.setBrush(Qt.BrushStyle.NoBrush)
+            painter.drawRect(option.rect.adjusted(1, 1, -2, -2))
+        painter.restore()
 
 class ImageSearchGUI(QMainWindow):
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, backend="http"):
         super().__init__()
         self.debug = debug
         self.setWindowTitle("Bing Image Search")
@@ -97,6 +406,10 @@ class ImageSearchGUI(QMainWindow):
         self.signals.search_finished.connect(self.on_search_finished)
         self.signals.load_more_finished.connect(self.on_load_more_finished)
         self.signals.details_finished.connect(self.on_details_finished)
+        self.signals.thumbnail_ready.connect(self.on_thumbnail_ready)
+        self.signals.thumbnail_hashed.connect(self.on_thumbnail_hashed)
+        self.signals.download_updated.connect(self.on_download_updated)
+        self.signals.scraper_ready.connect(self.on_scraper_ready)
         self.signals.error.connect(self.on_error)
 
         self.central_widget = QWidget()
@@ -116,12 +429,23 @@ class ImageSearchGUI(QMainWindow):
         self.splitter = QSplitter(Qt.Orientation.Horizontal)
         self.layout.addWidget(self.splitter)
 
-        scroll_area = QScrollArea()
-        scroll_area.setWidgetResizable(True)
-        self.results_widget = QWidget()
-        self.results_layout = QGridLayout(self.results_widget)
-        scroll_area.setWidget(self.results_widget)
-        self.splitter.addWidget(scroll_area)
+        self.results_model = ResultsModel(self.load_thumbnail, self)
+        self.filter_model = ResultsFilterModel(self)
+        self.filter_model.setSourceModel(self.results_model)
+        self.results_view = QListView()
+        self.results_view.setViewMode(QListView.ViewMode.IconMode)
+        self.results_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.results_view.setMovement(QListView.Movement.Static)
+        self.results_view.setUniformItemSizes(True)
+        # Lays out a large result set a batch at a time, so the first rows of a filter change
+        # show without waiting for every matching row to be placed.
+        self.results_view.setLayoutMode(QListView.LayoutMode.Batched)
+        self.results_view.setBatchSize(500)
+        self.results_view.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.results_view.setItemDelegate(ThumbnailDelegate(self.results_view))
+        self.results_view.setModel(self.filter_model)
+        self.results_view.clicked.connect(self.on_result_clicked)
+        self.splitter.addWidget(self.results_view)
 
         self.splitter.setSizes([1100, 300])
         self.layout.setStretchFactor(self.splitter, 1)
@@ -139,11 +463,28 @@ class ImageSearchGUI(QMainWindow):
         bottom_layout.addWidget(self.download_button)
         self.layout.addLayout(bottom_layout)
 
-        self.scraper = BingImageScraper(debug=self.debug)
+        # The scraper (and for the Selenium backend, its browser) starts in the background so
+        # the window can show right away; searching is enabled once it is ready.
+        self.backend = backend
+        self.scraper = None
+        self.start_scraper()
         self.downloader = Downloader("downloads")
-        self.image_data_store = []
+        self.thumbnail_fetcher = ThumbnailFetcher(debug=self.debug)
+        self.perceptual_hasher = PerceptualHasher(processes=2)
+        # Hiding duplicates as their hashes trickle in would refilter the grid for every
+        # thumbnail; this coalesces them.
+        self.duplicates_timer = QTimer(self)
+        self.duplicates_timer.setSingleShot(True)
+        self.duplicates_timer.setInterval(200)
+        self.duplicates_timer.timeout.connect(self.apply_filters)
+        self.download_manager = DownloadManager(self.downloader, max_workers=4, on_update=self.signals.download_updated.emit)
+        self.setup_download_panel()
+        self.image_data_store = self.results_model.store
+        self.results_iter = iter(())
+        self.seen_urls = set()
         self.active_filters = []
-        self.selected_widgets = []
+        # The search the grid shows, to tell when a filter change needs new Bing terms.
+        self.search_query = None
         self.sidebar.setVisible(False)
 
     def setup_filter_bar(self):
@@ -153,7 +494,7 @@ class ImageSearchGUI(QMainWindow):
         self.active_filters_layout.setContentsMargins(0,0,0,0)
 
         self.filter_criterion_combo = QComboBox()
-        self.filter_criterion_combo.addItems(["Source", "Title", "Size (px)", "Date", "Age"])
+        self.filter_criterion_combo.addItems(list(CRITERIA))
         self.filter_criterion_combo.currentTextChanged.connect(self.update_filter_inputs)
 
         self.filter_operator_combo = QComboBox()
@@ -165,12 +506,16 @@ class ImageSearchGUI(QMainWindow):
         self.add_filter_button = QPushButton("Add Filter")
         self.add_filter_button.clicked.connect(self.add_filter)
 
+        self.hide_duplicates_checkbox = QCheckBox("Hide near-duplicates")
+        self.hide_duplicates_checkbox.toggled.connect(self.apply_filters)
+
         filter_bar_layout.addWidget(self.filter_criterion_combo)
         filter_bar_layout.addWidget(self.filter_operator_combo)
         filter_bar_layout.addWidget(self.filter_value_input)
         filter_bar_layout.addWidget(self.filter_date_input)
         filter_bar_layout.addWidget(self.add_filter_button)
         filter_bar_layout.addStretch(1)
+        filter_bar_layout.addWidget(self.hide_duplicates_checkbox)
 
         main_filter_layout = QVBoxLayout()
         main_filter_layout.addLayout(filter_bar_layout)
@@ -184,18 +529,10 @@ class ImageSearchGUI(QMainWindow):
         self.filter_value_input.show()
         self.filter_date_input.hide()
 
-        if criterion in ["Source", "Title"]:
-            self.filter_operator_combo.addItems(["contains", "does not contain"])
-        elif criterion == "Size (px)":
-            self.filter_operator_combo.addItems(["is greater than", "is less than"])
-        elif criterion == "Date":
-            self.filter_operator_combo.addItems(["is after", "is before", "is on"])
+        self.filter_operator_combo.addItems(CRITERIA.get(criterion, []))
+        if criterion == "Date":
             self.filter_value_input.hide()
             self.filter_date_input.show()
-        elif criterion == "Age":
-            self.filter_operator_combo.addItems(["older than (days)", "newer than (days)"])
-            self.filter_date_input.hide()
-            self.filter_value_input.show()
 
     def add_filter(self):
         criterion = self.filter_criterion_combo.currentText()
@@ -209,20 +546,25 @@ class ImageSearchGUI(QMainWindow):
         if not value:
             return
 
+        new_filter = Filter(criterion, operator, value)
+        try:
+            compile_filters([new_filter])
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid Filter", f"Could not add filter {new_filter}: {e}")
+            return
+
         filter_id = time.time()
-        self.active_filters.append({"id": filter_id, "criterion": criterion, "operator": operator, "value": value})
-        self.create_filter_tag_widget(criterion, operator, value, filter_id)
-        self.apply_filters()
+        self.active_filters.append({"id": filter_id, "filter": new_filter})
+        self.create_filter_tag_widget(new_filter, filter_id)
+        self.filters_changed()
 
-    def create_filter_tag_widget(self, criterion, operator, value, filter_id):
+    def create_filter_tag_widget(self, new_filter, filter_id):
         tag_widget = QFrame()
         tag_widget.setStyleSheet("QFrame { border: 1px solid #777; border-radius: 5px; }")
         tag_layout = QHBoxLayout(tag_widget)
         tag_layout.setContentsMargins(5, 2, 5, 2)
         
-        value_str = value.strftime('%Y-%m-%d') if isinstance(value, datetime.date) else str(value)
-        label_text = f"{criterion} {operator} '{value_str}'"
-        tag_label = QLabel(label_text)
+        tag_label = QLabel(str(new_filter))
         
         remove_button = QPushButton("x")
         remove_button.setFixedSize(20, 20)
@@ -236,7 +578,18 @@ class ImageSearchGUI(QMainWindow):
     def remove_filter(self, filter_id, tag_widget):
         self.active_filters = [f for f in self.active_filters if f["id"] != filter_id]
         tag_widget.deleteLater()
-        self.apply_filters()
+        self.filters_changed()
+
+    def filters_changed(self):
+        # A filter Bing can apply searches again with it, rather than only hiding results.
+        if (self.search_query is not None and self.search_button.isEnabled()
+                and build_query(self.search_query.text, self.filters()).qft != self.search_query.qft):
+            self.start_search(self.search_query.text)
+        else:
+            self.apply_filters()
+
+    def filters(self):
+        return [f["filter"] for f in self.active_filters]
 
     def setup_sidebar(self):
         self.sidebar = QWidget()
@@ -255,30 +608,57 @@ class ImageSearchGUI(QMainWindow):
         self.splitter.addWidget(self.sidebar)
 
     def clear_grid(self):
-        while self.results_layout.count():
-            child = self.results_layout.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
-        self.image_data_store = []
-        self.selected_widgets = []
+        self.image_data_store = ImageDataStore()
+        self.results_model.set_store(self.image_data_store)
         self.sidebar.setVisible(False)
 
-    def start_search(self):
-        query = self.search_input.text()
+    def start_scraper(self):
+        self.search_button.setEnabled(False)
+        self.search_button.setText("Starting...")
+        threading.Thread(target=self.run_start_scraper, daemon=True).start()
+
+    def run_start_scraper(self):
+        try:
+            if self.debug:
+                print(f"[DEBUG] Starting the {self.backend} scraper in the background...")
+            with metrics.span("scraper_start"):
+                scraper = create_scraper(self.backend, debug=self.debug, cache=ResultCache())
+            self.signals.scraper_ready.emit(scraper)
+        except Exception as e:
+            if self.debug:
+                print(f"[DEBUG] Error starting scraper: {e}")
+            self.signals.error.emit(f"Could not start the {self.backend} scraper: {e}")
+
+    def on_scraper_ready(self, scraper):
+        self.scraper = scraper
+        self.search_button.setEnabled(True)
+        self.search_button.setText("Search")
+        if self.debug:
+            print("[DEBUG] Scraper ready.")
+
+    def start_search(self, query=None):
+        if self.scraper is None:
+            # Starting the scraper failed earlier; try again rather than searching without one.
+            if self.search_button.isEnabled():
+                self.start_scraper()
+            return
+        query = query or self.search_input.text()
         if query:
             self.clear_grid()
+            self.search_query = build_query(query, self.filters())
             self.search_button.setEnabled(False)
             self.search_button.setText("Searching...")
-            threading.Thread(target=self.run_search, args=(query,), daemon=True).start()
+            threading.Thread(target=self.run_search, args=(self.search_query,), daemon=True).start()
 
-    def run_search(self, query):
+    def run_search(self, search_query):
         try:
             if self.debug:
-                print(f"[DEBUG] Starting search for query: {query}")
-            self.scraper.search(query)
+                print(f"[DEBUG] Starting search for query: {search_query.text}, Bing filters: {search_query.qft}")
+            self.scraper.search(search_query.text, search_query.qft)
             if self.debug:
                 print("[DEBUG] Scraper search completed. Getting image data...")
-            images = self.scraper.get_image_data(max_images=20)
+            self.results_iter = self.scraper.iter_image_data()
+            images = list(islice(self.results_iter, 20))
             if self.debug:
                 print(f"[DEBUG] Retrieved {len(images)} images. Emitting search_finished signal.")
             self.signals.search_finished.emit(images)
@@ -290,7 +670,11 @@ class ImageSearchGUI(QMainWindow):
     def on_search_finished(self, images):
         if self.debug:
             print(f"[DEBUG] on_search_finished called with {len(images)} images.")
-        self.image_data_store = images
+        self.seen_urls = set()
+        images = [d for d in images if self._is_new_url(d)]
+        self.image_data_store = ImageDataStore(images)
+        self.results_model.set_store(self.image_data_store)
+        self.fetch_thumbnails(images)
         self.apply_filters()
         self.search_button.setEnabled(True)
         self.search_button.setText("Search")
@@ -304,7 +688,7 @@ class ImageSearchGUI(QMainWindow):
 
     def run_load_more(self):
         try:
-            new_data = self.scraper.get_image_data(max_images=len(self.image_data_store) + 20)
+            new_data = list(islice(self.results_iter, 20))
             self.signals.load_more_finished.emit(new_data)
         except Exception as e:
             self.signals.error.emit(str(e))
@@ -312,122 +696,86 @@ class ImageSearchGUI(QMainWindow):
     def on_load_more_finished(self, new_images):
         if self.debug:
             print(f"[DEBUG] Load more finished, received {len(new_images)} new images.")
-        existing_urls = {img.image_source_url for img in self.image_data_store}
-        self.image_data_store.extend([d for d in new_images if d.image_source_url not in existing_urls])
+        new_images = [d for d in new_images if self._is_new_url(d)]
+        self.results_model.extend(new_images)
+        self.fetch_thumbnails(new_images)
         self.apply_filters()
         self.load_more_button.setEnabled(True)
         self.load_more_button.setText("Load More")
 
-    def apply_filters(self):
-        if not self.active_filters:
-            self.update_grid(self.image_data_store)
+    def _is_new_url(self, image_data):
+        if not image_data.image_source_url:
+            return True
+        if image_data.image_source_url in self.seen_urls:
+            return False
+        self.seen_urls.add(image_data.image_source_url)
+        return True
+
+    def fetch_thumbnails(self, images):
+        for image_data in images:
+            self.thumbnail_fetcher.fetch(image_data, callback=self.signals.thumbnail_ready.emit)
+
+    def load_thumbnail(self, image_data):
+        if not image_data.thumbnail_key:
+            return None
+        return self.thumbnail_fetcher.store.get(image_data.thumbnail_key)
+
+    def on_thumbnail_ready(self, image_data):
+        self.results_model.thumbnail_fetched(image_data)
+        data = self.load_thumbnail(image_data)
+        if data:
+            future = self.perceptual_hasher.submit(data)
+            future.add_done_callback(
+                lambda f: self.signals.thumbnail_hashed.emit(image_data, None if f.cancelled() or f.exception() else f.result()))
+
+    def on_thumbnail_hashed(self, image_data, value):
+        if value is None:
             return
+        if self.results_model.add_perceptual_hash(image_data, value) and self.hide_duplicates_checkbox.isChecked():
+            self.duplicates_timer.start()
 
-        filtered_images = self.image_data_store
-        for f in self.active_filters:
-            filtered_images = self._filter_data(filtered_images, f["criterion"], f["operator"], f["value"])
-        
-        self.update_grid(filtered_images)
-
-    def _filter_data(self, data, criterion, operator, value):
-        filtered_data = []
-        for item in data:
-            try:
-                if criterion == "Title":
-                    if operator == "contains" and value.lower() in (item.title or "").lower():
-                        filtered_data.append(item)
-                    elif operator == "does not contain" and value.lower() not in (item.title or "").lower():
-                        filtered_data.append(item)
-                elif criterion == "Source":
-                    if operator == "contains" and value.lower() in (item.site_source or "").lower():
-                        filtered_data.append(item)
-                    elif operator == "does not contain" and value.lower() not in (item.site_source or "").lower():
-                        filtered_data.append(item)
-                elif criterion == "Size (px)":
-                    if not item.size: continue
-                    width, height = map(int, item.size.split(' x '))
-                    pixel_count = width * height
-                    if operator == "is greater than" and pixel_count > int(value):
-                        filtered_data.append(item)
-                    elif operator == "is less than" and pixel_count < int(value):
-                        filtered_data.append(item)
-                elif criterion == "Date":
-                    if not item.parsed_date: continue
-                    if operator == "is after" and item.parsed_date > value:
-                        filtered_data.append(item)
-                    elif operator == "is before" and item.parsed_date < value:
-                        filtered_data.append(item)
-                    elif operator == "is on" and item.parsed_date == value:
-                        filtered_data.append(item)
-                elif criterion == "Age":
-                    if not item.parsed_age: continue
-                    if operator == "older than (days)" and item.parsed_age > int(value):
-                        filtered_data.append(item)
-                    elif operator == "newer than (days)" and item.parsed_age < int(value):
-                        filtered_data.append(item)
-            except (ValueError, AttributeError, TypeError) as e:
-                print(f"Could not apply filter for item {item.data_idx}: {e}")
-                continue
-        return filtered_data
-
-    def update_grid(self, images):
-        if self.debug:
-            print(f"[DEBUG] update_grid called with {len(images)} images.")
-        while self.results_layout.count():
-            child = self.results_layout.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
-
-        row, col = 0, 0
-        for i, image_data in enumerate(images):
-            if self.debug:
-                print(f"[DEBUG] Adding image {i+1}/{len(images)} to grid: {image_data.title}")
-            widget = ImageWidget(image_data, parent=self)
-            widget.selected_signal.connect(self.on_image_selected)
-            self.results_layout.addWidget(widget, row, col)
-            col += 1
-            if col == 6:
-                col = 0
-                row += 1
+    def apply_filters(self):
+        with metrics.span("grid_update"):
+            hide_duplicates = self.hide_duplicates_checkbox.isChecked()
+            if not self.active_filters and not hide_duplicates:
+                self.filter_model.set_accepted_rows(None)
+                return
+
+            compiled = compile_filters(self.filters())
+            rows = compiled.indices(self.image_data_store)
+            if hide_duplicates:
+                duplicates = np.fromiter(self.results_model.duplicate_rows(), dtype=np.int64)
+                rows = rows[~np.isin(rows, duplicates)]
+            self.filter_model.set_accepted_rows(rows)
         if self.debug:
-            print("[DEBUG] update_grid completed.")
+            print(f"[DEBUG] {self.filter_model.rowCount()} of {len(self.image_data_store)} results match the filters.")
+
+    def on_result_clicked(self, index):
+        image_data = index.data(ImageDataRole)
+        self.results_model.toggle_selected(image_data)
+        self.on_image_selected(image_data)
 
     def on_image_selected(self, image_data):
         if self.debug:
             print(f"[DEBUG] Image selected: {image_data.title}")
 
-        # Find the widget associated with the image data
-        selected_widget = None
-        for i in range(self.results_layout.count()):
-            widget = self.results_layout.itemAt(i).widget()
-            if widget and widget.data == image_data:
-                selected_widget = widget
-                break
-
-        if selected_widget:
-            if selected_widget.is_selected:
-                if selected_widget not in self.selected_widgets:
-                    self.selected_widgets.append(selected_widget)
-            else:
-                if selected_widget in self.selected_widgets:
-                    self.selected_widgets.remove(selected_widget)
-
+        selected_images = list(self.results_model.selected.values())
         if self.debug:
-            print(f"[DEBUG] Selected widgets: {self.selected_widgets}")
+            print(f"[DEBUG] Selected images: {len(selected_images)}")
 
-        if self.selected_widgets:
-            last_selected = self.selected_widgets[-1]
+        if selected_images:
+            last_selected = selected_images[-1]
             if self.debug:
-                print(f"[DEBUG] Last selected image data: {last_selected.data}")
+                print(f"[DEBUG] Last selected image data: {last_selected}")
             try:
                 self.info_text.setText(
-                    f"<b>Title:</b> {last_selected.data.title or 'N/A'}<br>"
-                    f"<b>Size:</b> {last_selected.data.size or 'N/A'}<br>"
-                    f"<b>Type:</b> {last_selected.data.file_type or 'N/A'}<br>"
-                    f"<b>Date:</b> {last_selected.data.date or 'N/A'}<br>"
-                    f"<b>Age:</b> {last_selected.data.ago or 'N/A'}<br>"
-                    f"<b>Source:</b> {last_selected.data.site_source or 'N/A'}<br>"
-                    f"<a href='{last_selected.data.image_source_url or '#'}'>Image Link</a>"
+                    f"<b>Title:</b> {last_selected.title or 'N/A'}<br>"
+                    f"<b>Size:</b> {last_selected.size or 'N/A'}<br>"
+                    f"<b>Type:</b> {last_selected.file_type or 'N/A'}<br>"
+                    f"<b>Date:</b> {last_selected.date or 'N/A'}<br>"
+                    f"<b>Age:</b> {last_selected.ago or 'N/A'}<br>"
+                    f"<b>Source:</b> {last_selected.site_source or 'N/A'}<br>"
+                    f"<a href='{last_selected.image_source_url or '#'}'>Image Link</a>"
                 )
                 if self.debug:
                     print("[DEBUG] Sidebar info text set successfully.")
@@ -441,76 +789,125 @@ class ImageSearchGUI(QMainWindow):
 
     def close_sidebar(self):
         self.sidebar.setVisible(False)
-        for widget in self.selected_widgets:
-            widget.is_selected = False
-            widget.update()
-        self.selected_widgets = []
+        self.results_model.clear_selection()
+
+    def setup_download_panel(self):
+        self.download_dock = QDockWidget("Downloads", self)
+        panel = QWidget()
+        panel_layout = QVBoxLayout(panel)
+        panel_layout.setContentsMargins(5, 5, 5, 5)
+
+        self.download_table = QTableWidget(0, 3)
+        self.download_table.setHorizontalHeaderLabels(["Title", "Status", "Progress"])
+        self.download_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.download_table.verticalHeader().setVisible(False)
+        self.download_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.download_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.download_rows = {}
+
+        buttons_layout = QHBoxLayout()
+        self.pause_downloads_button = QPushButton("Pause")
+        self.pause_downloads_button.clicked.connect(self.toggle_downloads_paused)
+        cancel_selected_button = QPushButton("Cancel Selected")
+        cancel_selected_button.clicked.connect(self.cancel_selected_downloads)
+        cancel_all_button = QPushButton("Cancel All")
+        cancel_all_button.clicked.connect(lambda: self.download_manager.cancel())
+        clear_finished_button = QPushButton("Clear Finished")
+        clear_finished_button.clicked.connect(self.clear_finished_downloads)
+        self.download_summary_label = QLabel()
+        buttons_layout.addWidget(self.download_summary_label)
+        buttons_layout.addStretch()
+        for button in (self.pause_downloads_button, cancel_selected_button, cancel_all_button, clear_finished_button):
+            buttons_layout.addWidget(button)
+
+        panel_layout.addWidget(self.download_table)
+        panel_layout.addLayout(buttons_layout)
+        self.download_dock.setWidget(panel)
+        self.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea, self.download_dock)
+        self.download_dock.setVisible(False)
 
     def download_selected(self):
-        if not self.selected_widgets:
-            QMessageBox.information(self, "No Images Selected", "Please select images to download.")
-            return
-
-        if self.debug:
-            print(f"[DEBUG] Attempting to download {len(self.selected_widgets)} selected images.")
-
-        if self.debug:
-            print("[DEBUG] Entering download_selected method.")
-        if not self.selected_widgets:
+        selected_images = list(self.results_model.selected.values())
+        if not selected_images:
             QMessageBox.information(self, "No Images Selected", "Please select images to download.")
-            if self.debug:
-                print("[DEBUG] No images selected. Exiting download_selected.")
             return
 
-        successful_downloads = 0
-        failed_downloads = []
-
-        if self.debug:
-            print(f"[DEBUG] Attempting to download {len(self.selected_widgets)} selected images.")
-
-        for widget in self.selected_widgets:
-            if self.debug:
-                print(f"[DEBUG] Downloading image: {widget.data.title}")
-            try:
-                self.downloader.download(widget.data)
-                successful_downloads += 1
-            except Exception as e:
-                failed_downloads.append(f"{widget.data.title}: {e}")
-                if self.debug:
-                    print(f"[DEBUG] Download failed for {widget.data.title}: {e}")
-
         if self.debug:
-            print("[DEBUG] All download attempts completed.")
+            print(f"[DEBUG] Queueing {len(selected_images)} selected images for download.")
+        self.download_manager.submit(selected_images)
+        self.download_dock.setVisible(True)
+        self.close_sidebar()
 
-        if successful_downloads > 0 and not failed_downloads:
-            if self.debug:
-                print(f"[DEBUG] About to show success QMessageBox for {successful_downloads} downloads.")
-            QMessageBox.information(self, "Download Complete", f"Downloaded {successful_downloads} images.")
+    def on_download_updated(self, job):
+        row = self.download_rows.get(job.id)
+        if row is None:
+            if job.id not in self.download_manager.jobs:
+                return
+            row = self.download_table.rowCount()
+            self.download_table.insertRow(row)
+            title_item = QTableWidgetItem(job.image_data.title or job.image_data.image_source_url or "Untitled")
+            title_item.setData(Qt.ItemDataRole.UserRole, job.id)
+            self.download_table.setItem(row, 0, title_item)
+            self.download_table.setItem(row, 1, QTableWidgetItem())
+            progress_bar = QProgressBar()
+            progress_bar.setTextVisible(True)
+            self.download_table.setCellWidget(row, 2, progress_bar)
+            self.download_rows[job.id] = row
+
+        status = job.state.capitalize()
+        if job.error and job.state == FAILED:
+            status = f"Failed: {job.error}"
             if self.debug:
-                print("[DEBUG] Success QMessageBox displayed and dismissed.")
-        elif successful_downloads > 0 and failed_downloads:
-            if self.debug:
-                print(f"[DEBUG] About to show partial success QMessageBox for {successful_downloads} successful and {len(failed_downloads)} failed downloads.")
-            QMessageBox.warning(self, "Download Partially Complete", 
-                                f"Downloaded {successful_downloads} images. "
-                                f"Failed to download {len(failed_downloads)} images:\n" +
-                                "\n".join(failed_downloads))
-            if self.debug:
-                print("[DEBUG] Partial success QMessageBox displayed and dismissed.")
+                print(f"[DEBUG] Download failed for {job.image_data.title}: {job.error}")
+        self.download_table.item(row, 1).setText(status)
+        self.download_table.item(row, 1).setToolTip(job.path or job.error or "")
+
+        progress_bar = self.download_table.cellWidget(row, 2)
+        if job.state in (DONE, SKIPPED):
+            progress_bar.setRange(0, 100)
+            progress_bar.setValue(100)
+            progress_bar.setFormat("100%")
+        elif job.total:
+            progress_bar.setRange(0, 1000)
+            progress_bar.setValue(int(1000 * job.downloaded / job.total))
+            progress_bar.setFormat(f"{format_bytes(job.downloaded)} / {format_bytes(job.total)}")
         else:
-            if self.debug:
-                print(f"[DEBUG] About to show total failure QMessageBox for {len(failed_downloads)} failed downloads.")
-            QMessageBox.critical(self, "Download Failed", 
-                                 f"Failed to download all selected images:\n" +
-                                 "\n".join(failed_downloads))
-            if self.debug:
-                print("[DEBUG] Total failure QMessageBox displayed and dismissed.")
-        
-        if self.debug:
-            print("[DEBUG] About to call close_sidebar.")
-        self.close_sidebar()
-        if self.debug:
-            print("[DEBUG] close_sidebar called. Exiting download_selected method.")
+            progress_bar.setRange(0, 100)
+            progress_bar.setValue(0)
+            progress_bar.setFormat(format_bytes(job.downloaded))
+        self.update_download_summary()
+
+    def update_download_summary(self):
+        jobs = list(self.download_manager.jobs.values())
+        counts = {state: sum(1 for job in jobs if job.state == state) for state in (DONE, SKIPPED, FAILED, CANCELLED)}
+        active = len(jobs) - sum(counts.values())
+        self.download_summary_label.setText(
+            f"{active} active, {counts[DONE]} downloaded, {counts[SKIPPED]} already downloaded, "
+            f"{counts[FAILED]} failed, {counts[CANCELLED]} cancelled"
+        )
+
+    def toggle_downloads_paused(self):
+        if self.download_manager.paused:
+            self.download_manager.resume()
+            self.pause_downloads_button.setText("Pause")
+        else:
+            self.download_manager.pause()
+            self.pause_downloads_button.setText("Resume")
+
+    def cancel_selected_downloads(self):
+        rows = {index.row() for index in self.download_table.selectionModel().selectedRows()}
+        self.download_manager.cancel(self.download_table.item(row, 0).data(Qt.ItemDataRole.UserRole) for row in rows)
+
+    def clear_finished_downloads(self):
+        for job_id in self.download_manager.clear_finished():
+            row = self.download_rows.pop(job_id, None)
+            if row is not None:
+                self.download_table.removeRow(row)
+                self.download_rows = {
+                    self.download_table.item(r, 0).data(Qt.ItemDataRole.UserRole): r
+                    for r in range(self.download_table.rowCount())
+                }
+        self.update_download_summary()
 
     def on_details_finished(self, data):
         pass
@@ -522,9 +919,21 @@ class ImageSearchGUI(QMainWindow):
         self.load_more_button.setEnabled(True)
         self.load_more_button.setText("Load More")
 
+    def closeEvent(self, event):
+        if self.scraper is not None and hasattr(self.scraper, "close"):
+            self.scraper.close()
+        self.download_manager.shutdown()
+        self.thumbnail_fetcher.shutdown()
+        self.perceptual_hasher.shutdown()
+        self.results_model.shutdown()
+        super().closeEvent(event)
+
 def main():
     try:
         debug = "--debug" in sys.argv
+        backend = "selenium" if "--selenium" in sys.argv else "http"
+        if "--profile" in sys.argv:
+            metrics.enable()
         app = QApplication(sys.argv)
         app.setStyleSheet("""
             QWidget { background-color: #333; color: #EEE; }
@@ -532,13 +941,16 @@ def main():
             QPushButton:hover { background-color: #666; }
             QPushButton:pressed { background-color: #444; }
             QLineEdit, QComboBox, QDateEdit { background-color: #444; border: 1px solid #666; padding: 5px; border-radius: 3px; }
-            QTextEdit, QScrollArea { background-color: #222; border: 1px solid #444; }
+            QTextEdit, QListView { background-color: #222; border: 1px solid #444; }
             QComboBox::drop-down { border: 0px; }
             QComboBox::down-arrow { image: url(no_arrow.png); }
         """)
-        window = ImageSearchGUI(debug=debug)
+        window = ImageSearchGUI(debug=debug, backend=backend)
         window.show()
-        sys.exit(app.exec())
+        exit_code = app.exec()
+        if metrics.enabled:
+            write_sinks([SummarySink()])
+        sys.exit(exit_code)
     except Exception as e:
         print(f"[FATAL] An unexpected error occurred: {e}")
         import traceback
@@ -0,0 +1,100 @@
+import json
+import time
+from itertools import islice
+from typing import Iterator, Optional
+import requests
+from bing_image_downloader.data_model import ImageData
+from bing_image_downloader.downloader import USER_AGENT
+from bing_image_downloader.metrics import metrics
+from bing_image_downloader.parsing import parse_image_data, parse_result_page
+from bing_image_downloader.query import query_string
+
+class HttpImageScraper:
+    """Scrapes Bing image results over plain HTTP, without a browser.
+
+    Pages through the results HTML that Bing serves to its infinite scroll using
+    `first`/`count` offsets, and parses the same `m` JSON and `.ppdatr` attributes
+    the Selenium scraper reads from the DOM.
+    """
+
+    def __init__(self, debug=False, base_url="https://www.bing.com", page_size=35, session=None):
+        self.debug = debug
+        self.base_url = base_url.rstrip("/")
+        self.page_size = page_size
+        self.session = session or requests.Session()
+        self.session.headers.setdefault('User-Agent', USER_AGENT)
+        self.query = None
+        self.qft = None
+        self.scraped_image_ids = set()
+        self._offset = 0
+        self._exhausted = False
+
+    def search(self, query: str, qft: Optional[str] = None):
+        """Starts a search. `qft` holds Bing `+filterui:...` filter terms, see `build_query`."""
+        metrics.count("searches")
+        self.query = query
+        self.qft = qft
+        self.scraped_image_ids = set()
+        self._offset = 0
+        self._exhausted = False
+
+    def _fetch_page(self, offset: int) -> list[dict]:
+        params = {"first": offset, "count": self.page_size, "mmasync": 1}
+        url = f"{self.base_url}/images/async?{query_string(self.query, self.qft)}"
+        start_time = time.perf_counter()
+        with metrics.span("page_load"):
+            response = self.session.get(url, params=params, timeout=10)
+            response.raise_for_status()
+        with metrics.span("parse_page"):
+            items = parse_result_page(response.text)
+        if self.debug:
+            print(f"[DEBUG] Fetched {len(items)} results at offset {offset} in {time.perf_counter() - start_time:.2f} seconds")
+        return items
+
+    def iter_image_data(self, start: int = 0, with_raw: bool = False, **kwargs) -> Iterator[ImageData]:
+        """Yields each result as soon as it is parsed, fetching the next page when one runs out.
+
+        The page offset advances per result, so a later call carries on where this one stopped.
+        Results before position `start` are skipped without being fetched. With `with_raw`,
+        yields (ImageData, raw `m` JSON) pairs instead, for the result cache.
+        """
+        if self.query is None:
+            raise RuntimeError("search() must be called before iter_image_data()")
+        self._offset = max(self._offset, start)
+
+        while not self._exhausted:
+            items = self._fetch_page(self._offset)
+            if not items:
+                self._exhausted = True
+                break
+
+            new_items = 0
+            for item in items:
+                self._offset += 1
+                data_idx = item["data_idx"]
+                if data_idx in self.scraped_image_ids or not item["m"]:
+                    continue
+                self.scraped_image_ids.add(data_idx)
+                new_items += 1
+                with metrics.span("parse_item"):
+                    try:
+                        m_data = json.loads(item["m"])
+                    except json.JSONDecodeError as e:
+                        print(f"Could not extract data for image {data_idx}: {e}")
+                        metrics.count("parse_errors")
+                        continue
+                    image_data = parse_image_data(m_data, data_idx, item["age"], item["date"], debug=self.debug)
+                metrics.count("results_scraped")
+                yield (image_data, item["m"]) if with_raw else image_data
+
+            if new_items == 0:
+                # Bing repeats its last page once the results run out.
+                self._exhausted = True
+
+    def get_image_data(self, max_images: int = 100, **kwargs) -> list[ImageData]:
+        """Gets the next `max_images` results."""
+        total_start_time = time.perf_counter()
+        newly_scraped_images = list(islice(self.iter_image_data(), max_images))
+        if self.debug:
+            print(f"[DEBUG] Total get_image_data took: {time.perf_counter() - total_start_time:.2f} seconds for {len(newly_scraped_images)} images")
+        return newly_scraped_images
@@ -0,0 +1,108 @@
+from array import array
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+class SortedIndex:
+    """Positions of an integer column, ordered by value, for range lookups.
+
+    New rows go to a small unsorted tail that is merged into the sorted part once it holds
+    `merge_threshold` rows, so appending stays cheap while lookups bisect the sorted part and
+    only scan the tail.
+    """
+
+    def __init__(self, merge_threshold: int = 1024):
+        self.merge_threshold = merge_threshold
+        self.keys = np.empty(0, dtype=np.int64)
+        self.positions = np.empty(0, dtype=np.int64)
+        self._tail_keys = array('q')
+        self._tail_positions = array('q')
+
+    def __len__(self) -> int:
+        return len(self.keys) + len(self._tail_keys)
+
+    def add(self, value: int, position: int):
+        self._tail_keys.append(value)
+        self._tail_positions.append(position)
+        if len(self._tail_keys) >= self.merge_threshold:
+            self._merge()
+
+    def _merge(self):
+        tail_keys = np.frombuffer(self._tail_keys, dtype=np.int64).copy()
+        tail_positions = np.frombuffer(self._tail_positions, dtype=np.int64).copy()
+        order = np.argsort(tail_keys, kind="stable")
+        tail_keys, tail_positions = tail_keys[order], tail_positions[order]
+        at = np.searchsorted(self.keys, tail_keys, side="right")
+        self.keys = np.insert(self.keys, at, tail_keys)
+        self.positions = np.insert(self.positions, at, tail_positions)
+        self._tail_keys = array('q')
+        self._tail_positions = array('q')
+
+    def _bounds(self, op: str, value: int) -> Tuple[int, int]:
+        if op == ">":
+            return int(np.searchsorted(self.keys, value, side="right")), len(self.keys)
+        if op == "<":
+            return 0, int(np.searchsorted(self.keys, value, side="left"))
+        return int(np.searchsorted(self.keys, value, side="left")), int(np.searchsorted(self.keys, value, side="right"))
+
+    def count(self, op: str, value: int) -> int:
+        """Returns an upper bound on the number of rows `lookup` would return."""
+        lo, hi = self._bounds(op, value)
+        return hi - lo + len(self._tail_keys)
+
+    def lookup(self, op: str, value: int) -> np.ndarray:
+        """Returns the positions whose value is `op` ('>', '<' or '==') `value`, unordered."""
+        lo, hi = self._bounds(op, value)
+        matches = self.positions[lo:hi]
+        if not self._tail_keys:
+            return matches.copy()
+        tail_keys = np.frombuffer(self._tail_keys, dtype=np.int64)
+        if op == ">":
+            mask = tail_keys > value
+        elif op == "<":
+            mask = tail_keys < value
+        else:
+            mask = tail_keys == value
+        del tail_keys
+        tail_positions = np.frombuffer(self._tail_positions, dtype=np.int64)[mask]
+        return np.concatenate((matches, tail_positions))
+
+class NgramIndex:
+    """Maps every n-gram of a string column to the positions of the rows containing it.
+
+    Each row containing a substring of at least `n` characters also contains each of its
+    n-grams, so the shortest posting list among them is a superset of the matches that only
+    needs verifying. Postings are appended in position order and stay sorted.
+    """
+
+    def __init__(self, n: int = 3):
+        self.n = n
+        self.postings: Dict[str, array] = {}
+
+    def add(self, text: str, position: int):
+        n = self.n
+        for gram in {text[i:i + n] for i in range(len(text) - n + 1)}:
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array('q')
+            posting.append(position)
+
+    def _shortest_posting(self, substring: str) -> Optional[array]:
+        n = self.n
+        if len(substring) < n:
+            return None
+        empty = array('q')
+        return min((self.postings.get(substring[i:i + n], empty) for i in range(len(substring) - n + 1)), key=len)
+
+    def count(self, substring: str) -> Optional[int]:
+        """Returns an upper bound on the rows containing `substring`, or None if it is too
+        short to look up."""
+        posting = self._shortest_posting(substring)
+        return None if posting is None else len(posting)
+
+    def candidates(self, substring: str) -> Optional[np.ndarray]:
+        """Returns the sorted positions of rows that may contain `substring`, or None if it
+        is too short to look up."""
+        posting = self._shortest_posting(substring)
+        if posting is None:
+            return None
+        return np.frombuffer(posting, dtype=np.int64).copy() if posting else np.empty(0, dtype=np.int64)
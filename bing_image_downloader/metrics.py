@@ -0,0 +1,237 @@
+"""Timing and counter instrumentation.
+
+Code records into the module-level `metrics` registry:
+
+    with metrics.span("page_load"):
+        ...
+    metrics.count("download_bytes", len(chunk))
+
+Recording is off until `metrics.enable()` is called; until then `span` returns a shared
+no-op context manager and `count`/`observe` return immediately, so instrumented code pays
+only an attribute check. Sinks turn a snapshot of the registry into a human summary, JSON
+lines or a Prometheus textfile.
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, TextIO
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+class Histogram:
+    """Count, sum, min and max of every observation, with percentiles estimated from a
+    uniform reservoir sample of at most `max_samples` values."""
+
+    def __init__(self, max_samples: int = 10_000):
+        self.max_samples = max_samples
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.samples: List[float] = []
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.samples) < self.max_samples:
+            self.samples.append(value)
+        else:
+            index = random.randrange(self.count)
+            if index < self.max_samples:
+                self.samples[index] = value
+
+    def merge(self, other: 'Histogram'):
+        """Adds the observations of `other`, e.g. one recorded in another process."""
+        if not other.count:
+            return
+        if len(self.samples) + len(other.samples) > self.max_samples:
+            # Each side keeps a share of the reservoir in proportion to how many values it saw.
+            keep = min(len(self.samples), round(self.max_samples * self.count / (self.count + other.count)))
+            self.samples = (random.sample(self.samples, keep)
+                            + random.sample(other.samples, min(len(other.samples), self.max_samples - keep)))
+        else:
+            self.samples = self.samples + other.samples
+        self.count += other.count
+        self.sum += other.sum
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.samples)
+        quantiles = {f"p{int(q * 100)}": ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else None
+                     for q in QUANTILES}
+        return {"count": self.count, "sum": self.sum, "min": self.min, "max": self.max, **quantiles}
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ("registry", "name", "start")
+
+    def __init__(self, registry: 'Metrics', name: str):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+class Metrics:
+    """Registry of named counters and timing histograms (in seconds)."""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def span(self, name: str):
+        """Times the enclosed block into the `name` histogram."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def count(self, name: str, value: float = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def detach(self) -> 'Metrics':
+        """Moves everything recorded so far into a new registry, which can be pickled and
+        merged into another process's registry with `merge`."""
+        detached = Metrics()
+        with self._lock:
+            detached.counters, self.counters = self.counters, {}
+            detached.histograms, self.histograms = self.histograms, {}
+        return detached
+
+    def merge(self, other: 'Metrics'):
+        with self._lock:
+            for name, value in other.counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, histogram in other.histograms.items():
+                self.histograms.setdefault(name, Histogram(histogram.max_samples)).merge(histogram)
+
+    def __getstate__(self):
+        return {"enabled": self.enabled, "counters": self.counters, "histograms": self.histograms}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+            }
+
+metrics = Metrics()
+
+class SummarySink:
+    """Prints a table of counters and per-span latency percentiles."""
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream
+
+    def write(self, snapshot: dict):
+        stream = self.stream or sys.stdout
+        histograms = snapshot["histograms"]
+        if histograms:
+            print(f"\n{'span':<24} {'count':>8} {'total s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}", file=stream)
+            for name in sorted(histograms):
+                h = histograms[name]
+                print(f"{name:<24} {h['count']:>8} {h['sum']:>9.2f} {h['p50'] * 1000:>9.1f} {h['p90'] * 1000:>9.1f} "
+                      f"{h['p99'] * 1000:>9.1f} {h['max'] * 1000:>9.1f}", file=stream)
+        if snapshot["counters"]:
+            print(f"\n{'counter':<24} {'value':>12}", file=stream)
+            for name in sorted(snapshot["counters"]):
+                print(f"{name:<24} {snapshot['counters'][name]:>12,.0f}", file=stream)
+
+class JsonLinesSink:
+    """Appends one JSON object per counter and histogram to `path`, stamped with the time
+    of the snapshot."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, snapshot: dict):
+        now = time.time()
+        with open(self.path, "a") as f:
+            for name, value in snapshot["counters"].items():
+                f.write(json.dumps({"time": now, "type": "counter", "name": name, "value": value}) + "\n")
+            for name, histogram in snapshot["histograms"].items():
+                f.write(json.dumps({"time": now, "type": "histogram", "name": name, **histogram}) + "\n")
+
+class PrometheusTextfileSink:
+    """Writes the snapshot in the Prometheus text exposition format, for the node exporter's
+    textfile collector. Spans become summaries in seconds. The file is replaced atomically."""
+
+    def __init__(self, path: str, prefix: str = "bing_image_downloader"):
+        self.path = path
+        self.prefix = prefix
+
+    def _name(self, name: str) -> str:
+        return f"{self.prefix}_" + "".join(c if c.isalnum() else "_" for c in name)
+
+    def write(self, snapshot: dict):
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = self._name(name) + "_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, h in sorted(snapshot["histograms"].items()):
+            metric = self._name(name) + "_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for q in QUANTILES:
+                value = h[f"p{int(q * 100)}"]
+                if value is not None:
+                    lines.append(f'{metric}{{quantile="{q}"}} {value}')
+            lines += [f"{metric}_sum {h['sum']}", f"{metric}_count {h['count']}"]
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.path)
+
+def write_sinks(sinks: Iterable, registry: Metrics = metrics):
+    snapshot = registry.snapshot()
+    for sink in sinks:
+        sink.write(snapshot)
@@ -0,0 +1,121 @@
+import datetime
+import re
+from html.parser import HTMLParser
+from typing import Optional
+from urllib.parse import urlparse
+from bing_image_downloader.data_model import ImageData
+
+def parse_image_data(m_data: dict, data_idx: str, age_text: Optional[str] = None,
+                     tooltip_date: Optional[str] = None, debug: bool = False) -> ImageData:
+    """Builds an ImageData from a result's `m` JSON and its `.ppdatr` text and title."""
+    info = ImageData()
+    info.data_idx = data_idx
+    info.title = m_data.get("t")
+    info.image_source_url = m_data.get("murl")
+    info.thumbnail_url = m_data.get("turl")
+
+    purl = m_data.get("purl")
+    if purl:
+        parsed_uri = urlparse(purl)
+        info.site_source = parsed_uri.netloc
+
+    # Parsed to ints once here, so filters never have to re-parse a "W x H" string.
+    width = m_data.get("w")
+    height = m_data.get("h")
+    if width and height:
+        try:
+            info.width, info.height = int(width), int(height)
+        except (TypeError, ValueError):
+            pass
+    else:
+        # Fallback to 's' if width/height not present, and try to parse it
+        size_str = m_data.get("s")
+        if size_str:
+            info.size = size_str
+        if debug:
+            print(f"[DEBUG] Extracted size for {info.title}: {info.size}")
+
+    info.file_type = m_data.get("f")
+
+    info.ago = age_text or None
+    if info.ago:
+        match = re.search(r'(\d+)\s+(day|week|month|year)s?', info.ago)
+        if match:
+            value = int(match.group(1))
+            unit = match.group(2)
+            if unit == 'day': info.parsed_age = value
+            elif unit == 'week': info.parsed_age = value * 7
+            elif unit == 'month': info.parsed_age = value * 30
+            elif unit == 'year': info.parsed_age = value * 365
+
+    if tooltip_date:
+        try:
+            info.parsed_date = datetime.datetime.strptime(tooltip_date, '%m/%d/%Y').date()
+            info.date = tooltip_date
+        except ValueError:
+            pass
+
+    return info
+
+class ResultPageParser(HTMLParser):
+    """Collects the raw attributes of every `li[data-idx]` result in a Bing results page.
+
+    Each entry in `items` is a dict with the `data_idx`, the raw `m` JSON string of the
+    first `a[m]` in the item, and the text and title of its `.ppdatr` element.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.items = []
+        self._item = None
+        self._li_depth = 0
+        self._age_tag = None
+        self._age_depth = 0
+        self._age_text = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "li":
+            if self._item is None and attrs.get("data-idx"):
+                self._item = {"data_idx": attrs["data-idx"], "m": None, "age": None, "date": None}
+                self._li_depth = 1
+                return
+            if self._item is not None:
+                self._li_depth += 1
+        if self._item is None:
+            return
+
+        if tag == "a" and self._item["m"] is None and attrs.get("m"):
+            self._item["m"] = attrs["m"]
+        if self._age_tag is None and "ppdatr" in (attrs.get("class") or "").split():
+            self._age_tag = tag
+            self._age_depth = 1
+            self._age_text = []
+            self._item["date"] = attrs.get("title")
+        elif self._age_tag == tag:
+            self._age_depth += 1
+
+    def handle_endtag(self, tag):
+        if self._item is None:
+            return
+        if self._age_tag == tag:
+            self._age_depth -= 1
+            if self._age_depth == 0:
+                self._item["age"] = "".join(self._age_text).strip() or None
+                self._age_tag = None
+        if tag == "li":
+            self._li_depth -= 1
+            if self._li_depth == 0:
+                self.items.append(self._item)
+                self._item = None
+                self._age_tag = None
+
+    def handle_data(self, data):
+        if self._age_tag is not None:
+            self._age_text.append(data)
+
+def parse_result_page(html: str) -> list[dict]:
+    parser = ResultPageParser()
+    parser.feed(html)
+    parser.close()
+    return parser.items
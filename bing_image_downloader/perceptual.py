@@ -0,0 +1,257 @@
+"""Perceptual hashing for finding resized or recompressed copies of the same picture.
+
+A difference hash (dHash) shrinks an image to 9x8 grey pixels and records, for each row,
+whether each pixel is brighter than its left neighbour. Copies of a picture at a different
+size or JPEG quality get hashes within a few bits of each other, so near-duplicates are
+found by Hamming distance.
+"""
+import io
+import itertools
+import multiprocessing
+import os
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from bing_image_downloader.data_model import ImageData
+from bing_image_downloader.metrics import metrics
+from bing_image_downloader.store import normalize_url
+
+INDEX_FILENAME = ".perceptual_index.sqlite3"
+
+# Hashes within this many bits (of 64) are treated as the same picture.
+DEFAULT_MAX_DISTANCE = 6
+
+def dhash(data: bytes, hash_size: int = 8) -> int:
+    """Returns the `hash_size**2`-bit difference hash of the encoded image in `data`."""
+    with Image.open(io.BytesIO(data)) as image:
+        # Lets JPEGs decode straight at a fraction of their size instead of in full.
+        image.draft("L", (hash_size * 4, hash_size * 4))
+        small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+        pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def dhash_file(path: str, hash_size: int = 8) -> int:
+    with open(path, "rb") as f:
+        return dhash(f.read(), hash_size)
+
+def _dhash_or_none(data: bytes) -> Optional[int]:
+    try:
+        return dhash(data)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+class PerceptualHasher:
+    """Computes dHashes in a pool of `processes` worker processes, started on first use.
+
+    With `processes=0` hashes are computed on the calling thread instead, e.g. inside a
+    process that is already one of many batch workers.
+    """
+
+    def __init__(self, processes: Optional[int] = None):
+        self.processes = (os.cpu_count() or 1) if processes is None else processes
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def submit(self, data: bytes) -> Future:
+        """Returns a future resolving to the hash of `data`, or None if it can't be decoded."""
+        if not self.processes:
+            future = Future()
+            future.set_result(_dhash_or_none(data))
+            return future
+        with self._lock:
+            if self._pool is None:
+                # Spawned rather than forked: the parent may be running Qt or request threads.
+                self._pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool.submit(_dhash_or_none, data)
+
+    def hash(self, data: bytes) -> Optional[int]:
+        with metrics.span("perceptual_hash"):
+            return self.submit(data).result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+def _to_signed(value: int) -> int:
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+class PerceptualIndex:
+    """Persistent multi-index hash table of 64-bit perceptual hashes, keyed by a string.
+
+    Each hash is split into four 16-bit bands, and each band column is indexed. Two hashes
+    within distance d agree to within d // 4 bits on at least one band, so a lookup only
+    reads rows matching one of the few band values that close to the query's, instead of
+    scanning every stored hash. Pass ":memory:" as `path` for an index that isn't kept.
+    """
+
+    BANDS = 4
+    BAND_BITS = 16
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        bands = ", ".join(f"b{i} INTEGER NOT NULL" for i in range(self.BANDS))
+        with self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS hashes (key TEXT PRIMARY KEY, hash INTEGER NOT NULL, {bands})")
+            for i in range(self.BANDS):
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS hashes_b{i} ON hashes (b{i})")
+
+    def _bands(self, value: int) -> List[int]:
+        mask = (1 << self.BAND_BITS) - 1
+        return [(value >> (i * self.BAND_BITS)) & mask for i in range(self.BANDS)]
+
+    def _neighbours(self, band: int, radius: int) -> List[int]:
+        values = [band]
+        for distance in range(1, radius + 1):
+            for bits in itertools.combinations(range(self.BAND_BITS), distance):
+                flipped = band
+                for bit in bits:
+                    flipped ^= 1 << bit
+                values.append(flipped)
+        return values
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+
+    def add(self, key: str, value: int):
+        with self._lock, self._conn:
+            self._conn.execute(f"INSERT OR REPLACE INTO hashes VALUES (?, ?{', ?' * self.BANDS})",
+                               (key, _to_signed(value), *self._bands(value)))
+
+    def remove(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM hashes WHERE key = ?", (key,))
+
+    def nearest(self, value: int, max_distance: int = DEFAULT_MAX_DISTANCE,
+                exclude_key: Optional[str] = None) -> Optional[Tuple[str, int]]:
+        """Returns the key and distance of the closest stored hash within `max_distance`
+        bits of `value`, other than `exclude_key`, or None."""
+        radius = max_distance // self.BANDS
+        best = None
+        with self._lock:
+            for i, band in enumerate(self._bands(value)):
+                neighbours = self._neighbours(band, radius)
+                rows = self._conn.execute(f"SELECT key, hash FROM hashes WHERE b{i} IN ({', '.join('?' * len(neighbours))})",
+                                          neighbours)
+                for key, stored in rows:
+                    distance = hamming_distance(value, stored & ((1 << 64) - 1))
+                    if distance <= max_distance and key != exclude_key and (best is None or distance < best[1]):
+                        best = (key, distance)
+        return best
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class NearDuplicateGroups:
+    """Groups keys whose hashes are within `max_distance` bits, in the order they are added.
+
+    The first key of a group leads it and is the only one kept in the in-memory index, so
+    later keys are compared against one hash per group.
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.index = PerceptualIndex()
+        self.leader_of = {}
+        self.sizes = {}
+
+    def add(self, key: str, value: int) -> str:
+        """Adds `key` and returns the leader of its group (`key` itself if it is new)."""
+        match = self.index.nearest(value, self.max_distance, exclude_key=key)
+        if match is None:
+            self.index.add(key, value)
+            self.sizes[key] = 1
+            return key
+        leader = match[0]
+        self.leader_of[key] = leader
+        self.sizes[leader] += 1
+        return leader
+
+    def is_duplicate(self, key: str) -> bool:
+        return key in self.leader_of
+
+    def similar_count(self, key: str) -> int:
+        """How many later keys were grouped under `key`."""
+        return self.sizes.get(key, 1) - 1
+
+class NearDuplicateFilter:
+    """Drops scraped results that look like a picture already accepted, before any full-size
+    download.
+
+    Each result's thumbnail is fetched (through `load_thumbnail(image_data)`, returning its
+    bytes or None) on a thread pool and hashed by `hasher`, up to `lookahead` results ahead
+    of the consumer. Results are then checked in order against `index`: the first copy of a
+    picture passes and is added under its normalized image URL, later copies are dropped.
+    Results without a usable thumbnail always pass. Call `forget` for a result whose
+    download failed, so a later copy can take its place.
+    """
+
+    def __init__(self, index: PerceptualIndex, load_thumbnail: Callable[[ImageData], Optional[bytes]],
+                 hasher: Optional[PerceptualHasher] = None, max_distance: int = DEFAULT_MAX_DISTANCE,
+                 lookahead: int = 16, debug: bool = False):
+        self.index = index
+        self.load_thumbnail = load_thumbnail
+        self.hasher = hasher or PerceptualHasher()
+        self.max_distance = max_distance
+        self.lookahead = lookahead
+        self.debug = debug
+        self._fetcher = ThreadPoolExecutor(max_workers=lookahead, thread_name_prefix="perceptual")
+
+    def _hash(self, image_data: ImageData) -> Optional[int]:
+        try:
+            data = self.load_thumbnail(image_data)
+        except Exception as e:
+            if self.debug:
+                print(f"[DEBUG] Could not load thumbnail for {image_data.title}: {e}")
+            return None
+        return self.hasher.hash(data) if data else None
+
+    def _check(self, image_data: ImageData, future: Future) -> bool:
+        value = future.result()
+        if value is None or not image_data.image_source_url:
+            return True
+        key = normalize_url(image_data.image_source_url)
+        match = self.index.nearest(value, self.max_distance, exclude_key=key)
+        if match is not None:
+            metrics.count("near_duplicates_skipped")
+            if self.debug:
+                print(f"[DEBUG] Skipping {image_data.image_source_url}: {match[1]} bits from {match[0]}")
+            return False
+        self.index.add(key, value)
+        return True
+
+    def filter(self, images: Iterable[ImageData]) -> Iterator[ImageData]:
+        pending = deque()
+        for image_data in images:
+            pending.append((image_data, self._fetcher.submit(self._hash, image_data)))
+            while pending and (len(pending) > self.lookahead or pending[0][1].done()):
+                candidate, future = pending.popleft()
+                if self._check(candidate, future):
+                    yield candidate
+        while pending:
+            candidate, future = pending.popleft()
+            if self._check(candidate, future):
+                yield candidate
+
+    def forget(self, image_data: ImageData):
+        if image_data.image_source_url:
+            self.index.remove(normalize_url(image_data.image_source_url))
+
+    def shutdown(self):
+        self._fetcher.shutdown(wait=False, cancel_futures=True)
+        self.hasher.shutdown()
@@ -0,0 +1,173 @@
+"""Post-download processing: verify each file decodes, read its real dimensions, and write
+resized or format-converted copies, in a pool of worker processes alongside the downloads.
+
+Every file is decoded once per job; all outputs are made from that one decode.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+from PIL import Image, ImageOps
+from bing_image_downloader.data_model import ImageData
+from bing_image_downloader.metrics import metrics
+from bing_image_downloader.validation import EXTENSIONS, normalize_image_type
+
+@dataclass
+class ProcessingOptions:
+    """What to do with each downloaded file.
+
+    `resize` lists bounding boxes (width, height); each gets a copy scaled down to fit it,
+    keeping the aspect ratio, in a `<width>x<height>` subdirectory of `output_directory`.
+    `convert` is an image type such as "webp"; the resized copies use it, or without
+    `resize` a full-size copy is written to a subdirectory named after it.
+    """
+    resize: List[Tuple[int, int]] = field(default_factory=list)
+    convert: Optional[str] = None
+    quality: int = 90
+    output_directory: Optional[str] = None
+
+    @property
+    def writes_copies(self) -> bool:
+        return bool(self.resize or self.convert)
+
+@dataclass
+class ProcessedImage:
+    """Outcome of processing one downloaded file."""
+    path: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    image_type: Optional[str] = None
+    outputs: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+def parse_size(value: str) -> Tuple[int, int]:
+    """Parses "WIDTHxHEIGHT", or a single number for a square box, as used by --resize."""
+    width, _, height = value.lower().partition("x")
+    try:
+        size = (int(width), int(height or width))
+    except ValueError:
+        raise ValueError(f"Invalid size {value!r}, expected e.g. 1024x768")
+    if min(size) <= 0:
+        raise ValueError(f"Invalid size {value!r}, width and height must be positive")
+    return size
+
+def _save(image: Image.Image, path: str, image_type: str, quality: int):
+    if image_type == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    image.save(tmp_path, format=image_type.upper(), quality=quality)
+    os.replace(tmp_path, path)
+
+def process_file(path: str, options: ProcessingOptions) -> ProcessedImage:
+    """Decodes `path` and writes the copies `options` asks for. Never raises; failures are
+    reported in the result."""
+    result = ProcessedImage(path)
+    if normalize_image_type(os.path.splitext(path)[1]) == "svg":
+        result.image_type = "svg" # Vector images have no pixels to check or resize.
+        return result
+    try:
+        with Image.open(path) as image:
+            result.image_type = normalize_image_type(image.format)
+            image.load() # Decodes every pixel, so truncated or corrupt files fail here.
+            image = ImageOps.exif_transpose(image)
+            result.width, result.height = image.size
+            if not options.writes_copies:
+                return result
+
+            output_type = options.convert or result.image_type or "jpeg"
+            directory = options.output_directory or os.path.dirname(path)
+            name = os.path.splitext(os.path.basename(path))[0] + EXTENSIONS[output_type]
+            if options.resize:
+                for width, height in options.resize:
+                    copy = image.copy()
+                    copy.thumbnail((width, height), Image.Resampling.LANCZOS)
+                    output = os.path.join(directory, f"{width}x{height}", name)
+                    _save(copy, output, output_type, options.quality)
+                    result.outputs.append(output)
+            else:
+                output = os.path.join(directory, output_type, name)
+                _save(image, output, output_type, options.quality)
+                result.outputs.append(output)
+    except (OSError, ValueError, KeyError, Image.DecompressionBombError) as e:
+        result.error = f"Could not process {path}: {e}"
+    return result
+
+class PostProcessor:
+    """Runs `process_file` for completed downloads in a pool of `processes` worker processes
+    (the core count by default, or on the calling thread with 0).
+
+    `submit` returns immediately, so processing overlaps the downloads still running. When a
+    file is done its real width and height are written back to the ImageData, and
+    `on_processed(image_data, processed)` is called from a pool thread.
+    """
+
+    def __init__(self, options: ProcessingOptions, processes: Optional[int] = None,
+                 on_processed: Optional[Callable[[ImageData, ProcessedImage], None]] = None):
+        self.options = options
+        self.processes = (os.cpu_count() or 1) if processes is None else processes
+        self.on_processed = on_processed
+        self.results: List[ProcessedImage] = []
+        self._futures: List[Future] = []
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def submit(self, image_data: ImageData) -> Future:
+        """Queues the downloaded file of `image_data`. Returns a future resolving to its
+        ProcessedImage once the ImageData has been updated."""
+        path = image_data.downloaded_path
+        done = Future()
+        with self._lock:
+            self._futures.append(done)
+        if not self.processes:
+            future = Future()
+            future.set_result(process_file(path, self.options))
+        else:
+            with self._lock:
+                if self._pool is None:
+                    # Spawned rather than forked: the parent is running download threads.
+                    self._pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"))
+            future = self._pool.submit(process_file, path, self.options)
+        future.add_done_callback(lambda f: self._done(image_data, f, done))
+        return done
+
+    def _done(self, image_data: ImageData, future: Future, done: Future):
+        try:
+            processed = future.result()
+        except Exception as e: # e.g. a worker process died or the pool was shut down
+            processed = ProcessedImage(image_data.downloaded_path, error=f"Could not process {image_data.downloaded_path}: {e}")
+        if processed.ok:
+            if processed.width:
+                image_data.width, image_data.height = processed.width, processed.height
+            metrics.count("images_processed")
+        else:
+            metrics.count("processing_failures")
+        with self._lock:
+            self.results.append(processed)
+        if self.on_processed:
+            try:
+                self.on_processed(image_data, processed)
+            except Exception as e:
+                print(f"Error in processing callback: {e}")
+        done.set_result(processed)
+
+    def wait(self) -> List[ProcessedImage]:
+        """Waits for every submitted file and returns their results, in completion order."""
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.result()
+        with self._lock:
+            return list(self.results)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
@@ -0,0 +1,70 @@
+import datetime
+import math
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+from urllib.parse import urlencode
+from bing_image_downloader.filters import Filter
+
+MINUTES_PER_DAY = 24 * 60
+
+# Bing's custom size filter takes a minimum width and height, not a pixel count. Assuming no
+# result is more than this many times wider than it is tall (or the reverse), an image of
+# more than N pixels has both sides above sqrt(N / MAX_ASPECT_RATIO).
+MAX_ASPECT_RATIO = 4
+
+@dataclass
+class SearchQuery:
+    """A search with as many filters as possible turned into Bing `qft=+filterui:...` terms.
+
+    `client_filters` are the filters to check on each result. Bing's terms only narrow the
+    results down, and are not applied to cached pages or every result, so this includes
+    the filters that were sent to Bing as well as those it can't express.
+    """
+    text: str
+    terms: List[str] = field(default_factory=list)
+    client_filters: List[Filter] = field(default_factory=list)
+
+    @property
+    def qft(self) -> Optional[str]:
+        """The `qft` value, in the `+filterui:a+filterui:b` form Bing's own links use."""
+        return "".join(f"+filterui:{term}" for term in self.terms) or None
+
+def query_string(text: str, qft: Optional[str] = None) -> str:
+    """URL query string for a search. `qft` is added unescaped, as Bing's links have it."""
+    params = urlencode({"q": text})
+    return f"{params}&qft={qft}" if qft else params
+
+def _tighter(current: Optional[int], value: int) -> int:
+    return value if current is None else min(current, value)
+
+def build_query(text: str, filters: Iterable[Filter], today: Optional[datetime.date] = None) -> SearchQuery:
+    """Moves the filters Bing supports into the query.
+
+    "Size is greater than" becomes a minimum width and height, and "Age newer than",
+    "Date is after" and "Date is on" a maximum age. Every filter is also kept as a client
+    filter.
+    """
+    today = today or datetime.date.today()
+    min_side = None
+    max_age_minutes = None
+    client_filters = list(filters)
+    for f in client_filters:
+        if f.criterion == "Size (px)" and f.operator == "is greater than":
+            side = math.isqrt(max(0, int(f.value)) // MAX_ASPECT_RATIO)
+            if side > 0:
+                min_side = max(min_side or 0, side)
+        elif f.criterion == "Age" and f.operator == "newer than (days)":
+            max_age_minutes = _tighter(max_age_minutes, int(f.value) * MINUTES_PER_DAY)
+        elif f.criterion == "Date" and f.operator in ("is after", "is on"):
+            value = f.value if isinstance(f.value, datetime.date) else datetime.date.fromisoformat(str(f.value))
+            # Whole days, so the query (and its cache key) only changes once a day.
+            days = (today - value).days + 1
+            if days > 0:
+                max_age_minutes = _tighter(max_age_minutes, days * MINUTES_PER_DAY)
+
+    terms = []
+    if min_side:
+        terms.append(f"imagesize-custom_{min_side}_{min_side}")
+    if max_age_minutes is not None:
+        terms.append(f"age-lt{max_age_minutes}")
+    return SearchQuery(text, terms, client_filters)
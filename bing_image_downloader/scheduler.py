@@ -0,0 +1,330 @@
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Optional
+from urllib.parse import urlparse
+from bing_image_downloader.data_model import ImageData
+
+# How long waiters sleep before re-checking when only another thread's progress (a slot
+# being released, a half-open probe finishing) can unblock them; they are normally woken
+# by notify_all well before this.
+POLL_SECONDS = 0.25
+
+def host_of(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header, given either in seconds or as an HTTP date, into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+class HostUnavailable(Exception):
+    """Raised for a download whose host has tripped its circuit breaker too many times."""
+
+class TokenBucket:
+    """Allows `rate` requests per second on average, in bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+class CircuitBreaker:
+    """Stops sending requests to a host after `failure_threshold` consecutive failures.
+
+    The circuit then stays open for `reset_timeout` seconds, doubling each time it trips
+    again, before a single probe request is let through (half-open). A successful probe
+    closes it; a failed one opens it again. After `max_trips` trips without a success the
+    host is considered down for as long as the circuit is open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0, max_trips: int = 3):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_trips = max_trips
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self.probing = False
+
+    def down(self, now: float) -> bool:
+        return self.state == self.OPEN and self.trips >= self.max_trips and now < self.open_until
+
+    def delay(self, now: float) -> float:
+        """Seconds until a request may be sent."""
+        if self.state == self.OPEN:
+            if now < self.open_until:
+                return self.open_until - now
+            self.state = self.HALF_OPEN
+            self.probing = False
+        if self.state == self.HALF_OPEN and self.probing:
+            return POLL_SECONDS
+        return 0.0
+
+    def started(self):
+        if self.state == self.HALF_OPEN:
+            self.probing = True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.probing = False
+
+    def record_failure(self, now: float):
+        self.failures += 1
+        self.probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.trips += 1
+            self.failures = 0
+            self.state = self.OPEN
+            self.open_until = now + self.reset_timeout * 2 ** (self.trips - 1)
+
+class RetryPolicy:
+    """Exponential backoff with full jitter: retry n waits a random time of up to
+    `base_delay * 2**n` seconds, capped at `max_delay`, but never less than the server's
+    Retry-After. Gives up after `max_retries` retries, or when Retry-After is over `max_delay`."""
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """Seconds to wait before retrying after failed attempt number `attempt` (from 0),
+        or None to give up."""
+        if attempt >= self.max_retries or (retry_after is not None and retry_after > self.max_delay):
+            return None
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(backoff, retry_after or 0.0)
+
+class _HostState:
+    def __init__(self, bucket: Optional[TokenBucket], breaker: CircuitBreaker):
+        self.bucket = bucket
+        self.breaker = breaker
+        self.active = 0
+        self.blocked_until = 0.0
+
+class HostScheduler:
+    """Decides when a request to a host may start, shared by every download thread.
+
+    Each host gets at most `per_host_limit` concurrent requests, a token bucket of `rate`
+    requests per second (unlimited if None) with bursts of `burst`, and a circuit breaker.
+    A host that answers 429 (or 503 with Retry-After) is left alone for the time it asks
+    for. Hosts that need to be waited on never hold up requests to other hosts.
+    """
+
+    def __init__(self, per_host_limit: int = 4, rate: Optional[float] = None, burst: Optional[float] = None,
+                 failure_threshold: int = 5, reset_timeout: float = 10.0, max_trips: int = 3,
+                 max_wait: float = 60.0):
+        self.per_host_limit = per_host_limit
+        self.rate = rate
+        self.burst = burst or max(1.0, rate or 1.0)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_trips = max_trips
+        self.max_wait = max_wait
+        self.condition = threading.Condition()
+        self._hosts: Dict[str, _HostState] = {}
+
+    def _state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            bucket = TokenBucket(self.rate, self.burst) if self.rate else None
+            state = self._hosts[host] = _HostState(bucket, CircuitBreaker(self.failure_threshold, self.reset_timeout, self.max_trips))
+        return state
+
+    def wait_time(self, host: str, now: float, limit: Optional[int] = None) -> Optional[float]:
+        """Seconds until a request to `host` may start, or None if the host is down.
+        Must be called with `condition` held."""
+        state = self._state(host)
+        if state.breaker.down(now) or state.blocked_until - now > self.max_wait:
+            return None
+        waits = [state.breaker.delay(now), state.blocked_until - now]
+        if state.active >= (limit or self.per_host_limit):
+            waits.append(POLL_SECONDS)
+        if state.bucket:
+            waits.append(state.bucket.delay(now))
+        return max(0.0, *waits)
+
+    def parked(self, host: str, now: float) -> bool:
+        """Whether `host` is backing off or has an open circuit. Must be called with
+        `condition` held."""
+        state = self._state(host)
+        return state.breaker.state != CircuitBreaker.CLOSED or state.blocked_until > now
+
+    def tripped(self, host: str) -> bool:
+        """Whether the circuit for `host` is open or half-open. Must be called with
+        `condition` held."""
+        return self._state(host).breaker.state != CircuitBreaker.CLOSED
+
+    def start(self, host: str, now: float):
+        """Records a request to `host` starting. Must be called with `condition` held."""
+        state = self._state(host)
+        state.active += 1
+        state.breaker.started()
+        if state.bucket:
+            state.bucket.take(now)
+
+    def acquire(self, url: str, limit: Optional[int] = None, poll: Optional[Callable[[], None]] = None) -> str:
+        """Blocks until a request to the host of `url` may start, and returns the host.
+
+        `poll` is called about every POLL_SECONDS while waiting, and may raise to stop
+        waiting. Raises HostUnavailable if the host is down.
+        """
+        host = host_of(url)
+        while True:
+            with self.condition:
+                now = time.monotonic()
+                wait = self.wait_time(host, now, limit)
+                if wait is None:
+                    raise HostUnavailable(f"{host} is unavailable after repeated failures")
+                if wait == 0:
+                    self.start(host, now)
+                    return host
+                self.condition.wait(min(wait, POLL_SECONDS))
+            if poll:
+                poll()
+
+    def finish(self, host: str, failed: bool = False, retry_after: Optional[float] = None,
+               throttled: bool = False, record: bool = True):
+        """Records a request to `host` finishing.
+
+        `failed` counts towards the circuit breaker; `throttled` (a 429) instead blocks the
+        host for `retry_after` seconds, or the scheduler's reset timeout. With `record`
+        False, e.g. for a cancelled download, only the concurrency slot is released.
+        """
+        with self.condition:
+            state = self._state(host)
+            state.active -= 1
+            now = time.monotonic()
+            if record:
+                if throttled:
+                    pause = retry_after if retry_after is not None else self.reset_timeout
+                    state.blocked_until = max(state.blocked_until, now + pause)
+                elif failed:
+                    if retry_after is not None:
+                        state.blocked_until = max(state.blocked_until, now + retry_after)
+                    state.breaker.record_failure(now)
+                else:
+                    state.breaker.record_success()
+            self.condition.notify_all()
+
+@dataclass
+class QueuedDownload:
+    index: int
+    image_data: ImageData
+    host: str
+    attempt: int = 0
+    not_before: float = 0.0
+    unavailable: bool = False
+
+class DownloadQueue:
+    """Queue of downloads that hands workers the first job whose host can take a request.
+
+    Jobs for hosts that are rate limited, backing off or behind an open circuit stay queued
+    while jobs behind them for healthy hosts go ahead. `put` blocks while `maxsize` jobs
+    that could run are waiting, so a fast producer is held back; jobs that are parked or
+    waiting to be retried don't count. Jobs whose host is down are handed out with
+    `unavailable` set, for the worker to report as failed, and so are jobs parked behind
+    an open circuit once nothing else is left to do, so they never hold up the end of a
+    batch on their own.
+    """
+
+    def __init__(self, scheduler: HostScheduler, per_host_limit: Optional[int] = None, maxsize: int = 0):
+        self.scheduler = scheduler
+        self.per_host_limit = per_host_limit
+        self.maxsize = maxsize
+        self.condition = scheduler.condition
+        self.pending: Deque[QueuedDownload] = deque()
+        self.in_flight = 0
+        self.closed = False
+
+    def _waiting(self, now: float) -> int:
+        return sum(1 for job in self.pending if job.not_before <= now and not self.scheduler.parked(job.host, now))
+
+    def put(self, index: int, image_data: ImageData):
+        job = QueuedDownload(index, image_data, host_of(image_data.image_source_url or ""))
+        with self.condition:
+            while self.maxsize and self._waiting(time.monotonic()) >= self.maxsize:
+                self.condition.wait(POLL_SECONDS)
+            self.pending.append(job)
+            self.condition.notify_all()
+
+    def retry(self, job: QueuedDownload, delay: float):
+        """Queues `job` again, to start no sooner than `delay` seconds from now. Call before
+        `task_done` for the failed attempt."""
+        with self.condition:
+            job.attempt += 1
+            job.not_before = time.monotonic() + delay
+            self.pending.append(job)
+            self.condition.notify_all()
+
+    def close(self):
+        """Marks the end of new jobs; `get` returns None once every job is finished."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def task_done(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def get(self) -> Optional[QueuedDownload]:
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                soonest = POLL_SECONDS
+                for job in self.pending:
+                    wait = self.scheduler.wait_time(job.host, now, self.per_host_limit)
+                    if wait is None:
+                        job.unavailable = True
+                    elif job.not_before > now or wait > 0:
+                        soonest = min(soonest, max(job.not_before - now, wait))
+                        continue
+                    else:
+                        self.scheduler.start(job.host, now)
+                    self.pending.remove(job)
+                    self.in_flight += 1
+                    self.condition.notify_all()
+                    return job
+                if self.closed and not self.in_flight:
+                    if not self.pending:
+                        return None
+                    if all(self.scheduler.tripped(job.host) for job in self.pending):
+                        job = self.pending.popleft()
+                        job.unavailable = True
+                        self.in_flight += 1
+                        return job
+                self.condition.wait(soonest)
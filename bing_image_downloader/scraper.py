@@ -1,51 +1,118 @@
 import time
 import json
-import datetime
-import re
-from urllib.parse import urlparse
-from selenium import webdriver
+from itertools import islice
+from typing import Iterator, Optional
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 from bing_image_downloader.data_model import ImageData
+from bing_image_downloader.driver_pool import DriverPool
+from bing_image_downloader.metrics import metrics
+from bing_image_downloader.parsing import parse_image_data
+from bing_image_downloader.query import query_string
+
+# Reads every result after the cursor position in one round trip: its data-idx, the raw
+# `m` JSON of its link, and the text and tooltip date of its `.ppdatr` age label.
+EXTRACT_RESULTS_SCRIPT = """
+const nodes = document.querySelectorAll('li[data-idx]');
+const items = [];
+for (let i = arguments[0]; i < nodes.length; i++) {
+    const li = nodes[i];
+    const dataIdx = li.getAttribute('data-idx');
+    const link = li.querySelector('a[m]');
+    const age = li.querySelector('.ppdatr');
+    items.push({
+        data_idx: dataIdx,
+        m: link ? link.getAttribute('m') : null,
+        age: age ? age.textContent.trim() : null,
+        date: age ? age.getAttribute('title') : null,
+    });
+}
+return items;
+"""
+
+# Scrolls to the bottom, clicking Bing's "See more images" button if it is showing, and
+# returns how many results were on the page beforehand.
+SCROLL_SCRIPT = """
+const count = document.querySelectorAll('li[data-idx]').length;
+const seeMore = document.querySelector(arguments[0]);
+if (seeMore && seeMore.offsetParent !== null) seeMore.click();
+window.scrollTo(0, document.body.scrollHeight);
+return count;
+"""
+
+# Returns the current result count and whether the end-of-results marker is showing.
+RESULTS_STATE_SCRIPT = """
+const end = document.querySelector(arguments[0]);
+return [document.querySelectorAll('li[data-idx]').length, !!(end && end.offsetParent !== null)];
+"""
+
+MIN_SCROLL_TIMEOUT = 1.0
 
 class BingImageScraper:
-    def __init__(self, debug=False):
+    see_more_selector = "a.btn_seemore"
+    end_of_results_selector = ".mm_seemore .btn_seemore.disabled, #mmComponent_images_1 .end_of_results"
+
+    def __init__(self, debug=False, driver_pool: DriverPool = None):
         self.debug = debug
-        options = Options()
-        options.add_argument("-headless")
-        options.add_argument("--window-size=1920,1080")
-        self.driver = webdriver.Firefox(options=options)
+        self.last_scroll_wait = 0.0
+        self._scroll_load_estimate = 0.5
+        # Scrapers sharing one pool can search in parallel, each on its own driver.
+        self._owns_pool = driver_pool is None
+        self.driver_pool = driver_pool or DriverPool(size=1, debug=debug)
+        self.driver = self.driver_pool.acquire()
         self.scraped_image_ids = set()
+        self._cursor = 0
 
     def __del__(self):
-        self.driver.quit()
+        self.close()
 
-    def search(self, query: str):
+    def close(self):
+        """Returns the driver to the pool, and shuts the pool down if this scraper created it."""
+        driver, self.driver = getattr(self, "driver", None), None
+        if driver:
+            self.driver_pool.release(driver)
+        if getattr(self, "_owns_pool", False):
+            self.driver_pool.close()
+            self._owns_pool = False
+
+    def _recycle_driver(self, broken: bool = False):
         if self.driver:
-            self.driver.quit()
-        options = Options()
-        options.add_argument("-headless")
-        options.add_argument("--window-size=1920,1080")
-        self.driver = webdriver.Firefox(options=options)
+            self.driver_pool.release(self.driver, broken=broken)
+        self.driver = None
+        self.driver = self.driver_pool.acquire()
+
+    def search(self, query: str, qft: Optional[str] = None):
+        # Hand the driver back to be reset, rather than relaunching Firefox for each query.
+        self._recycle_driver()
         self.scraped_image_ids = set()
+        self._cursor = 0
 
+        url = f"https://www.bing.com/images/search?{query_string(query, qft)}"
         start_time = time.perf_counter()
-        self.driver.get(f"https://www.bing.com/images/search?q={query}")
-        try:
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, "//li[@data-idx]"))
-            )
-            self._clean_page_overlays() # Clean overlays after initial load
-        except TimeoutException:
-            print("Initial image results did not load.")
-            return []
-        end_time = time.perf_counter()
-        print(f"Search and initial page load took: {end_time - start_time:.2f} seconds")
+        with metrics.span("search"):
+            try:
+                with metrics.span("page_load"):
+                    try:
+                        self.driver.get(url)
+                    except WebDriverException as e:
+                        print(f"Driver failed, retrying on a fresh one: {e}")
+                        metrics.count("driver_failures")
+                        self._recycle_driver(broken=True)
+                        self.driver.get(url)
+                    WebDriverWait(self.driver, 10).until(
+                        EC.presence_of_element_located((By.XPATH, "//li[@data-idx]"))
+                    )
+                with metrics.span("overlay_cleanup"):
+                    self._clean_page_overlays() # Clean overlays after initial load
+            except TimeoutException:
+                print("Initial image results did not load.")
+                return []
+        if self.debug:
+            print(f"[DEBUG] Search and initial page load took: {time.perf_counter() - start_time:.2f} seconds")
 
     def _clean_page_overlays(self):
         """Attempts to dismiss common page-level overlays like cookie banners or sign-in prompts."""
@@ -76,125 +143,99 @@ class BingImageScraper:
             print(f"Error sending ESC key: {e}")
             pass
 
-    def get_image_data(self, max_images: int = 100, scroll_pause_time: int = 2) -> list[ImageData]:
-        """Gets all the image data from the current search results page."""
-        total_start_time = time.perf_counter()
-        newly_scraped_images = []
-
-        last_height = self.driver.execute_script("return document.body.scrollHeight")
-
-        while len(newly_scraped_images) < max_images:
-            li_elements = self.driver.find_elements(By.XPATH, "//li[@data-idx]")
+    def _wait_for_more_results(self, max_scroll_wait: float) -> bool:
+        """Scrolls to the bottom and waits until more results appear or Bing says there are no more.
 
-            for element in li_elements:
-                data_idx = element.get_attribute("data-idx")
-                if data_idx and data_idx not in self.scraped_image_ids:
-                    self.scraped_image_ids.add(data_idx)
-                    image_data = None # Initialize image_data
-                    try:
-                        parse_start_time = time.perf_counter()
-                        m_attr = element.find_element(By.TAG_NAME, "a").get_attribute("m")
-                        if m_attr:
-                            m_data = json.loads(m_attr)
-                            image_data = self._parse_image_data(m_data, data_idx, element)
-                            if self.debug:
-                                print(f"[DEBUG] Scraped data for image {data_idx}: {image_data}")
-                            
-                            # Get thumbnail
-                            try:
-                                thumb_element = element.find_element(By.TAG_NAME, "img")
-                                if self.debug:
-                                    print(f"[DEBUG] Attempting screenshot for {image_data.title}")
-                                image_data.thumbnail = thumb_element.screenshot_as_png
-                                if self.debug and image_data.thumbnail:
-                                    print(f"[DEBUG] Screenshot successful for {image_data.title}, size: {len(image_data.thumbnail)} bytes")
-                                elif self.debug and not image_data.thumbnail:
-                                    print(f"[DEBUG] Screenshot returned None for {image_data.title}")
-                            except (NoSuchElementException, WebDriverException) as e:
-                                if self.debug:
-                                    print(f"[DEBUG] Error taking screenshot for {image_data.title}: {e}")
-                                image_data.thumbnail = None
-
-                            newly_scraped_images.append(image_data)
-                            if len(newly_scraped_images) >= max_images:
-                                break
-                            parse_end_time = time.perf_counter()
-                            print(f"  Parsing and thumbnail for {image_data.title} took: {parse_end_time - parse_start_time:.2f} seconds")
-                    except (NoSuchElementException, json.JSONDecodeError) as e:
-                        print(f"Could not extract data for image {data_idx}: {e}")
+        Each wait starts from an adaptive timeout derived from how long recent scrolls took to
+        load, so fast pages are not held up. A wait that times out before the end-of-results
+        marker shows scrolls again with double the timeout, until `max_scroll_wait` seconds
+        are used up, so slow pages are not given up on too early.
+        """
+        scroll_start_time = time.perf_counter()
+        timeout = max(MIN_SCROLL_TIMEOUT, self._scroll_load_estimate * 4)
+        loaded = ended = False
 
-            if len(newly_scraped_images) >= max_images:
+        while not loaded and not ended:
+            remaining = max_scroll_wait - (time.perf_counter() - scroll_start_time)
+            if remaining <= 0:
                 break
+            before = self.driver.execute_script(SCROLL_SCRIPT, self.see_more_selector)
+            attempt_timeout = min(timeout, remaining)
 
-            scroll_start_time = time.perf_counter()
-            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(scroll_pause_time)
+            def results_changed(driver):
+                count, ended = driver.execute_script(RESULTS_STATE_SCRIPT, self.end_of_results_selector)
+                return count > before or ended
 
-            new_height = self.driver.execute_script("return document.body.scrollHeight")
-            if new_height == last_height:
-                print("No new content loaded after scrolling.")
-                break
-            last_height = new_height
-            scroll_end_time = time.perf_counter()
-            print(f"  Scrolling took: {scroll_end_time - scroll_start_time:.2f} seconds")
-
-        total_end_time = time.perf_counter()
-        print(f"Total get_image_data took: {total_end_time - total_start_time:.2f} seconds for {len(newly_scraped_images)} images")
-        return newly_scraped_images
+            try:
+                WebDriverWait(self.driver, attempt_timeout, poll_frequency=0.05).until(results_changed)
+                count, ended = self.driver.execute_script(RESULTS_STATE_SCRIPT, self.end_of_results_selector)
+                loaded = count > before
+            except TimeoutException:
+                if self.debug:
+                    print(f"[DEBUG] No new results after {attempt_timeout:.2f} seconds, scrolling again")
+                timeout *= 2
 
-    def _parse_image_data(self, m_data: dict, data_idx: str, li_element) -> ImageData:
-        info = ImageData()
-        info.data_idx = data_idx
-        info.title = m_data.get("t")
-        info.image_source_url = m_data.get("murl")
+        elapsed = time.perf_counter() - scroll_start_time
+        self.last_scroll_wait += elapsed
+        metrics.observe("scroll_wait", elapsed)
+        if loaded:
+            # Exponentially weighted so the timeout tracks how fast this page is loading now.
+            self._scroll_load_estimate = 0.7 * self._scroll_load_estimate + 0.3 * elapsed
+        if self.debug:
+            state = "loaded more results" if loaded else ("reached the end of results" if ended else f"timed out after {max_scroll_wait:.2f} seconds")
+            print(f"[DEBUG] Scroll wait {state} in {elapsed:.2f} seconds")
+        return loaded
 
-        purl = m_data.get("purl")
-        if purl:
-            parsed_uri = urlparse(purl)
-            info.site_source = parsed_uri.netloc
+    def iter_image_data(self, max_scroll_wait: float = 10.0, start: int = 0, with_raw: bool = False) -> Iterator[ImageData]:
+        """Yields each result as soon as it is parsed, scrolling for more when the page runs out.
 
-        width = m_data.get("w")
-        height = m_data.get("h")
-        if width and height:
-            info.size = f"{width} x {height}"
-        else:
-            # Fallback to 's' if width/height not present, and try to parse it
-            size_str = m_data.get("s")
-            if size_str:
-                match = re.search(r'(\d+) x (\d+)', size_str)
-                if match:
-                    info.size = f"{match.group(1)} x {match.group(2)}"
-                else:
-                    info.size = size_str # Keep original string if parsing fails
+        Keeps a cursor into the page's `li[data-idx]` nodes, so every read only covers the
+        nodes added since the last one, and a later call carries on where this one stopped.
+        Results before position `start` are skipped without being read. With `with_raw`,
+        yields (ImageData, raw `m` JSON) pairs instead, for the result cache.
+        """
+        self._cursor = max(self._cursor, start)
+        while True:
+            batch_start_time = time.perf_counter()
+            items = self.driver.execute_script(EXTRACT_RESULTS_SCRIPT, self._cursor)
             if self.debug:
-                print(f"[DEBUG] Extracted size for {info.title}: {info.size}")
-
-        info.file_type = m_data.get("f")
+                print(f"[DEBUG] Extracted {len(items)} new results in {time.perf_counter() - batch_start_time:.2f} seconds")
 
-        try:
-            ago_element = li_element.find_element(By.CSS_SELECTOR, ".ppdatr")
-            info.age = ago_element.text
-            if info.age:
-                match = re.search(r'(\d+)\s+(day|week|month|year)s?', info.age)
-                if match:
-                    value = int(match.group(1))
-                    unit = match.group(2)
-                    if unit == 'day': info.parsed_age = value
-                    elif unit == 'week': info.parsed_age = value * 7
-                    elif unit == 'month': info.parsed_age = value * 30
-                    elif unit == 'year': info.parsed_age = value * 365
+            for item in items:
+                self._cursor += 1
+                data_idx = item["data_idx"]
+                if not data_idx or data_idx in self.scraped_image_ids:
+                    continue
+                self.scraped_image_ids.add(data_idx)
+                if not item["m"]:
+                    continue
+                with metrics.span("parse_item"):
+                    try:
+                        m_data = json.loads(item["m"])
+                    except json.JSONDecodeError as e:
+                        print(f"Could not extract data for image {data_idx}: {e}")
+                        metrics.count("parse_errors")
+                        continue
+                    image_data = parse_image_data(m_data, data_idx, item["age"], item["date"], debug=self.debug)
+                metrics.count("results_scraped")
+                if self.debug:
+                    print(f"[DEBUG] Scraped data for image {data_idx}: {image_data}")
+                yield (image_data, item["m"]) if with_raw else image_data
 
-            tooltip_date = ago_element.get_attribute("title")
-            if tooltip_date:
-                try:
-                    info.parsed_date = datetime.datetime.strptime(tooltip_date, '%m/%d/%Y').date()
-                    info.date = tooltip_date
-                except ValueError:
-                    pass
-        except NoSuchElementException:
-            pass
+            if not self._wait_for_more_results(max_scroll_wait):
+                print("No new content loaded after scrolling.")
+                return
 
-        return info
+    def get_image_data(self, max_images: int = 100, max_scroll_wait: float = 10.0) -> list[ImageData]:
+        """Gets the next `max_images` results from the current search results page."""
+        total_start_time = time.perf_counter()
+        self.last_scroll_wait = 0.0
+        newly_scraped_images = list(islice(self.iter_image_data(max_scroll_wait), max_images))
+        total_end_time = time.perf_counter()
+        if self.debug:
+            print(f"[DEBUG] Total get_image_data took: {total_end_time - total_start_time:.2f} seconds for {len(newly_scraped_images)} images "
+                  f"(scroll wait: {self.last_scroll_wait:.2f} seconds)")
+        return newly_scraped_images
 
     def get_detailed_info(self, data: ImageData) -> ImageData:
         if self.debug:
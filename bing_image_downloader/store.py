@@ -0,0 +1,161 @@
+import contextlib
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit
+
+try:
+    import fcntl
+except ImportError: # Windows: downloads of the same URL are only serialized within a process.
+    fcntl = None
+
+INDEX_FILENAME = ".download_index.sqlite3"
+LOCKS_DIRNAME = ".locks"
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def normalize_url(url: str) -> str:
+    """Normalizes a URL for use as an index key: lowercases the scheme and host, and drops
+    default ports and fragments."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+class DownloadStore:
+    """Persistent index of completed downloads, keyed by normalized source URL and by the
+    SHA-256 of the content.
+
+    Lets a re-run skip URLs that were already downloaded, and stores identical bytes served
+    from different URLs only once per directory. A store can be shared by downloaders
+    writing to different directories, e.g. one per batch query: content already stored in
+    another directory is hard-linked (or copied, where links aren't supported) into the
+    directory asking for it, so each directory holds every file it downloaded.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, LOCKS_DIRNAME), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, INDEX_FILENAME), timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS blobs (sha256 TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, sha256 TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS copies (sha256 TEXT NOT NULL, directory TEXT NOT NULL, path TEXT NOT NULL, "
+                               "PRIMARY KEY (sha256, directory))")
+
+    def _blob_path(self, sha256: str) -> Optional[str]:
+        """Returns any path on disk holding the content `sha256`."""
+        rows = self._conn.execute("SELECT path FROM blobs WHERE sha256 = ? UNION ALL SELECT path FROM copies WHERE sha256 = ?",
+                                  (sha256, sha256)).fetchall()
+        for (path,) in rows:
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _free_path(self, path: str, sha256: str) -> str:
+        if os.path.exists(path):
+            root, ext = os.path.splitext(path)
+            path = f"{root}_{sha256[:10]}{ext}"
+        return path
+
+    def _record_copy(self, sha256: str, path: str):
+        directory = os.path.abspath(os.path.dirname(path))
+        self._conn.execute("INSERT OR REPLACE INTO copies (sha256, directory, path) VALUES (?, ?, ?)", (sha256, directory, path))
+
+    def _path_in(self, sha256: str, directory: Optional[str]) -> Optional[str]:
+        """Returns a path holding the content `sha256`, in `directory` if given, linking or
+        copying it there from another directory if needed. Must be called with `_lock` held."""
+        if directory is None:
+            return self._blob_path(sha256)
+        row = self._conn.execute("SELECT path FROM copies WHERE sha256 = ? AND directory = ?",
+                                 (sha256, os.path.abspath(directory))).fetchone()
+        if row and os.path.exists(row[0]):
+            return row[0]
+        source = self._blob_path(sha256)
+        if source is None:
+            return None
+        if os.path.abspath(os.path.dirname(source)) == os.path.abspath(directory):
+            path = source
+        else:
+            os.makedirs(directory, exist_ok=True)
+            path = self._free_path(os.path.join(directory, os.path.basename(source)), sha256)
+            try:
+                os.link(source, path)
+            except OSError: # e.g. another filesystem, or one without hard links
+                shutil.copy2(source, path)
+        with self._conn:
+            self._record_copy(sha256, path)
+        return path
+
+    def lookup_url(self, url: str, directory: Optional[str] = None) -> Optional[str]:
+        """Returns the path of a completed download of `url`, if it is still on disk. With
+        `directory`, the path is in that directory."""
+        with self._lock:
+            row = self._conn.execute("SELECT sha256 FROM urls WHERE url = ?", (normalize_url(url),)).fetchone()
+            return self._path_in(row[0], directory) if row else None
+
+    def lookup_hash(self, sha256: str, directory: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            return self._path_in(sha256, directory)
+
+    @contextlib.contextmanager
+    def url_lock(self, url: str):
+        """Held while downloading `url`, so other processes sharing this store wait for that
+        download to finish instead of fetching the same URL again.
+
+        The lock file is removed before it is unlocked, so the locks directory doesn't grow
+        with every URL ever downloaded. A process that was waiting on the removed file sees
+        that it is no longer the one at the path and locks the new one instead.
+        """
+        if fcntl is None:
+            yield
+            return
+        name = hashlib.sha1(normalize_url(url).encode("utf-8")).hexdigest()[:16]
+        path = os.path.join(self.directory, LOCKS_DIRNAME, f"{name}.lock")
+        while True:
+            f = open(path, "a")
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                current = os.stat(path)
+            except FileNotFoundError:
+                current = None
+            if current is not None and os.path.samestat(current, os.fstat(f.fileno())):
+                break
+            f.close()
+        try:
+            yield
+        finally:
+            os.remove(path)
+            f.close()
+
+    def commit(self, part_path: str, url: str, sha256: str, size: int, preferred_path: str) -> str:
+        """Moves a finished `.part` file into place and records it, returning its final path.
+
+        If the same bytes are already stored in the directory of `preferred_path` (or can be
+        linked there from another one), the part file is dropped and that path is returned.
+        If `preferred_path` is taken by different content, a short hash is added to the
+        filename instead of overwriting it.
+        """
+        with self._lock:
+            path = self._path_in(sha256, os.path.dirname(preferred_path))
+            if path:
+                os.remove(part_path)
+            else:
+                path = self._free_path(preferred_path, sha256)
+                os.replace(part_path, path)
+            with self._conn:
+                self._record_copy(sha256, path)
+                # The first copy stays the blob's path; later ones are found through `copies`.
+                self._conn.execute("INSERT OR IGNORE INTO blobs (sha256, path, size) VALUES (?, ?, ?)", (sha256, path, size))
+                self._conn.execute("INSERT OR REPLACE INTO urls (url, sha256) VALUES (?, ?)", (normalize_url(url), sha256))
+            return path
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,131 @@
+import hashlib
+import os
+import tempfile
+import requests
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+from requests.adapters import HTTPAdapter
+from bing_image_downloader.data_model import ImageData
+from bing_image_downloader.downloader import USER_AGENT
+from bing_image_downloader.metrics import metrics
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "bing_image_downloader", "thumbnails")
+
+class ThumbnailStore:
+    """On-disk store of thumbnail bytes, keyed by their SHA-256.
+
+    A small reference file per source URL points at the content key, so a thumbnail seen in
+    an earlier query can be found again without fetching it.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIRECTORY):
+        self.directory = directory
+        os.makedirs(os.path.join(self.directory, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(self.directory, "urls"), exist_ok=True)
+
+    def _blob_path(self, key: str) -> str:
+        return os.path.join(self.directory, "blobs", key[:2], key)
+
+    def _ref_path(self, url: str) -> str:
+        return os.path.join(self.directory, "urls", hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+    def _write_atomic(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._blob_path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def key_for_url(self, url: str) -> Optional[str]:
+        """Returns the key of the thumbnail previously stored for `url`, if it is still there."""
+        try:
+            with open(self._ref_path(url), "r") as f:
+                key = f.read().strip()
+        except OSError:
+            return None
+        return key if os.path.exists(self._blob_path(key)) else None
+
+    def put(self, url: str, data: bytes) -> str:
+        key = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(key)
+        if not os.path.exists(blob_path):
+            self._write_atomic(blob_path, data)
+        self._write_atomic(self._ref_path(url), key.encode("ascii"))
+        return key
+
+class ThumbnailFetcher:
+    """Fetches thumbnails from their `turl` in a background thread pool into a ThumbnailStore.
+
+    A thumbnail already in the store is never fetched again.
+    """
+
+    def __init__(self, store: Optional[ThumbnailStore] = None, max_workers: int = 8, debug=False):
+        self.store = store or ThumbnailStore()
+        self.debug = debug
+
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': USER_AGENT})
+        adapter = HTTPAdapter(pool_connections=max(10, max_workers), pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnail")
+
+    def get_key(self, url: str) -> str:
+        """Returns the store key of the thumbnail at `url`, fetching it if it is not stored yet."""
+        key = self.store.key_for_url(url)
+        if key is not None:
+            metrics.count("thumbnail_cache_hits")
+            return key
+        with metrics.span("thumbnail_fetch"):
+            response = self.session.get(url, timeout=10)
+            response.raise_for_status()
+        metrics.count("thumbnail_bytes", len(response.content))
+        return self.store.put(url, response.content)
+
+    def get_bytes(self, image_data: ImageData) -> Optional[bytes]:
+        """Returns the thumbnail bytes for `image_data`, fetching them on this thread if needed."""
+        if not image_data.thumbnail_key:
+            if not image_data.thumbnail_url:
+                return None
+            image_data.thumbnail_key = self.get_key(image_data.thumbnail_url)
+        return self.store.get(image_data.thumbnail_key)
+
+    def _fetch(self, image_data: ImageData, callback: Optional[Callable[[ImageData], None]]) -> ImageData:
+        try:
+            image_data.thumbnail_key = self.get_key(image_data.thumbnail_url)
+        except (requests.exceptions.RequestException, OSError) as e:
+            metrics.count("thumbnail_failures")
+            if self.debug:
+                print(f"[DEBUG] Error fetching thumbnail for {image_data.title}: {e}")
+        if callback:
+            callback(image_data)
+        return image_data
+
+    def fetch(self, image_data: ImageData, callback: Optional[Callable[[ImageData], None]] = None) -> Future:
+        """Fills `image_data.thumbnail_key` in the background.
+
+        Returns a future resolving to `image_data`; `callback` is called with it from a
+        worker thread once the thumbnail is stored (or could not be fetched).
+        """
+        if not image_data.thumbnail_url or image_data.thumbnail_key:
+            future = Future()
+            future.set_result(image_data)
+            if callback:
+                callback(image_data)
+            return future
+        return self.executor.submit(self._fetch, image_data, callback)
+
+    def shutdown(self, wait: bool = False):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,63 @@
+from typing import Optional
+
+# Enough leading bytes to recognize every format below.
+SNIFF_BYTES = 32
+
+# Canonical type for the extensions and Bing `f` values we see, e.g. "jpg" -> "jpeg".
+IMAGE_TYPES = {
+    "jpg": "jpeg", "jpeg": "jpeg", "jpe": "jpeg", "jfif": "jpeg", "png": "png", "gif": "gif",
+    "webp": "webp", "bmp": "bmp", "ico": "ico", "tif": "tiff", "tiff": "tiff", "svg": "svg",
+    "avif": "avif", "heic": "heic", "heif": "heic",
+}
+
+EXTENSIONS = {
+    "jpeg": ".jpg", "png": ".png", "gif": ".gif", "webp": ".webp", "bmp": ".bmp", "ico": ".ico",
+    "tiff": ".tiff", "svg": ".svg", "avif": ".avif", "heic": ".heic",
+}
+
+class ContentValidationError(Exception):
+    """Raised when a download turns out not to be an acceptable image."""
+
+def normalize_image_type(value: Optional[str]) -> Optional[str]:
+    """Maps a file type or extension like "JPG" or ".jpeg" to its canonical type."""
+    if not value:
+        return None
+    return IMAGE_TYPES.get(value.lower().lstrip("."))
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Returns the image type identified by the magic bytes at the start of a file, or None."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    if head[:4] == b"\x00\x00\x01\x00":
+        return "ico"
+    if head[:2] == b"BM" and len(head) >= 14:
+        return "bmp"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in (b"avif", b"avis"):
+            return "avif"
+        if brand in (b"heic", b"heix", b"mif1", b"msf1", b"hevc"):
+            return "heic"
+    text = head.lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    if text.startswith(b"<svg") or (text.startswith(b"<?xml") and b"<svg" in head.lower()):
+        return "svg"
+    return None
+
+def describe_content(head: bytes) -> str:
+    """A short description of non-image content for error messages."""
+    text = head.lstrip().lower()
+    if text.startswith((b"<!doctype html", b"<html", b"<head", b"<body")):
+        return "an HTML page"
+    if text.startswith((b"{", b"[")):
+        return "JSON"
+    if not head:
+        return "an empty body"
+    return f"unrecognized content starting with {head[:8]!r}"
@@ -0,0 +1,30 @@
+import json
+from bing_image_downloader.cache import CachingScraper, ResultCache
+from bing_image_downloader.parsing import parse_image_data
+
+class FakeScraper:
+    def __init__(self, count):
+        self.items = [json.dumps({"t": f"image {i}", "murl": f"http://example.com/{i}.jpg"}) for i in range(count)]
+        self.scraped_image_ids = set()
+
+    def search(self, query, qft=None):
+        pass
+
+    def iter_image_data(self, start=0, with_raw=False):
+        for i, m in enumerate(self.items[start:], start):
+            image_data = parse_image_data(json.loads(m), str(i))
+            yield (image_data, m) if with_raw else image_data
+
+def test_raw_m_is_cached_but_not_kept_on_results(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"))
+    scraper = CachingScraper(FakeScraper(5), cache)
+    scraper.search("cats")
+    images = scraper.get_image_data(5)
+    assert [image.title for image in images] == [f"image {i}" for i in range(5)]
+    assert not hasattr(images[0], "raw_m")
+    stored = cache._conn.execute("SELECT raw_m FROM results ORDER BY offset").fetchall()
+    assert [json.loads(raw)["t"] for (raw,) in stored] == [f"image {i}" for i in range(5)]
+
+    scraper.search("cats")
+    assert [image.title for image in scraper.get_image_data(5)] == [f"image {i}" for i in range(5)]
+    cache.close()
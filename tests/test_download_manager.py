@@ -0,0 +1,81 @@
+import glob
+import os
+import time
+import pytest
+from benchmarks.fake_servers import FakeImageHost
+from bing_image_downloader.data_model import ImageData
+from bing_image_downloader.download_manager import CANCELLED, DONE, PAUSED, DownloadManager
+from bing_image_downloader.downloader import Downloader
+
+IMAGE_SIZE = 400_000
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def part_size(directory):
+    parts = glob.glob(os.path.join(directory, ".*.part"))
+    return os.path.getsize(parts[0]) if parts else None
+
+@pytest.fixture
+def host():
+    # About two seconds per image, so there is time to pause or cancel it midway.
+    with FakeImageHost(image_size=IMAGE_SIZE, bandwidth=IMAGE_SIZE // 2) as host:
+        yield host
+
+@pytest.fixture
+def manager(tmp_path):
+    updates = []
+    manager = DownloadManager(Downloader(str(tmp_path), chunk_size=16 * 1024), max_workers=2,
+                              on_update=lambda job: updates.append((job.id, job.state, job.downloaded)))
+    manager.updates = updates
+    yield manager
+    manager.shutdown()
+
+def image(host):
+    return ImageData(title="slow", data_idx="1", image_source_url=f"{host.url}/slow.jpg")
+
+def cancel_midway(manager, host):
+    job, = manager.submit([image(host)])
+    wait_for(lambda: job.downloaded > 50_000)
+    manager.cancel([job.id])
+    wait_for(lambda: job.finished)
+    assert job.state == CANCELLED
+    return job
+
+def test_cancel_stops_writing_and_commits_nothing(manager, host, tmp_path):
+    cancel_midway(manager, host)
+    size = part_size(str(tmp_path))
+    assert 0 < size < IMAGE_SIZE
+    time.sleep(0.5)
+    assert part_size(str(tmp_path)) == size
+    assert glob.glob(os.path.join(tmp_path, "*.jpg")) == []
+    assert manager.downloader.store.lookup_url(image(host).image_source_url, str(tmp_path)) is None
+
+def test_download_again_resumes_from_the_part_file(manager, host, tmp_path):
+    cancel_midway(manager, host)
+    size = part_size(str(tmp_path))
+    job, = manager.submit([image(host)])
+    wait_for(lambda: job.finished)
+    assert job.state == DONE
+    first_progress = next(downloaded for job_id, state, downloaded in manager.updates if job_id == job.id and downloaded)
+    assert first_progress >= size
+    with open(job.path, "rb") as f:
+        assert f.read() == host.body("/slow.jpg")
+    assert part_size(str(tmp_path)) is None
+
+def test_pause_holds_a_running_download_until_resumed(manager, host, tmp_path):
+    job, = manager.submit([image(host)])
+    wait_for(lambda: job.downloaded > 50_000)
+    manager.pause()
+    wait_for(lambda: job.state == PAUSED)
+    downloaded = job.downloaded
+    time.sleep(0.5)
+    assert job.downloaded == downloaded
+    manager.resume()
+    wait_for(lambda: job.finished)
+    assert job.state == DONE
+    with open(job.path, "rb") as f:
+        assert f.read() == host.body("/slow.jpg")
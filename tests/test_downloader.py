@@ -0,0 +1,81 @@
+import hashlib
+import io
+import os
+import pytest
+from benchmarks.fake_servers import FakeImageHost
+from bing_image_downloader.data_model import ImageData
+from bing_image_downloader.downloader import DownloadCancelled, Downloader
+from bing_image_downloader.validation import ContentValidationError
+
+class FakeResponse:
+    """A streamed response that records how many body bytes were read."""
+
+    def __init__(self, body: bytes, content_type: str = "image/jpeg"):
+        self.headers = {"Content-Type": content_type}
+        self.raw = self
+        self._body = io.BytesIO(body)
+        self.bytes_read = 0
+
+    def read(self, amount, decode_content=True):
+        data = self._body.read(amount)
+        self.bytes_read += len(data)
+        return data
+
+    def iter_content(self, chunk_size):
+        while True:
+            data = self.read(chunk_size)
+            if not data:
+                return
+            yield data
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_part(tmp_path, response):
+    downloader = Downloader(str(tmp_path))
+    image_data = ImageData(image_source_url="http://example.com/a.jpg", file_type="jpeg")
+    return downloader._write_part(response, image_data, str(tmp_path / ".a.part"), hashlib.sha256(), 0, None)
+
+def test_html_body_is_rejected_after_its_first_bytes(tmp_path):
+    response = FakeResponse(b"<!DOCTYPE html><html>" + b"x" * 1024 * 1024)
+    with pytest.raises(ContentValidationError):
+        write_part(tmp_path, response)
+    assert response.bytes_read <= 32
+
+def test_image_body_is_written_in_full(tmp_path):
+    body = b"\xff\xd8\xff\xe0" + bytes(200_000)
+    size, image_type = write_part(tmp_path, FakeResponse(body))
+    assert (size, image_type) == (len(body), "jpeg")
+    assert (tmp_path / ".a.part").read_bytes() == body
+
+def download_interrupted_then_resumed(tmp_path, change_content):
+    with FakeImageHost(image_size=300_000) as host:
+        downloader = Downloader(str(tmp_path), chunk_size=16 * 1024)
+        image_data = ImageData(title="x", data_idx="1", image_source_url=f"{host.url}/r.jpg")
+
+        def stop_early(downloaded, total):
+            if downloaded > 100_000:
+                raise DownloadCancelled()
+
+        assert downloader.download_result(image_data, progress=stop_early).cancelled
+        if change_content:
+            host.revision += 1
+        resumed_from = []
+        result = downloader.download_result(image_data, progress=lambda downloaded, total: resumed_from.append(downloaded))
+        assert result.ok
+        with open(result.path, "rb") as f:
+            assert f.read() == host.body("/r.jpg")
+        assert not [name for name in os.listdir(tmp_path) if ".part" in name]
+        return resumed_from[0]
+
+def test_unchanged_download_resumes_from_part_file(tmp_path):
+    assert download_interrupted_then_resumed(tmp_path, change_content=False) > 100_000
+
+def test_changed_download_starts_over(tmp_path):
+    assert download_interrupted_then_resumed(tmp_path, change_content=True) == 0
@@ -0,0 +1,23 @@
+import os
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtWidgets = pytest.importorskip("PyQt6.QtWidgets")
+
+from bing_image_downloader.data_model import ImageData, ImageDataStore
+from bing_image_downloader.gui import ResultsModel, ThumbnailStatusRole
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+def test_failed_thumbnail_fetch_shows_as_missing(app):
+    model = ResultsModel(lambda image_data: None)
+    image_data = ImageData(title="cat", data_idx="1", thumbnail_url="http://example.com/thumb.jpg")
+    model.set_store(ImageDataStore([image_data]))
+    assert model.data(model.index(0), ThumbnailStatusRole) == "loading"
+
+    # The fetcher calls back without a thumbnail_key when the fetch failed.
+    model.thumbnail_fetched(image_data)
+    assert model.data(model.index(0), ThumbnailStatusRole) == "missing"
+    model.shutdown()
@@ -0,0 +1,92 @@
+import datetime
+import html
+import json
+from benchmarks.fake_servers import FakeBingServer
+from bing_image_downloader.http_scraper import HttpImageScraper
+from bing_image_downloader.scraper import EXTRACT_RESULTS_SCRIPT, RESULTS_STATE_SCRIPT, SCROLL_SCRIPT, BingImageScraper
+
+TABBY = {"t": "Tabby & kitten", "murl": "https://cats.example/tabby.jpg", "turl": "https://tse.example/th?id=1",
+         "purl": "https://www.flickr.com/photos/tabby", "w": 1920, "h": 1080, "f": "jpeg"}
+SIAMESE = {"t": "Siamese", "murl": "https://cats.example/siamese.png", "turl": "https://tse.example/th?id=2",
+           "purl": "https://en.wikipedia.org/wiki/Siamese_cat", "s": "640 x 480", "f": "png"}
+CALICO = {"t": "Calico", "murl": "https://cats.example/calico.jpg", "purl": "https://example.com/calico",
+          "w": 800, "h": 600, "f": "jpeg"}
+
+def result(data_idx, m=None, age=None, date=None):
+    link = f'<a class="iusc" m="{html.escape(json.dumps(m), quote=True)}" href="#">' if m else '<a href="#">'
+    info = f'<div class="infopt"><span class="ppdatr" title="{date}"> {age} </span></div>' if age else ''
+    return f'<li data-idx="{data_idx}"><div class="imgpt">{link}<img class="mimg"></a></div>{info}</li>'
+
+# A result page as Bing serves it, one `li` per result: the third is an ad without an `m`.
+RESULTS = [
+    result("1", TABBY, "2 days ago", "03/15/2024"),
+    result("2", SIAMESE),
+    result("3"),
+    result("4", CALICO, "3 weeks ago", "01/02/2024"),
+]
+
+# What the Selenium scraper's EXTRACT_RESULTS_SCRIPT reads from the same page.
+DOM_ITEMS = [
+    {"data_idx": "1", "m": json.dumps(TABBY), "age": "2 days ago", "date": "03/15/2024"},
+    {"data_idx": "2", "m": json.dumps(SIAMESE), "age": None, "date": None},
+    {"data_idx": "3", "m": None, "age": None, "date": None},
+    {"data_idx": "4", "m": json.dumps(CALICO), "age": "3 weeks ago", "date": "01/02/2024"},
+]
+
+class StubBingServer(FakeBingServer):
+    """Serves `RESULTS` in pages, repeating the last page past the end as Bing does, and
+    records the query and offset of every request."""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def render_page(self, query, first, count):
+        self.requests.append((query, first))
+        first = min(first, len(RESULTS) - count)
+        return f'<ul class="dgControl_list">{"".join(RESULTS[first:first + count])}</ul>'
+
+class FakeDriver:
+    def execute_script(self, script, *args):
+        if script == EXTRACT_RESULTS_SCRIPT:
+            return DOM_ITEMS[args[0]:]
+        if script == SCROLL_SCRIPT:
+            return len(DOM_ITEMS)
+        assert script == RESULTS_STATE_SCRIPT
+        return [len(DOM_ITEMS), True]
+
+class FakeDriverPool:
+    def acquire(self):
+        return FakeDriver()
+
+    def release(self, driver, broken=False):
+        pass
+
+    def close(self):
+        pass
+
+def scrape_http():
+    with StubBingServer() as bing:
+        scraper = HttpImageScraper(base_url=bing.url, page_size=2)
+        scraper.search("cats")
+        return list(scraper.iter_image_data()), bing.requests
+
+def test_http_results_are_parsed_from_the_page():
+    results, _ = scrape_http()
+    assert [r.data_idx for r in results] == ["1", "2", "4"]
+    tabby, siamese, calico = results
+    assert (tabby.title, tabby.image_source_url, tabby.thumbnail_url) == (TABBY["t"], TABBY["murl"], TABBY["turl"])
+    assert (tabby.site_source, tabby.width, tabby.height, tabby.file_type) == ("www.flickr.com", 1920, 1080, "jpeg")
+    assert (tabby.ago, tabby.parsed_age, tabby.parsed_date) == ("2 days ago", 2, datetime.date(2024, 3, 15))
+    assert (siamese.width, siamese.height, siamese.ago, siamese.date) == (640, 480, None, None)
+    assert calico.parsed_age == 21
+
+def test_http_pages_advance_by_the_results_read():
+    # Two per page; the third request gets the last page again, with nothing new, and ends the search.
+    _, requests = scrape_http()
+    assert requests == [("cats", 0), ("cats", 2), ("cats", 4)]
+
+def test_http_results_match_the_selenium_scraper():
+    results, _ = scrape_http()
+    scraper = BingImageScraper(driver_pool=FakeDriverPool())
+    assert list(scraper.iter_image_data(max_scroll_wait=1.0)) == results
@@ -0,0 +1,36 @@
+import pickle
+from bing_image_downloader.metrics import Histogram, Metrics
+
+def record(values, counter):
+    registry = Metrics()
+    registry.enable()
+    registry.count("downloads", counter)
+    for value in values:
+        registry.observe("download", value)
+    return registry
+
+def test_worker_metrics_merge_into_the_parent_registry():
+    parent = Metrics()
+    for worker in (record([1.0, 2.0], 2), record([3.0], 1)):
+        parent.merge(pickle.loads(pickle.dumps(worker.detach())))
+    snapshot = parent.snapshot()
+    assert snapshot["counters"] == {"downloads": 3}
+    histogram = snapshot["histograms"]["download"]
+    assert (histogram["count"], histogram["sum"], histogram["min"], histogram["max"]) == (3, 6.0, 1.0, 3.0)
+    assert histogram["p50"] == 2.0
+
+def test_detach_leaves_the_registry_empty():
+    registry = record([1.0], 1)
+    assert registry.detach().snapshot()["counters"] == {"downloads": 1}
+    assert registry.snapshot() == {"counters": {}, "histograms": {}}
+
+def test_merged_reservoir_stays_within_max_samples():
+    a, b = Histogram(max_samples=100), Histogram(max_samples=100)
+    for i in range(300):
+        a.observe(0.0)
+    for i in range(100):
+        b.observe(1.0)
+    a.merge(b)
+    assert a.count == 400
+    assert len(a.samples) == 100
+    assert a.samples.count(1.0) == 25
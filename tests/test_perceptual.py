@@ -0,0 +1,30 @@
+import io
+import numpy as np
+from PIL import Image
+from bing_image_downloader.perceptual import DEFAULT_MAX_DISTANCE, PerceptualHasher, PerceptualIndex, dhash
+
+def picture(seed, size=(160, 120), quality=85):
+    """A smooth random picture, saved as a JPEG."""
+    pixels = np.random.default_rng(seed).integers(0, 255, (8, 8, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).resize(size, Image.Resampling.BICUBIC).save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+def test_resized_copy_is_a_near_duplicate_and_another_picture_is_not():
+    index = PerceptualIndex(":memory:")
+    index.add("original", dhash(picture(1)))
+    index.add("other", dhash(picture(2)))
+
+    key, distance = index.nearest(dhash(picture(1, size=(150, 112), quality=60)))
+    assert key == "original" and distance <= DEFAULT_MAX_DISTANCE
+    assert index.nearest(dhash(picture(3))) is None
+    assert index.nearest(dhash(picture(1)), exclude_key="original") is None
+    index.close()
+
+def test_hasher_pool_matches_hashing_in_process():
+    hasher = PerceptualHasher(processes=2)
+    try:
+        assert hasher.hash(picture(1)) == dhash(picture(1))
+        assert hasher.hash(b"not an image") is None
+    finally:
+        hasher.shutdown()
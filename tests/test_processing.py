@@ -0,0 +1,30 @@
+from PIL import Image
+from bing_image_downloader.data_model import ImageData
+from bing_image_downloader.processing import PostProcessor, ProcessingOptions
+
+def test_resize_writes_copies_that_fit_each_box(tmp_path):
+    paths = []
+    for name, size in (("wide", (800, 400)), ("tall", (300, 600))):
+        path = tmp_path / f"{name}.jpg"
+        Image.new("RGB", size, "red").save(path)
+        paths.append(path)
+    options = ProcessingOptions(resize=[(200, 200), (100, 50)], output_directory=str(tmp_path / "out"))
+    images = [ImageData(downloaded_path=str(path)) for path in paths]
+
+    post_processor = PostProcessor(options, processes=2)
+    try:
+        for image in images:
+            post_processor.submit(image)
+        processed = post_processor.wait()
+    finally:
+        post_processor.shutdown()
+
+    assert all(p.ok for p in processed)
+    assert [(i.width, i.height) for i in images] == [(800, 400), (300, 600)]
+    expected = {
+        "200x200/wide.jpg": (200, 100), "100x50/wide.jpg": (100, 50),
+        "200x200/tall.jpg": (100, 200), "100x50/tall.jpg": (25, 50),
+    }
+    for name, size in expected.items():
+        with Image.open(tmp_path / "out" / name) as image:
+            assert image.size == size
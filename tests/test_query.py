@@ -0,0 +1,27 @@
+import datetime
+import pytest
+from bing_image_downloader.filters import compile_filters, parse_filter_spec
+from bing_image_downloader.data_model import ImageData
+from bing_image_downloader.query import build_query
+
+def test_supported_filters_become_bing_terms():
+    filters = [parse_filter_spec(spec) for spec in ["size>4000000", "age<7", "title~cat", "date>2026-10-01"]]
+    query = build_query("red cat", filters, today=datetime.date(2026, 10, 17))
+    assert query.qft == "+filterui:imagesize-custom_1000_1000+filterui:age-lt10080"
+    assert query.client_filters == filters
+
+def test_age_filter_is_still_checked_on_the_client():
+    query = build_query("cats", [parse_filter_spec("age<10")])
+    compiled = compile_filters(query.client_filters)
+    assert compiled.matches(ImageData(parsed_age=3))
+    assert not compiled.matches(ImageData(parsed_age=150))
+    assert not compiled.matches(ImageData(parsed_age=365))
+
+def test_no_supported_filters_means_no_qft():
+    assert build_query("cats", [parse_filter_spec("source!~pinterest")]).qft is None
+
+def test_non_positive_size_adds_no_term_and_is_rejected():
+    size = parse_filter_spec("size>-5")
+    assert build_query("cats", [size]).qft is None
+    with pytest.raises(ValueError):
+        compile_filters([size])
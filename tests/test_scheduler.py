@@ -0,0 +1,66 @@
+import email.utils
+import time
+from bing_image_downloader.data_model import ImageData
+from bing_image_downloader.scheduler import CircuitBreaker, DownloadQueue, HostScheduler, RetryPolicy, parse_retry_after
+
+def test_breaker_trips_then_half_opens_then_closes():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0)
+    for _ in range(3):
+        assert breaker.delay(0.0) == 0.0
+        breaker.record_failure(0.0)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.delay(4.0) == 6.0
+
+    # Once the timeout is up a single probe is let through.
+    assert breaker.delay(10.0) == 0.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.started()
+    assert breaker.delay(10.0) > 0
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.delay(10.0) == 0.0
+
+def test_failed_probe_opens_the_breaker_for_twice_as_long():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0, max_trips=2)
+    breaker.record_failure(0.0)
+    assert breaker.delay(10.0) == 0.0
+    breaker.started()
+    breaker.record_failure(10.0)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.open_until == 30.0
+    assert breaker.down(20.0)
+
+def test_retry_after_in_seconds():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+
+def test_retry_after_as_http_date():
+    value = email.utils.formatdate(time.time() + 120, usegmt=True)
+    assert 115 <= parse_retry_after(value) <= 120
+    past = email.utils.formatdate(time.time() - 120, usegmt=True)
+    assert parse_retry_after(past) == 0.0
+
+def test_retry_policy_gives_up_after_max_retries():
+    policy = RetryPolicy(max_retries=3, base_delay=0.5, max_delay=30.0)
+    for attempt in range(3):
+        assert 0 <= policy.delay(attempt) <= 0.5 * 2 ** attempt
+    assert policy.delay(3) is None
+    assert policy.delay(0, retry_after=5.0) >= 5.0
+    assert policy.delay(0, retry_after=60.0) is None
+
+def test_queue_hands_out_jobs_behind_a_parked_host():
+    scheduler = HostScheduler()
+    with scheduler.condition:
+        scheduler.start("slow.example", time.monotonic())
+    scheduler.finish("slow.example", throttled=True, retry_after=30.0)
+
+    queue = DownloadQueue(scheduler)
+    queue.put(0, ImageData(image_source_url="http://slow.example/a.jpg"))
+    queue.put(1, ImageData(image_source_url="http://fast.example/b.jpg"))
+    start = time.monotonic()
+    job = queue.get()
+    assert time.monotonic() - start < 0.1
+    assert (job.index, job.host) == (1, "fast.example")
+    assert [job.index for job in queue.pending] == [0]
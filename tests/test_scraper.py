@@ -0,0 +1,69 @@
+import time
+from bing_image_downloader.scraper import RESULTS_STATE_SCRIPT, SCROLL_SCRIPT, BingImageScraper
+
+class FakeResultsPage:
+    """A driver whose page gains `batch` results `load_delay` seconds after the first scroll,
+    or shows the end-of-results marker instead when `ended` is set."""
+
+    def __init__(self, load_delay: float, batch: int = 35, ended: bool = False):
+        self.load_delay = load_delay
+        self.batch = batch
+        self.ended = ended
+        self.count = 35
+        self.scrolled_at = None
+        self.scrolls = 0
+
+    def execute_script(self, script, *args):
+        now = time.perf_counter()
+        if script == SCROLL_SCRIPT:
+            self.scrolls += 1
+            if self.scrolled_at is None:
+                self.scrolled_at = now
+            return self.count
+        assert script == RESULTS_STATE_SCRIPT
+        if self.scrolled_at is not None and now - self.scrolled_at >= self.load_delay:
+            if self.ended:
+                return [self.count, True]
+            self.count += self.batch
+            self.scrolled_at = None
+        return [self.count, False]
+
+class FakeDriverPool:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def acquire(self):
+        return self.driver
+
+    def release(self, driver, broken=False):
+        pass
+
+    def close(self):
+        pass
+
+def make_scraper(page, estimate):
+    scraper = BingImageScraper(driver_pool=FakeDriverPool(page))
+    scraper._scroll_load_estimate = estimate
+    return scraper
+
+def test_slow_page_keeps_waiting_past_the_adaptive_timeout():
+    # The first wait times out after 1 s; the page only loads after 1.5 s.
+    page = FakeResultsPage(load_delay=1.5)
+    scraper = make_scraper(page, estimate=0.25)
+    assert scraper._wait_for_more_results(max_scroll_wait=5.0)
+    assert page.count == 70
+    assert page.scrolls == 2
+
+def test_gives_up_once_max_scroll_wait_is_used():
+    page = FakeResultsPage(load_delay=60)
+    scraper = make_scraper(page, estimate=0.25)
+    start = time.perf_counter()
+    assert not scraper._wait_for_more_results(max_scroll_wait=1.5)
+    assert 1.4 < time.perf_counter() - start < 2.5
+
+def test_end_of_results_stops_without_waiting():
+    page = FakeResultsPage(load_delay=0.1, ended=True)
+    scraper = make_scraper(page, estimate=0.25)
+    start = time.perf_counter()
+    assert not scraper._wait_for_more_results(max_scroll_wait=5.0)
+    assert time.perf_counter() - start < 1.0
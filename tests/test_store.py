@@ -0,0 +1,41 @@
+import hashlib
+import os
+from bing_image_downloader.store import DownloadStore
+
+def commit(store, directory, url, data, name):
+    os.makedirs(directory, exist_ok=True)
+    part_path = os.path.join(directory, ".part")
+    with open(part_path, "wb") as f:
+        f.write(data)
+    return store.commit(part_path, url, hashlib.sha256(data).hexdigest(), len(data), os.path.join(directory, name))
+
+def test_content_from_another_directory_is_linked_in(tmp_path):
+    store = DownloadStore(str(tmp_path))
+    cats, dogs = str(tmp_path / "cats"), str(tmp_path / "dogs")
+    dog_path = commit(store, dogs, "http://example.com/a.jpg", b"same bytes", "dog.jpg")
+
+    # The same URL, looked up for another query, gets its own file in that query's folder.
+    cat_path = store.lookup_url("http://example.com/a.jpg", cats)
+    assert os.path.dirname(cat_path) == cats
+    assert open(cat_path, "rb").read() == b"same bytes"
+    assert store.lookup_url("http://example.com/a.jpg", cats) == cat_path
+    assert store.lookup_url("http://example.com/a.jpg", dogs) == dog_path
+
+    # The same bytes from a different URL are stored once per folder.
+    assert commit(store, cats, "http://example.com/b.jpg", b"same bytes", "other.jpg") == cat_path
+    assert not os.path.exists(os.path.join(cats, ".part"))
+    assert sorted(os.listdir(cats)) == ["dog.jpg"]
+    store.close()
+
+def test_unknown_url_is_not_found(tmp_path):
+    store = DownloadStore(str(tmp_path))
+    assert store.lookup_url("http://example.com/missing.jpg", str(tmp_path)) is None
+    store.close()
+
+def test_url_lock_files_are_removed_after_use(tmp_path):
+    store = DownloadStore(str(tmp_path))
+    for i in range(10):
+        with store.url_lock(f"http://example.com/{i}.jpg"):
+            assert len(os.listdir(tmp_path / ".locks")) == 1
+    assert os.listdir(tmp_path / ".locks") == []
+    store.close()